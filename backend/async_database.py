@@ -0,0 +1,108 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from database import db, cancellable
+
+log = logging.getLogger(f"traffic.{__name__}")
+
+
+# Bounded pool for API/analytics queries
+READ_WORKERS = int(os.getenv("DB_READ_WORKERS", 4))
+# Default per-query timeout in seconds
+QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", 10))
+
+
+class QueryTimeout(Exception):
+    """Raised when a database query exceeds its timeout"""
+
+
+class AsyncTrafficDatabase:
+    """
+    Async facade over TrafficDatabase.
+
+    Reads run on a bounded thread pool with per-query timeouts; a timed out
+    or cancelled query is interrupted inside SQLite rather than left running.
+    Writes from the ingest path go to a dedicated single-thread executor so
+    analytics load can never queue ahead of real-time data.
+    """
+
+    def __init__(self, database, read_workers=READ_WORKERS, query_timeout=QUERY_TIMEOUT):
+        self.db = database
+        self.query_timeout = query_timeout
+        self._read_pool = ThreadPoolExecutor(max_workers=read_workers,
+                                             thread_name_prefix="db-read")
+        self._ingest_pool = ThreadPoolExecutor(max_workers=1,
+                                               thread_name_prefix="db-ingest")
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """Run a blocking database function on the read pool"""
+        if timeout is None:
+            timeout = self.query_timeout
+        cancel_event = threading.Event()
+
+        def job():
+            with cancellable(cancel_event):
+                return fn(*args, **kwargs)
+
+        # Queued jobs count against the timeout too; cancelling the future
+        # drops them before they ever reach a worker
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._read_pool, job)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            cancel_event.set()
+            raise QueryTimeout(f"{getattr(fn, '__name__', 'query')} exceeded {timeout}s")
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+    def submit_write(self, fn, *args, **kwargs):
+        """Queue a write on the ingest executor without waiting for it"""
+        future = self._ingest_pool.submit(partial(fn, *args, **kwargs))
+        future.add_done_callback(_report_write_error)
+        return future
+
+    def close(self, wait=True):
+        """Flush pending writes and stop the executors"""
+        self._ingest_pool.shutdown(wait=wait)
+        self._read_pool.shutdown(wait=wait, cancel_futures=True)
+
+    # Read methods mirroring TrafficDatabase
+
+    async def get_readings(self, limit=100, offset=0):
+        return await self.run(self.db.get_readings, limit, offset)
+
+    async def get_readings_by_date(self, date):
+        return await self.run(self.db.get_readings_by_date, date)
+
+    async def get_day_archive(self, date):
+        return await self.run(self.db.get_day_archive, date)
+
+    async def get_predictions(self, limit=100, offset=0):
+        return await self.run(self.db.get_predictions, limit, offset)
+
+    async def get_congestion_summary(self, hours=24):
+        return await self.run(self.db.get_congestion_summary, hours)
+
+    async def get_statistics(self, date=None):
+        return await self.run(self.db.get_statistics, date)
+
+    async def get_total_count(self):
+        return await self.run(self.db.get_total_count)
+
+    async def get_baseline(self, bucket_minutes, uid=None, bucket=None):
+        return await self.run(self.db.get_baseline, bucket_minutes, uid, bucket)
+
+
+def _report_write_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        log.error("Error saving to database: %s", future.exception())
+
+
+# Create global async database instance
+adb = AsyncTrafficDatabase(db)
@@ -0,0 +1,123 @@
+import os
+import asyncio
+from collections import deque
+
+
+# What a full stage does with one more item:
+# block:       the producer waits for room, which pauses the stage before it
+#              (and, at the front, leaves bytes in the serial port's OS buffer)
+# drop_oldest: the oldest queued item is shed
+# downsample:  the item replaces the newest queued one from the same uid, so every
+#              sensor keeps flowing at a lower rate; a new uid sheds the oldest item
+# latest:      like downsample, but even below maxsize only the newest item per uid
+#              is kept (for consumers that only want current values)
+# Items whose key is None are never replaced, only shed as the oldest.
+POLICIES = ("block", "drop_oldest", "downsample", "latest")
+
+# Framed serial readings waiting for the prediction model
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10_000))
+INGEST_QUEUE_POLICY = os.getenv("INGEST_QUEUE_POLICY", "block")
+# Predicted readings waiting for the database writer thread
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", 10_000))
+PERSIST_QUEUE_POLICY = os.getenv("PERSIST_QUEUE_POLICY", "block")
+# Readings written per database writer job
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", 256))
+# Live messages waiting to be sent to WebSocket clients
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", 1_000))
+BROADCAST_QUEUE_POLICY = os.getenv("BROADCAST_QUEUE_POLICY", "downsample")
+
+
+class StageQueue:
+    """
+    Bounded FIFO between two pipeline stages, with an overload policy.
+
+    One consumer takes items with get()/get_batch(). Producers that can wait
+    use put(); callbacks that cannot (e.g. prediction results) use
+    put_nowait(), which never waits: on a full `block` queue the producer is
+    expected to have waited in wait_for_room() before starting the work
+    that produces the item. Every shed item is counted.
+    """
+
+    def __init__(self, name, maxsize, policy="block", key=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown {name} queue policy {policy!r} "
+                             f"(expected one of {', '.join(POLICIES)})")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key          # item -> uid, for downsample/latest
+        self._items = deque()   # [key, item] entries, oldest first
+        self._newest = {}       # key -> newest queued entry with that key
+        self._readable = asyncio.Event()
+        self._room = asyncio.Event()
+        self._stats = {"put": 0, "shed": 0, "waits": 0, "high_water": 0}
+
+    def __len__(self):
+        return len(self._items)
+
+    async def wait_for_room(self, reserved=lambda: 0):
+        """
+        Wait (block policy only) until one more item fits, counting
+        `reserved()` items that are already on their way to this queue.
+        """
+        if self.policy != "block":
+            return
+        while len(self._items) + reserved() >= self.maxsize:
+            self._stats["waits"] += 1
+            self._room.clear()
+            await self._room.wait()
+
+    async def put(self, item):
+        await self.wait_for_room()
+        self.put_nowait(item)
+
+    def put_nowait(self, item):
+        self._stats["put"] += 1
+        key = self.key(item) if self.key else None
+        full = len(self._items) >= self.maxsize
+        if self.policy == "latest" or (full and self.policy == "downsample"):
+            entry = self._newest.get(key) if key is not None else None
+            if entry is not None:
+                entry[1] = item
+                self._stats["shed"] += 1
+                return
+        if full and self.policy != "block":
+            self._pop()
+            self._stats["shed"] += 1
+        entry = [key, item]
+        self._items.append(entry)
+        if key is not None:
+            self._newest[key] = entry
+        self._stats["high_water"] = max(self._stats["high_water"], len(self._items))
+        self._readable.set()
+
+    def _pop(self):
+        entry = self._items.popleft()
+        if self._newest.get(entry[0]) is entry:
+            del self._newest[entry[0]]
+        self._room.set()
+        return entry[1]
+
+    async def get(self):
+        while not self._items:
+            self._readable.clear()
+            await self._readable.wait()
+        return self._pop()
+
+    async def get_batch(self, max_items):
+        """Wait for at least one item, then take up to max_items"""
+        batch = [await self.get()]
+        while self._items and len(batch) < max_items:
+            batch.append(self._pop())
+        return batch
+
+    def drain(self):
+        """Take everything still queued (e.g. to flush it on shutdown)"""
+        items = [entry[1] for entry in self._items]
+        self._items.clear()
+        self._newest.clear()
+        self._room.set()
+        return items
+
+    def stats(self):
+        return {"policy": self.policy, "maxsize": self.maxsize, "depth": len(self._items), **self._stats}
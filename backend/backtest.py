@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Replay recorded readings through the prediction models and score them.
+
+Streams readings from the database in chunks, oldest first, feeds every
+model the way the API does (one prediction per reading) and compares each
+next-minute prediction with the congestion level observed a minute later.
+Reports error metrics next to each model's cost, so changes to a model are
+judged on both.
+
+Usage: python backtest.py [--db traffic_data.db] [--models window kalman] [--since 2024-01-01]
+"""
+import time
+import argparse
+import tracemalloc
+from bisect import bisect_left
+from collections import deque
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from database import DATABASE_PATH, TrafficDatabase
+from model_runner import predict
+from prediction_model import PREDICTION_MODELS, congestion_status, observed_level
+
+
+# "Next minute": the observed level is averaged over readings received in
+# [t + HORIZON, t + HORIZON + TRUTH_WINDOW) after a prediction made at t
+HORIZON_MS = 60_000
+TRUTH_WINDOW_MS = 10_000
+
+
+class Observations:
+    """Observed levels by received time, with prefix sums for window means"""
+
+    def __init__(self):
+        self.times = []
+        self.sums = [0]
+
+    def add(self, received_ms, level):
+        self.times.append(received_ms)
+        self.sums.append(self.sums[-1] + level)
+
+    def mean(self, start_ms, end_ms):
+        """Mean level in [start_ms, end_ms), or None if no reading fell in it"""
+        lo = bisect_left(self.times, start_ms)
+        hi = bisect_left(self.times, end_ms, lo)
+        if hi == lo:
+            return None
+        return (self.sums[hi] - self.sums[lo]) / (hi - lo)
+
+    def trim(self, before_ms):
+        """Forget observations older than before_ms (kept lists stay bounded)"""
+        cut = bisect_left(self.times, before_ms)
+        if cut > 4096 and cut > len(self.times) // 2:
+            del self.times[:cut]
+            del self.sums[:cut]
+
+
+class Score:
+    """Running error metrics for one model's next-minute predictions"""
+
+    def __init__(self):
+        self.n = 0
+        self.abs_error = 0.0
+        self.sq_error = 0.0
+        self.error = 0.0
+        self.status_hits = 0
+        self.banded = 0
+        self.covered = 0
+        self.warm_up = 0
+        self.unscored = 0
+        self.seconds = 0.0
+
+    def add(self, next_minute, actual):
+        predicted = next_minute["prediction"]
+        error = predicted - actual
+        self.n += 1
+        self.abs_error += abs(error)
+        self.sq_error += error * error
+        self.error += error
+        self.status_hits += congestion_status(predicted) == congestion_status(actual)
+        if "lower" in next_minute:
+            self.banded += 1
+            self.covered += next_minute["lower"] <= actual <= next_minute["upper"]
+
+    def report(self, readings):
+        n = self.n or 1
+        return {
+            "scored": self.n,
+            "mae": self.abs_error / n,
+            "rmse": (self.sq_error / n) ** 0.5,
+            "bias": self.error / n,
+            "status_accuracy": self.status_hits / n,
+            "coverage": self.covered / self.banded if self.banded else None,
+            "warm_up": self.warm_up,
+            "unscored": self.unscored,
+            "us_per_reading": self.seconds / readings * 1e6 if readings else 0.0,
+        }
+
+
+def model_state_bytes(model_class, window_size, readings):
+    """Memory held by one model after it has seen `readings`"""
+    tracemalloc.start()
+    try:
+        model = model_class(window_size=window_size)
+        for reading in readings:
+            model.add_reading(*reading)
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss_mib():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(database, names, chunk_size, since, until, limit, horizon_ms, truth_window_ms):
+    models = {}
+    for name in names:
+        model_class, window_size = PREDICTION_MODELS[name]
+        models[name] = model_class(window_size=window_size)
+    scores = {name: Score() for name in names}
+    # Reference row: predict that the next minute looks like this reading
+    scores["persistence"] = Score()
+
+    observations = Observations()
+    pending = deque()  # (target_start_ms, {name: next_minute})
+    recent = deque(maxlen=max(size for _, size in PREDICTION_MODELS.values()))
+    readings = 0
+    read_seconds = 0.0
+    start = time.perf_counter()
+
+    def resolve(now_ms):
+        while pending and pending[0][0] + truth_window_ms <= now_ms:
+            target_ms, predictions = pending.popleft()
+            actual = observations.mean(target_ms, target_ms + truth_window_ms)
+            for name, next_minute in predictions.items():
+                if next_minute is None:
+                    scores[name].warm_up += 1
+                elif actual is None:
+                    scores[name].unscored += 1
+                else:
+                    scores[name].add(next_minute, actual)
+
+    chunks = database.iter_readings(chunk_size, since, until)
+    while limit is None or readings < limit:
+        read_start = time.perf_counter()
+        rows = next(chunks, None)
+        read_seconds += time.perf_counter() - read_start
+        if rows is None:
+            break
+        if limit is not None:
+            rows = rows[:limit - readings]
+        for _, timestamp_ms, _, gas, count, headway_ms, _, received_ms, _ in rows:
+            inputs = (gas, count, headway_ms, timestamp_ms)
+            level = observed_level(gas, count, headway_ms)
+            observations.add(received_ms, level)
+            resolve(received_ms)
+
+            predictions = {"persistence": {"prediction": level}}
+            for name, model in models.items():
+                model_start = time.perf_counter()
+                model.add_reading(*inputs)
+                next_minute = predict(model)["next_minute"]
+                scores[name].seconds += time.perf_counter() - model_start
+                predictions[name] = None if next_minute["status"] == "INSUFFICIENT_DATA" else next_minute
+            pending.append((received_ms + horizon_ms, predictions))
+            recent.append(inputs)
+        readings += len(rows)
+        if pending:
+            observations.trim(pending[0][0])
+
+    # Whatever is still pending has no full minute of history after it
+    for _, predictions in pending:
+        for name in predictions:
+            scores[name].unscored += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "readings": readings,
+        "seconds": elapsed,
+        "read_seconds": read_seconds,
+        "models": {name: score.report(readings) for name, score in scores.items()},
+        "state_bytes": {name: model_state_bytes(PREDICTION_MODELS[name][0], PREDICTION_MODELS[name][1], recent)
+                        for name in names},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", type=Path, default=DATABASE_PATH,
+                        help="main database file (partitions live next to it)")
+    parser.add_argument("--models", nargs="+", choices=list(PREDICTION_MODELS),
+                        default=list(PREDICTION_MODELS), help="models to replay")
+    parser.add_argument("--chunk-size", type=int, default=10_000,
+                        help="readings fetched per query")
+    parser.add_argument("--since", help="first partition day (YYYY-MM-DD)")
+    parser.add_argument("--until", help="last partition day (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, help="stop after this many readings")
+    parser.add_argument("--horizon", type=float, default=HORIZON_MS / 1000,
+                        help="seconds ahead that next-minute predictions are scored at")
+    parser.add_argument("--truth-window", type=float, default=TRUTH_WINDOW_MS / 1000,
+                        help="seconds of readings averaged into the observed level")
+    args = parser.parse_args()
+
+    database = TrafficDatabase(args.db)
+    pending = database.pending_migrations()
+    if pending:
+        print(f"⚠️  {len(pending)} partition(s) still in the old layout are skipped; "
+              f"run migrate_db.py first")
+
+    result = run(database, args.models, args.chunk_size, args.since, args.until, args.limit,
+                 int(args.horizon * 1000), int(args.truth_window * 1000))
+    readings, seconds = result["readings"], result["seconds"]
+    if not readings:
+        print("No readings to replay")
+        return
+
+    print(f"{readings} reading(s) in {seconds:.2f}s ({readings / seconds:,.0f} readings/s end to end, "
+          f"{result['read_seconds']:.2f}s reading the database)")
+    print(f"  {'model':<12}{'scored':>9}{'MAE':>8}{'RMSE':>8}{'bias':>8}{'status':>8}{'band':>8}"
+          f"{'us/reading':>12}{'readings/s':>12}{'state KiB':>11}")
+    for name, report in result["models"].items():
+        coverage = f"{report['coverage']:.1%}" if report["coverage"] is not None else "-"
+        cost = report["us_per_reading"]
+        state = result["state_bytes"].get(name)
+        print(f"  {name:<12}{report['scored']:>9}{report['mae']:>8.1f}{report['rmse']:>8.1f}"
+              f"{report['bias']:>+8.1f}{report['status_accuracy']:>8.1%}{coverage:>8}"
+              f"{(f'{cost:.1f}' if cost else '-'):>12}{(f'{1e6 / cost:,.0f}' if cost else '-'):>12}"
+              f"{(f'{state / 1024:.1f}' if state is not None else '-'):>11}")
+    unscored = max(report["unscored"] for report in result["models"].values())
+    print(f"  {unscored} prediction(s) unscored (no reading a minute later); "
+          f"status = same congestion status, band = observed level inside the 95% band")
+    rss = peak_rss_mib()
+    if rss is not None:
+        print(f"✓ Peak memory {rss:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
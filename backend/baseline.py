@@ -0,0 +1,285 @@
+import os
+import json
+import math
+import time
+from functools import lru_cache
+
+import numpy as np
+
+
+# Time-of-week baseline profiles: for every uid and BASELINE_BUCKET_MINUTES
+# slot of the (local time) week, quantile sketches of headway, gas and the
+# predicted congestion level. A background job folds newly stored readings
+# into them, so answering "a typical Tuesday at 17:30" never scans readings.
+BASELINE_BUCKET_MINUTES = int(os.getenv("BASELINE_BUCKET_MINUTES", 15))
+# Relative error of the reported percentiles (0.01 = within 1% of the true value)
+BASELINE_ACCURACY = float(os.getenv("BASELINE_ACCURACY", 0.01))
+# Percentiles reported per profile
+BASELINE_PERCENTILES = [int(p) for p in os.getenv("BASELINE_PERCENTILES", "10,25,50,75,90").split(",")]
+# Predictions carry no deviation until their slot has this many levels
+BASELINE_MIN_SAMPLES = int(os.getenv("BASELINE_MIN_SAMPLES", 20))
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+# 1970-01-01 was a Thursday; weeks start on Monday
+_EPOCH_WEEK_OFFSET_MIN = 3 * 24 * 60
+
+# Sketch bin indexes stay within [0, _BIN_SPAN - 1) for values up to ~1e18;
+# -1 holds zeros (and anything below 1)
+_BIN_SPAN = 4096
+
+
+@lru_cache(maxsize=4096)
+def _utc_offset_ms(hour):
+    """Local UTC offset during an hour since the epoch (DST changes on the hour)"""
+    return time.localtime(hour * 3600).tm_gmtoff * 1000
+
+
+def week_bucket(received_ms, bucket_minutes=BASELINE_BUCKET_MINUTES):
+    """Slot of the local-time week (0 = Monday 00:00) an epoch-ms time falls in"""
+    local_ms = received_ms + _utc_offset_ms(received_ms // 3_600_000)
+    return (local_ms // 60_000 + _EPOCH_WEEK_OFFSET_MIN) % MINUTES_PER_WEEK // bucket_minutes
+
+
+def week_buckets(received_ms, bucket_minutes=BASELINE_BUCKET_MINUTES):
+    """week_bucket() of an int64 array"""
+    hours, inverse = np.unique(received_ms // 3_600_000, return_inverse=True)
+    offsets = np.array([_utc_offset_ms(int(hour)) for hour in hours], dtype=np.int64)
+    local_ms = received_ms + offsets[inverse]
+    return (local_ms // 60_000 + _EPOCH_WEEK_OFFSET_MIN) % MINUTES_PER_WEEK // bucket_minutes
+
+
+def bucket_label(bucket, bucket_minutes=BASELINE_BUCKET_MINUTES):
+    """(weekday name, "HH:MM") of a slot's start"""
+    minute = bucket * bucket_minutes
+    day, minute = divmod(minute, 24 * 60)
+    return WEEKDAYS[day], f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def parse_bucket(weekday, time_of_day, bucket_minutes=BASELINE_BUCKET_MINUTES):
+    """Slot of a weekday (monday..sunday or 0-6) and "HH:MM" (raises ValueError)"""
+    weekday = weekday.lower()
+    if weekday in WEEKDAYS:
+        day = WEEKDAYS.index(weekday)
+    elif weekday.isdigit() and int(weekday) < 7:
+        day = int(weekday)
+    else:
+        raise ValueError(f"weekday must be one of {', '.join(WEEKDAYS)} or 0-6")
+    hours, _, minutes = time_of_day.partition(":")
+    if not (hours.isdigit() and minutes.isdigit() and int(hours) < 24 and int(minutes) < 60):
+        raise ValueError("time must be HH:MM")
+    return (day * 24 * 60 + int(hours) * 60 + int(minutes)) // bucket_minutes
+
+
+def profiles_from_rows(rows, bucket_minutes=BASELINE_BUCKET_MINUTES):
+    """/api/baseline profiles from (uid, bucket, metric, summary JSON) rows sorted by uid and slot"""
+    profiles = {}
+    for uid, bucket, metric, summary in rows:
+        profile = profiles.get((uid, bucket))
+        if profile is None:
+            weekday, start = bucket_label(bucket, bucket_minutes)
+            profile = profiles[uid, bucket] = {"uid": uid, "weekday": weekday, "time": start, "bucket": bucket}
+        profile[metric] = json.loads(summary)
+    return list(profiles.values())
+
+
+class QuantileSketch:
+    """
+    Streaming quantile sketch (a DDSketch): values go into logarithmic
+    bins, so any percentile is reported within `accuracy` relative error
+    in a few hundred bins at most, however many values were added. Sketches
+    merge by adding bin counts, which is how new readings are folded in.
+    """
+
+    def __init__(self, accuracy=BASELINE_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.bins = {}  # bin index -> count; -1 = zero
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def bin_indexes(self, values):
+        """Bin of each value of an array"""
+        values = np.asarray(values, dtype=np.float64)
+        indexes = np.full(values.shape, -1, dtype=np.int64)
+        positive = values >= 1
+        indexes[positive] = np.ceil(np.log(values[positive]) / math.log(self.gamma))
+        return np.minimum(indexes, _BIN_SPAN - 2)
+
+    def add(self, value):
+        self.add_bins({int(self.bin_indexes([value])[0]): 1}, 1, value, value, value)
+
+    def add_bins(self, counts, count, total, low, high):
+        """Fold in values already binned: {bin: count}, plus their count, sum, min and max"""
+        for index, n in counts.items():
+            self.bins[index] = self.bins.get(index, 0) + n
+        self.count += count
+        self.total += total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def quantile(self, q):
+        """Value at quantile q (0-1), or None if empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                break
+        value = 0.0 if index < 0 else 2 * self.gamma ** index / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def summary(self, percentiles=BASELINE_PERCENTILES):
+        if not self.count:
+            return {"n": 0}
+        # Percentiles are only good to `accuracy` anyway
+        summary = {"n": self.count, "mean": round(self.total / self.count, 2), "min": self.min, "max": self.max}
+        for p in percentiles:
+            summary[f"p{p}"] = round(self.quantile(p / 100), 1)
+        return summary
+
+    def to_json(self):
+        return json.dumps({"accuracy": self.accuracy, "count": self.count, "total": self.total,
+                           "min": self.min, "max": self.max, "bins": self.bins}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        state = json.loads(text)
+        sketch = cls(state["accuracy"])
+        sketch.bins = {int(index): n for index, n in state["bins"].items()}
+        sketch.count, sketch.total = state["count"], state["total"]
+        sketch.min, sketch.max = state["min"], state["max"]
+        return sketch
+
+
+class BaselineProfiles:
+    """
+    Sketches per (uid, slot, metric), kept in sync with the `baselines`
+    table. refresh() (a worker thread) folds readings stored since the last
+    run into them; deviation() (the event loop) is a dict lookup of the
+    typical level, refreshed along with them.
+    """
+
+    def __init__(self, bucket_minutes=BASELINE_BUCKET_MINUTES, accuracy=BASELINE_ACCURACY,
+                 min_samples=BASELINE_MIN_SAMPLES):
+        if bucket_minutes <= 0 or MINUTES_PER_WEEK % bucket_minutes:
+            raise ValueError(f"BASELINE_BUCKET_MINUTES must divide a week ({MINUTES_PER_WEEK} minutes), "
+                             f"not {bucket_minutes}")
+        self.bucket_minutes = bucket_minutes
+        self.accuracy = accuracy
+        self.min_samples = min_samples
+        self.sketches = {}  # (uid, bucket, metric) -> QuantileSketch
+        self.typical = {}   # (uid, bucket) -> median congestion level
+        self.loaded = False
+        self._stats = {"refreshes": 0, "folded": 0, "refresh_seconds": 0.0}
+
+    def load(self, database):
+        """Read the stored sketches (once, before the first refresh)"""
+        for uid, bucket, metric, sketch in database.load_baselines(self.bucket_minutes):
+            self.sketches[uid, bucket, metric] = QuantileSketch.from_json(sketch)
+        self._update_typical(self.sketches)
+        self.loaded = True
+
+    def _update_typical(self, keys):
+        for uid, bucket, metric in keys:
+            if metric != "congestion_level":
+                continue
+            sketch = self.sketches[uid, bucket, metric]
+            if sketch.count >= self.min_samples:
+                self.typical[uid, bucket] = sketch.quantile(0.5)
+
+    def fold(self, uids, received_ms, metrics):
+        """
+        Add readings: arrays of uid, received_ms and one array per metric
+        name. Returns the (uid, bucket, metric) keys that changed.
+        """
+        if not len(uids):
+            return set()
+        uid_names, uid_codes = np.unique(np.asarray(uids, dtype=object), return_inverse=True)
+        slots = uid_codes * (MINUTES_PER_WEEK // self.bucket_minutes) + week_buckets(
+            np.asarray(received_ms, dtype=np.int64), self.bucket_minutes)
+        slot_ids, inverse = np.unique(slots, return_inverse=True)
+        n = np.bincount(inverse)
+        binner = QuantileSketch(self.accuracy)
+        changed = set()
+        for metric, values in metrics.items():
+            values = np.asarray(values, dtype=np.float64)
+            # Counts per (slot, bin), then sum/min/max per slot
+            keys, counts = np.unique(slots * _BIN_SPAN + binner.bin_indexes(values) + 1, return_counts=True)
+            sums = np.bincount(inverse, weights=values)
+            lows = np.full(len(slot_ids), np.inf)
+            highs = np.full(len(slot_ids), -np.inf)
+            np.minimum.at(lows, inverse, values)
+            np.maximum.at(highs, inverse, values)
+            bins = {}
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                slot, index = divmod(key, _BIN_SPAN)
+                bins.setdefault(slot, {})[index - 1] = count
+            for i, slot in enumerate(slot_ids.tolist()):
+                uid_code, bucket = divmod(slot, MINUTES_PER_WEEK // self.bucket_minutes)
+                key = (uid_names[uid_code], bucket, metric)
+                sketch = self.sketches.get(key)
+                if sketch is None:
+                    sketch = self.sketches[key] = QuantileSketch(self.accuracy)
+                sketch.add_bins(bins[slot], int(n[i]), float(sums[i]), float(lows[i]), float(highs[i]))
+                changed.add(key)
+        return changed
+
+    def refresh(self, database, chunk_size=50_000):
+        """Fold readings stored since the last refresh into the profiles and save them"""
+        start = time.perf_counter()
+        if not self.loaded:
+            self.load(database)
+        folded = 0
+        changed = set()
+        progress = {}
+
+        def save():
+            rows = [(uid, bucket, metric, self.sketches[uid, bucket, metric].to_json(),
+                     json.dumps(self.sketches[uid, bucket, metric].summary(), separators=(",", ":")))
+                    for uid, bucket, metric in changed]
+            database.save_baselines(self.bucket_minutes, rows, progress)
+            self._update_typical(changed)
+            changed.clear()
+            progress.clear()
+
+        day = None
+        for chunk_day, last_id, readings, predictions in database.iter_baseline_inputs(
+                self.bucket_minutes, chunk_size):
+            if day is not None and chunk_day != day:
+                save()  # Sketches and progress are stored together, a partition at a time
+            day = chunk_day
+            if readings:
+                uids, received_ms, gas, headway_ms = zip(*readings)
+                changed |= self.fold(uids, received_ms, {"headway_ms": headway_ms, "gas": gas})
+            if predictions:
+                uids, received_ms, levels = zip(*predictions)
+                changed |= self.fold(uids, received_ms, {"congestion_level": levels})
+            progress[day] = last_id
+            folded += len(readings)
+        if progress:
+            save()
+        self._stats["refreshes"] += 1
+        self._stats["folded"] += folded
+        self._stats["refresh_seconds"] += time.perf_counter() - start
+        return folded
+
+    def deviation(self, uid, received_ms, level):
+        """Level minus the typical (median) level of this uid at this time of week, or None"""
+        typical = self.typical.get((uid, week_bucket(received_ms, self.bucket_minutes)))
+        return None if typical is None else round(level - typical, 1)
+
+    def stats(self):
+        refreshes = self._stats["refreshes"]
+        return {
+            "bucket_minutes": self.bucket_minutes,
+            "profiles": len(self.sketches),
+            "with_typical_level": len(self.typical),
+            "refreshes": refreshes,
+            "folded": self._stats["folded"],
+            "ms_per_refresh": self._stats["refresh_seconds"] / refreshes * 1000 if refreshes else None,
+        }
@@ -1,24 +1,287 @@
+import os
+import gzip
+import json
+import stat
+import hashlib
+import logging
+import itertools
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, date, timedelta
 from pathlib import Path
 from contextlib import contextmanager
+from heapq import merge
 
+from records import (
+    NO_TIMESTAMP, now_ms, format_timestamp_ms, format_local_ms,
+    format_sql_utc_ms, utc_date_ms, utc_day_bounds_ms,
+)
 
-DATABASE_PATH = Path(__file__).parent / "traffic_data.db"
+log = logging.getLogger(f"traffic.{__name__}")
+
+
+DATABASE_PATH = Path(os.getenv("TRAFFIC_DB_PATH", Path(__file__).parent / "traffic_data.db"))
+
+# Readings and predictions live in one SQLite file per (UTC) ingest day.
+# Dropping a day is deleting a file; the main database only keeps the
+# partition catalog and the daily statistics table.
+RETENTION_DAYS = int(os.getenv("TRAFFIC_RETENTION_DAYS", 30))
+
+# Row ids are allocated per partition starting at day.toordinal() * ID_BLOCK,
+# so ids stay unique across partitions and the owning day can be derived
+# from the id alone.
+ID_BLOCK = 100_000_000
+
+# Rows moved per transaction when converting older layouts
+MIGRATION_BATCH_SIZE = int(os.getenv("DB_MIGRATION_BATCH_SIZE", 5000))
+
+# Partition layout version. v2 stores times as INTEGER epoch milliseconds,
+# keeps uids in a `sensors` dimension table and keys predictions by the id
+# of the reading they were computed for.
+SCHEMA_VERSION = 2
+
+# Last ingest journal record whose reading is in this partition, written in
+# the same transaction as the reading (see journal.py)
+JOURNAL_TABLE = '''
+    CREATE TABLE IF NOT EXISTS ingest_journal (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        acked_seq INTEGER NOT NULL
+    )
+'''
+
+PARTITION_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS sensors (
+        id INTEGER PRIMARY KEY,
+        uid TEXT NOT NULL UNIQUE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp_ms INTEGER,
+        sensor_id INTEGER NOT NULL REFERENCES sensors(id),
+        gas INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        headway_ms INTEGER NOT NULL,
+        flag TEXT,
+        received_ms INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS predictions (
+        reading_id INTEGER PRIMARY KEY REFERENCES readings(id),
+        congestion_level INTEGER NOT NULL,
+        congestion_status TEXT NOT NULL,
+        confidence INTEGER NOT NULL,
+        next_minute_prediction INTEGER,
+        next_minute_status TEXT,
+        created_ms INTEGER NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_readings_timestamp ON readings(timestamp_ms)',
+    JOURNAL_TABLE,
+]
+
+# Predictions are only stored for the readings the model was evaluated for
+# (PREDICTION_EVERY/PREDICTION_INTERVAL); a reading's prediction is the
+# latest one at or before it in its partition.
+READINGS_SELECT = '''
+    SELECT r.id, r.timestamp_ms, s.uid, r.gas, r.count, r.headway_ms, r.flag, r.received_ms,
+           (SELECT p.reading_id FROM part.predictions p WHERE p.reading_id <= r.id
+            ORDER BY p.reading_id DESC LIMIT 1) AS prediction_id
+    FROM part.readings r
+    JOIN part.sensors s ON s.id = r.sensor_id
+'''
+
+PREDICTIONS_SELECT = '''
+    SELECT p.reading_id, p.congestion_level, p.congestion_status, p.confidence,
+           p.next_minute_prediction, p.next_minute_status, p.created_ms,
+           r.gas, r.count, r.headway_ms, r.timestamp_ms
+    FROM part.predictions p
+    JOIN part.readings r ON r.id = p.reading_id
+'''
+
+# v1 (text timestamps) -> v2 conversion, run in id-range batches.
+# julianday() understands the sensors' ISO 8601 'Z' timestamps; received_at
+# was written as naive local time, hence the 'utc' modifier.
+EPOCH_MS_SQL = "CAST(ROUND((julianday({}) - 2440587.5) * 86400000) AS INTEGER)"
+
+V1_SENSORS_COPY = '''
+    INSERT OR IGNORE INTO {dst}.sensors (uid)
+    SELECT DISTINCT r.uid FROM {src}.sensor_readings r
+    WHERE r.id > ? AND r.id <= ? {where}
+'''
+
+V1_READINGS_COPY = f'''
+    INSERT OR IGNORE INTO {{dst}}.readings
+    (id, timestamp_ms, sensor_id, gas, count, headway_ms, flag, received_ms)
+    SELECT r.id,
+           {EPOCH_MS_SQL.format("r.timestamp")},
+           s.id, r.gas, r.count, r.headway_ms, r.flag,
+           COALESCE({EPOCH_MS_SQL.format("r.received_at, 'utc'")},
+                    {EPOCH_MS_SQL.format("r.created_at")})
+    FROM {{src}}.sensor_readings r
+    JOIN {{dst}}.sensors s ON s.uid = r.uid
+    WHERE r.id > ? AND r.id <= ? {{where}}
+'''
+
+V1_PREDICTIONS_COPY = f'''
+    INSERT OR IGNORE INTO {{dst}}.predictions
+    (reading_id, congestion_level, congestion_status, confidence,
+     next_minute_prediction, next_minute_status, created_ms)
+    SELECT p.sensor_reading_id, p.congestion_level, p.congestion_status, p.confidence,
+           p.next_minute_prediction, p.next_minute_status,
+           {EPOCH_MS_SQL.format("p.created_at")}
+    FROM {{src}}.{{predictions}} p
+    JOIN {{src}}.sensor_readings r ON r.id = p.sensor_reading_id
+    WHERE p.id > ? AND p.id <= ? {{where}}
+'''
+
+
+_query_scope = threading.local()
+# Connections of the write_batch() running on this thread
+_write_scope = threading.local()
+
+
+@contextmanager
+def cancellable(event):
+    """Abort SQLite statements run in this thread once `event` is set"""
+    _query_scope.cancel_event = event
+    try:
+        yield
+    finally:
+        _query_scope.cancel_event = None
+
+
+def _valid_date(value):
+    try:
+        date.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _archive_date(path):
+    """Date a day archive (readings-<date>.<version>.<etag>.json.gz) is for"""
+    return path.name[len("readings-"):].split(".", 1)[0]
+
+
+def _unlink_archive(path):
+    try:
+        path.unlink(missing_ok=True)
+    except OSError as e:
+        # Still being sent (Windows); it is left for the next cleanup
+        log.debug("Could not delete day archive %s: %s", path.name, e)
+
+
+def _table_exists(conn, name, schema="main"):
+    row = conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                       (name,)).fetchone()
+    return row is not None
+
+
+def _next_batch(conn, table, last_id, batch_size):
+    """Highest id of the next `batch_size` rows after last_id, or None when done"""
+    row = conn.execute(f'''
+        SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)
+    ''', (last_id, batch_size)).fetchone()
+    return row[0]
+
+
+def _reading_row(row):
+    """API shape of a v2 readings row"""
+    return {
+        "id": row["id"],
+        "timestamp": format_timestamp_ms(row["timestamp_ms"]),
+        "uid": row["uid"],
+        "gas": row["gas"],
+        "count": row["count"],
+        "headway_ms": row["headway_ms"],
+        "flag": row["flag"],
+        "received_at": format_local_ms(row["received_ms"]),
+        "created_at": format_sql_utc_ms(row["received_ms"]),
+        "prediction_id": row["prediction_id"],
+    }
+
+
+def _prediction_row(row):
+    """API shape of a v2 prediction joined with its reading"""
+    return {
+        "id": row["reading_id"],
+        "sensor_reading_id": row["reading_id"],
+        "congestion_level": row["congestion_level"],
+        "congestion_status": row["congestion_status"],
+        "confidence": row["confidence"],
+        "next_minute_prediction": row["next_minute_prediction"],
+        "next_minute_status": row["next_minute_status"],
+        "created_at": format_sql_utc_ms(row["created_ms"]),
+        "gas": row["gas"],
+        "count": row["count"],
+        "headway_ms": row["headway_ms"],
+        "timestamp": format_timestamp_ms(row["timestamp_ms"]),
+    }
+
+
+def utc_today():
+    """Current UTC date (partition key of new rows)"""
+    return datetime.utcnow().date()
 
 
 class TrafficDatabase:
-    """SQLite database for traffic sensor data"""
-    
-    def __init__(self, db_path=DATABASE_PATH):
-        self.db_path = db_path
-        self.init_db()
-    
+    """SQLite database for traffic sensor data, partitioned by day"""
+
+    def __init__(self, db_path=DATABASE_PATH, partition_dir=None, lazy=False):
+        self.db_path = Path(db_path)
+        if partition_dir is None:
+            partition_dir = self.db_path.with_name(self.db_path.stem + "_partitions")
+        self.partition_dir = Path(partition_dir)
+        self._lock = threading.RLock()
+        self._partitions = {}
+        self._archives = {}
+        self._sensor_ids = {}
+        self._migrate_lock = threading.Lock()
+        self.migration_thread = None
+        # Bumped on every change to readings/predictions (ETags of API responses)
+        self._write_counter = itertools.count(1)
+        self.write_seq = 0
+        # Bumped whenever the partition catalog changes (shared with API workers)
+        self.catalog_seq = 0
+        self._open_lock = threading.Lock()
+        self.is_open = False
+        if not lazy:
+            self.open()
+
+    def open(self, migrate_unpartitioned=True):
+        """
+        Create/migrate the schema once; lazy instances defer this until
+        startup. With migrate_unpartitioned=False the rows of a
+        pre-partitioning database stay where they are until
+        migrate_unpartitioned() is called (migrate_db.py measures them first).
+        """
+        with self._open_lock:
+            if not self.is_open:
+                self.init_db(migrate_unpartitioned)
+                self.is_open = True
+        return self
+
+    def _connect(self, path=None, readonly=False):
+        uri = Path(path or self.db_path).resolve().as_uri()
+        if readonly:
+            uri += "?mode=ro"
+        # URI mode also lets ATTACH open sealed partitions read-only
+        conn = sqlite3.connect(uri, uri=True)
+        conn.row_factory = sqlite3.Row
+        cancel_event = getattr(_query_scope, "cancel_event", None)
+        if cancel_event is not None:
+            # A true return value interrupts the running statement
+            conn.set_progress_handler(cancel_event.is_set, 1000)
+        return conn
+
     @contextmanager
-    def get_connection(self):
+    def get_connection(self, path=None, readonly=False):
         """Get database connection context"""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
+        conn = self._connect(path, readonly)
         try:
             yield conn
             conn.commit()
@@ -27,42 +290,31 @@ class TrafficDatabase:
             raise e
         finally:
             conn.close()
-    
-    def init_db(self):
+
+    def init_db(self, migrate_unpartitioned=True):
         """Initialize database tables"""
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            # Sensor readings table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sensor_readings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    uid TEXT NOT NULL,
-                    gas INTEGER NOT NULL,
-                    count INTEGER NOT NULL,
-                    headway_ms INTEGER NOT NULL,
-                    flag TEXT,
-                    received_at TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Predictions table
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+            # Partition catalog: one row per day file
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS predictions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sensor_reading_id INTEGER NOT NULL,
-                    congestion_level INTEGER NOT NULL,
-                    congestion_status TEXT NOT NULL,
-                    confidence INTEGER NOT NULL,
-                    next_minute_prediction INTEGER,
-                    next_minute_status TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (sensor_reading_id) REFERENCES sensor_readings(id)
+                CREATE TABLE IF NOT EXISTS partitions (
+                    day TEXT PRIMARY KEY,
+                    sealed INTEGER NOT NULL DEFAULT 0,
+                    reading_count INTEGER,
+                    min_date TEXT,
+                    max_date TEXT,
+                    schema_version INTEGER NOT NULL DEFAULT 1
                 )
             ''')
-            
+            columns = {row['name'] for row in cursor.execute('PRAGMA table_info(partitions)')}
+            if 'schema_version' not in columns:
+                cursor.execute('ALTER TABLE partitions ADD COLUMN '
+                               'schema_version INTEGER NOT NULL DEFAULT 1')
+
             # Statistics table (for aggregated data)
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS statistics (
@@ -78,169 +330,956 @@ class TrafficDatabase:
                     UNIQUE(date)
                 )
             ''')
-            
-            # Create indices for faster queries
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_uid ON sensor_readings(uid)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_congestion_status ON predictions(congestion_status)')
-            
+
+            # Time-of-week baseline sketches and how far into each partition
+            # they have been folded (see baseline.py)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS baselines (
+                    bucket_minutes INTEGER NOT NULL,
+                    uid TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    metric TEXT NOT NULL,
+                    sketch TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    PRIMARY KEY (bucket_minutes, uid, bucket, metric)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS baseline_progress (
+                    bucket_minutes INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    last_id INTEGER NOT NULL,
+                    PRIMARY KEY (bucket_minutes, day)
+                )
+            ''')
+
             conn.commit()
-            print(f"✓ Database initialized at {self.db_path}")
-    
-    def insert_reading(self, timestamp, uid, gas, count, headway_ms, flag, received_at):
-        """Insert a sensor reading"""
+
+            cursor.execute('SELECT * FROM partitions')
+            self._partitions = {row['day']: dict(row) for row in cursor.fetchall()}
+
+        if migrate_unpartitioned:
+            self.migrate_unpartitioned()
+
+        # v1 partitions get the v2 tables right away so new rows can land in
+        # them; their old rows are moved over by migrate_pending()
+        for day in self.pending_migrations():
+            self._prepare_v2(day)
+
+        # Zone maps of open partitions are kept in memory and persisted on seal
+        for day, info in self._partitions.items():
+            if not info["sealed"] and self.partition_path(day).exists():
+                zone = self._zone_map(self.partition_path(day))
+                info.update(min_date=zone['min_date'], max_date=zone['max_date'])
+
+        self.catalog_seq += 1
+        print(f"✓ Database initialized at {self.db_path}")
+
+    def _changed(self):
+        self.write_seq = next(self._write_counter)
+
+    def catalog(self):
+        """Copy of the in-memory partition catalog, zone maps included"""
+        with self._lock:
+            return {day: dict(info) for day, info in self._partitions.items()}
+
+    def load_catalog(self, partitions):
+        """
+        Serve reads from a catalog kept by another process.
+
+        API workers never open the database read-write: the ingest process
+        owns schema changes, migrations and writes, and sends its catalog
+        over the ingest bus instead.
+        """
+        with self._lock:
+            self._partitions = partitions
+            self.catalog_seq += 1
+            self.is_open = True
+
+    # ------------------------------------------------------------------
+    # Partition management
+    # ------------------------------------------------------------------
+
+    def partition_path(self, day):
+        """Path of the partition file holding a given day"""
+        return self.partition_dir / f"{day}.db"
+
+    def day_for_id(self, row_id):
+        """Partition day of a reading/prediction id (None if no partition holds it)"""
+        if row_id >= ID_BLOCK:
+            return date.fromordinal(row_id // ID_BLOCK).isoformat()
+        return self._legacy_day_for_id(row_id)
+
+    def _legacy_day_for_id(self, row_id):
+        """
+        Partition holding an id from before partitioning: those rows kept
+        their ids when they were moved into the partition of their date
+        """
+        for day, cursor in self._each_partition(self._days()):
+            for table in ("readings", "sensor_readings"):
+                if (_table_exists(cursor.connection, table, "part") and
+                        cursor.execute(f'SELECT 1 FROM part.{table} WHERE id = ?', (row_id,)).fetchone()):
+                    return day
+        return None
+
+    def _create_schema(self, conn, day):
+        """Create the v2 tables in a partition and seed its id block"""
+        cursor = conn.cursor()
+        for statement in PARTITION_SCHEMA:
+            cursor.execute(statement)
+        # Seed AUTOINCREMENT so ids start in this day's block (and above any
+        # ids still waiting to be converted from the v1 table)
+        seed = date.fromisoformat(day).toordinal() * ID_BLOCK
+        if _table_exists(conn, 'sensor_readings'):
+            row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'sensor_readings'").fetchone()
+            seed = max(seed, row[0] if row else 0)
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'readings'")
+        if cursor.fetchone() is None:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('readings', ?)", (seed,))
+
+    def _ensure_partition(self, day):
+        """Create the partition file for a day if it does not exist yet"""
+        if day in self._partitions:
+            return
+        with self._lock:
+            if day in self._partitions:
+                return
+            with self.get_connection(self.partition_path(day)) as conn:
+                # WAL lets the ingest writer and API readers proceed concurrently
+                conn.execute('PRAGMA journal_mode=WAL')
+                self._create_schema(conn, day)
+            with self.get_connection() as conn:
+                conn.execute('INSERT OR IGNORE INTO partitions (day, schema_version) VALUES (?, ?)',
+                             (day, SCHEMA_VERSION))
+            self._partitions[day] = {"day": day, "sealed": 0, "reading_count": None,
+                                     "min_date": None, "max_date": None,
+                                     "schema_version": SCHEMA_VERSION}
+            self.catalog_seq += 1
+
+    def _days(self, since=None, newest_first=True):
+        """Known partition days, optionally limited to days >= since"""
+        days = sorted(self._partitions, reverse=newest_first)
+        if since:
+            days = [d for d in days if d >= since]
+        return days
+
+    def _days_containing(self, day):
+        """Partitions that may hold readings whose timestamp falls on day"""
+        days = []
+        for d in self._days():
+            info = self._partitions[d]
+            if info["min_date"] and info["min_date"] <= day <= info["max_date"]:
+                days.append(d)
+        return days
+
+    def _zone_map(self, path):
+        """Row count and timestamp date range of a partition file"""
+        with self.get_connection(path, readonly=True) as conn:
+            cursor = conn.cursor()
+            if _table_exists(conn, 'sensor_readings'):
+                # Not converted yet: the v1 rows describe the partition
+                cursor.execute('''
+                    SELECT (SELECT COUNT(*) FROM sensor_readings) +
+                           (SELECT COUNT(*) FROM readings) AS count,
+                           MIN(DATE(timestamp)) AS min_date,
+                           MAX(DATE(timestamp)) AS max_date
+                    FROM sensor_readings
+                ''')
+                return dict(cursor.fetchone())
+            cursor.execute('''
+                SELECT COUNT(*) AS count, MIN(timestamp_ms) AS min_ms, MAX(timestamp_ms) AS max_ms
+                FROM readings
+            ''')
+            row = cursor.fetchone()
+            return {
+                "count": row['count'],
+                "min_date": utc_date_ms(row['min_ms']) if row['min_ms'] is not None else None,
+                "max_date": utc_date_ms(row['max_ms']) if row['max_ms'] is not None else None,
+            }
+
+    def _note_reading_date(self, day, reading_date):
+        """Widen an open partition's zone map; drop a stale day archive"""
+        if reading_date is None:
+            return
+        info = self._partitions[day]
+        if info["min_date"] is None or reading_date < info["min_date"]:
+            info["min_date"] = reading_date
+            self.catalog_seq += 1
+        if info["max_date"] is None or reading_date > info["max_date"]:
+            info["max_date"] = reading_date
+            self.catalog_seq += 1
+        if reading_date in self._archives:
+            self._drop_archive(reading_date)
+
+    @contextmanager
+    def _attached(self):
+        """Connection to the main database that partitions can be attached to"""
         with self.get_connection() as conn:
+            def attach(day, schema="part"):
+                sealed = self._partitions.get(day, {}).get("sealed")
+                uri = self.partition_path(day).resolve().as_uri()
+                if sealed:
+                    uri += "?mode=ro"
+                conn.execute('ATTACH DATABASE ? AS ' + schema, (uri,))
+
+            def detach(schema="part"):
+                conn.commit()
+                conn.execute('DETACH DATABASE ' + schema)
+
+            yield conn, attach, detach
+
+    def _each_partition(self, days):
+        """Yield (day, cursor) with each partition attached as `part` in turn"""
+        with self._attached() as (conn, attach, detach):
+            for day in days:
+                if not self.partition_path(day).exists():
+                    continue
+                attach(day)
+                try:
+                    yield day, conn.cursor()
+                finally:
+                    detach()
+
+    def _partition_count(self, day, cursor, table="readings"):
+        """Row count of a table in an attached partition (cached once sealed)"""
+        info = self._partitions[day]
+        settled = info["sealed"] and info["schema_version"] == SCHEMA_VERSION
+        cache_key = "reading_count" if table == "readings" else f"{table}_count"
+        if settled and info.get(cache_key) is not None:
+            return info[cache_key]
+        cursor.execute(f'SELECT COUNT(*) AS count FROM part.{table}')
+        count = cursor.fetchone()['count']
+        if settled:
+            info[cache_key] = count
+        return count
+
+    def _paged(self, days, table, sql, limit, offset, to_dict):
+        """Run a newest-first query over partitions, applying a global LIMIT/OFFSET"""
+        results = []
+        for day, cursor in self._each_partition(days):
+            if len(results) >= limit:
+                break
+            count = self._partition_count(day, cursor, table)
+            if offset >= count:
+                offset -= count
+                continue
+            cursor.execute(sql, (limit - len(results), offset))
+            results.extend(to_dict(row) for row in cursor.fetchall())
+            offset = 0
+        return results
+
+    # ------------------------------------------------------------------
+    # Migrations from older layouts
+    # ------------------------------------------------------------------
+
+    def has_unpartitioned(self):
+        """True while the main database still holds pre-partitioning rows"""
+        with self.get_connection() as conn:
+            return _table_exists(conn, 'sensor_readings')
+
+    def migrate_unpartitioned(self, batch_size=MIGRATION_BATCH_SIZE, progress=None):
+        """
+        Move rows of a pre-partitioning database into v2 day partitions;
+        progress(day, moved) is called for each day of each batch
+        """
+        with self.get_connection() as conn:
+            if not _table_exists(conn, 'sensor_readings'):
+                if _table_exists(conn, 'predictions'):
+                    conn.execute('DROP TABLE predictions')
+                return 0
+
+        moved = 0
+        with self._attached() as (conn, attach, detach):
+            has_predictions = _table_exists(conn, 'predictions')
+
+            # Each batch is copied and deleted in one transaction, so an
+            # interrupted migration resumes where it stopped
+            while True:
+                hi = _next_batch(conn, 'main.sensor_readings', 0, batch_size)
+                if hi is None:
+                    break
+                days = [row[0] for row in conn.execute('''
+                    SELECT DISTINCT DATE(created_at) FROM main.sensor_readings WHERE id <= ?
+                ''', (hi,))]
+                batch_progress = []
+                for day in days:
+                    day = day or utc_today().isoformat()
+                    self._ensure_partition(day)
+                    where = "AND COALESCE(DATE(r.created_at), ?) = ?"
+                    attach(day)
+                    conn.execute(V1_SENSORS_COPY.format(src="main", dst="part", where=where),
+                                 (0, hi, day, day))
+                    copied = conn.execute(V1_READINGS_COPY.format(src="main", dst="part", where=where),
+                                          (0, hi, day, day)).rowcount
+                    batch_progress.append((day, copied))
+                    if has_predictions:
+                        conn.execute(V1_PREDICTIONS_COPY.format(
+                            src="main", dst="part", predictions="predictions",
+                            where="AND r.id <= ? " + where), (0, 2 ** 63 - 1, hi, day, day))
+                    detach()
+                if has_predictions:
+                    conn.execute('DELETE FROM main.predictions WHERE sensor_reading_id <= ?', (hi,))
+                cursor = conn.execute('DELETE FROM main.sensor_readings WHERE id <= ?', (hi,))
+                moved += cursor.rowcount
+                conn.commit()
+                if progress:
+                    for day, count in batch_progress:
+                        progress(day, count)
+
+            conn.execute('DROP TABLE main.sensor_readings')
+            if has_predictions:
+                conn.execute('DROP TABLE main.predictions')
+            conn.commit()
+            conn.execute('VACUUM')
+
+        print(f"✓ Moved {moved} reading(s) into day partitions")
+        return moved
+
+    def pending_migrations(self):
+        """Partition days still stored in an older layout"""
+        return [day for day in self._days(newest_first=False)
+                if self._partitions[day]["schema_version"] < SCHEMA_VERSION]
+
+    def _prepare_v2(self, day):
+        """Make a v1 partition writable and add the v2 tables next to the old ones"""
+        path = self.partition_path(day)
+        if not path.exists():
+            return
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        with self.get_connection(path) as conn:
+            # v1 and v2 both call it `predictions`; park the old table first
+            if _table_exists(conn, 'predictions') and not _table_exists(conn, 'predictions_v1'):
+                columns = {row['name'] for row in conn.execute('PRAGMA table_info(predictions)')}
+                if 'sensor_reading_id' in columns:
+                    conn.execute('ALTER TABLE predictions RENAME TO predictions_v1')
+            self._create_schema(conn, day)
+
+    def migrate_partition(self, day, batch_size=MIGRATION_BATCH_SIZE):
+        """Convert one v1 partition to v2 in place, a batch per transaction"""
+        path = self.partition_path(day)
+        info = self._partitions[day]
+        self._prepare_v2(day)
+        moved = 0
+        if path.exists():
+            with self.get_connection(path) as conn:
+                while _table_exists(conn, 'sensor_readings'):
+                    hi = _next_batch(conn, 'sensor_readings', 0, batch_size)
+                    if hi is None:
+                        conn.execute('DROP TABLE sensor_readings')
+                        break
+                    conn.execute(V1_SENSORS_COPY.format(src="main", dst="main", where=""), (0, hi))
+                    cursor = conn.execute(
+                        V1_READINGS_COPY.format(src="main", dst="main", where=""), (0, hi))
+                    moved += cursor.rowcount
+                    conn.execute('DELETE FROM sensor_readings WHERE id <= ?', (hi,))
+                    conn.commit()
+
+                while _table_exists(conn, 'predictions_v1'):
+                    hi = _next_batch(conn, 'predictions_v1', 0, batch_size)
+                    if hi is None:
+                        conn.execute('DROP TABLE predictions_v1')
+                        break
+                    # Readings are gone by now; keep every v1 prediction row
+                    conn.execute(f'''
+                        INSERT OR IGNORE INTO predictions
+                        (reading_id, congestion_level, congestion_status, confidence,
+                         next_minute_prediction, next_minute_status, created_ms)
+                        SELECT sensor_reading_id, congestion_level, congestion_status, confidence,
+                               next_minute_prediction, next_minute_status,
+                               {EPOCH_MS_SQL.format("created_at")}
+                        FROM predictions_v1 WHERE id <= ?
+                    ''', (hi,))
+                    conn.execute('DELETE FROM predictions_v1 WHERE id <= ?', (hi,))
+                    conn.commit()
+
+            if info["sealed"]:
+                self._compact(path)
+
+        zone = self._zone_map(path) if path.exists() else {"count": 0, "min_date": None,
+                                                             "max_date": None}
+        with self._lock:
+            with self.get_connection() as conn:
+                conn.execute('''
+                    UPDATE partitions
+                    SET schema_version = ?, reading_count = ?, min_date = ?, max_date = ?
+                    WHERE day = ?
+                ''', (SCHEMA_VERSION, zone['count'], zone['min_date'], zone['max_date'], day))
+            info.update(schema_version=SCHEMA_VERSION, reading_count=zone['count'],
+                        min_date=zone['min_date'], max_date=zone['max_date'])
+            self.catalog_seq += 1
+        self._changed()
+        return moved
+
+    def migrate_pending(self, batch_size=MIGRATION_BATCH_SIZE, progress=None):
+        """Convert every v1 partition, oldest first; returns readings converted"""
+        total = 0
+        with self._migrate_lock:
+            for day in self.pending_migrations():
+                try:
+                    moved = self.migrate_partition(day, batch_size)
+                except Exception as e:
+                    log.error("Error migrating partition %s: %s", day, e)
+                    continue
+                total += moved
+                if progress:
+                    progress(day, moved)
+        return total
+
+    def start_migration(self):
+        """Convert pending partitions on a background thread; reads keep working meanwhile"""
+        if not self.pending_migrations() or self.migration_thread is not None:
+            return None
+        self.migration_thread = threading.Thread(
+            target=self.migrate_pending, name="db-migrate", daemon=True)
+        self.migration_thread.start()
+        return self.migration_thread
+
+    # ------------------------------------------------------------------
+    # Sealing and retention
+    # ------------------------------------------------------------------
+
+    def _compact(self, path):
+        """VACUUM a partition file and make it read-only"""
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        conn = sqlite3.connect(str(path))
+        try:
+            conn.execute('VACUUM')
+            # Read-only files cannot maintain a WAL index
+            conn.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            conn.close()
+        os.chmod(path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+
+    def seal_partition(self, day):
+        """Compact a closed partition, record its zone map and make it read-only"""
+        path = self.partition_path(day)
+        with self._lock:
+            info = self._partitions.get(day)
+            if not info or info["sealed"] or info["schema_version"] < SCHEMA_VERSION:
+                return False
+
+            row = self._zone_map(path)
+            self._compact(path)
+
+            with self.get_connection() as conn:
+                conn.execute('''
+                    UPDATE partitions
+                    SET sealed = 1, reading_count = ?, min_date = ?, max_date = ?
+                    WHERE day = ?
+                ''', (row['count'], row['min_date'], row['max_date'], day))
+            info.update(sealed=1, reading_count=row['count'],
+                        min_date=row['min_date'], max_date=row['max_date'])
+            self.catalog_seq += 1
+            return True
+
+    def drop_partition(self, day):
+        """Delete a partition file; returns the number of readings it held"""
+        path = self.partition_path(day)
+        with self._lock:
+            if day not in self._partitions:
+                return 0
+            count = self._zone_map(path)['count'] if path.exists() else 0
+            for suffix in ("", "-journal", "-wal", "-shm"):
+                leftover = path.with_name(path.name + suffix)
+                if leftover.exists():
+                    os.chmod(leftover, stat.S_IREAD | stat.S_IWRITE)
+                    leftover.unlink()
+            with self.get_connection() as conn:
+                conn.execute('DELETE FROM partitions WHERE day = ?', (day,))
+            info = self._partitions.pop(day)
+            self.catalog_seq += 1
+            self._changed()
+            self._sensor_ids = {k: v for k, v in self._sensor_ids.items() if k[0] != day}
+
+            # Day archives built from this partition (by any process) go with it
+            if info["min_date"]:
+                for path in self._archive_files():
+                    if info["min_date"] <= _archive_date(path) <= info["max_date"]:
+                        _unlink_archive(path)
+            self._archives = {d: a for d, a in self._archives.items() if a[0].exists()}
+            return count
+
+    # ------------------------------------------------------------------
+    # Day archives: closed days materialized as gzip JSON responses
+    # ------------------------------------------------------------------
+
+    def is_day_closed(self, date):
+        """True once no open partition can receive readings for a date"""
+        if date >= (utc_today() - timedelta(days=1)).isoformat():
+            return False
+        days = self._days_containing(date)
+        return bool(days) and all(
+            self._partitions[d]["sealed"] and self._partitions[d]["schema_version"] == SCHEMA_VERSION
+            for d in days)
+
+    def _archive_version(self, days):
+        """
+        Fingerprint of the sealed partitions a closed date is read from; it
+        is part of the archive's file name, so any process can tell whether
+        an archive (built by itself or another process) is still current
+        """
+        key = ",".join(f"{d}:{self._partitions[d]['reading_count']}" for d in days)
+        return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+    def _archive_files(self, date="*"):
+        return list(self.partition_dir.glob(f"readings-{date}.*.json.gz"))
+
+    def get_day_archive(self, date):
+        """(path, etag) of the gzip JSON response for a closed date, built on first use"""
+        if not _valid_date(date) or not self.is_day_closed(date):
+            return None
+        version = self._archive_version(self._days_containing(date))
+        archive = self._archives.get(date)
+        if archive and archive[2] == version and archive[0].exists():
+            return archive[:2]
+
+        # Built by another process (API workers and the ingest process share the directory)
+        for path in self._archive_files(date):
+            name_version, etag = path.name.split(".")[1:3]
+            if name_version == version:
+                self._archives[date] = (path, etag, version)
+                return path, etag
+
+        readings = self.get_readings_by_date(date)
+        body = json.dumps({"date": date, "readings": readings, "count": len(readings)},
+                          ensure_ascii=False, separators=(",", ":"))
+        data = gzip.compress(body.encode("utf-8"), mtime=0)
+        etag = hashlib.sha256(data).hexdigest()[:16]
+        path = self.partition_dir / f"readings-{date}.{version}.{etag}.json.gz"
+        # Per process and thread: concurrent builders never share a temp file
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        # Older versions of this date's archive are stale now
+        for stale in self._archive_files(date):
+            if stale != path:
+                _unlink_archive(stale)
+        self._archives[date] = (path, etag, version)
+        return path, etag
+
+    def _drop_archive(self, date):
+        self._archives.pop(date, None)
+        for path in self._archive_files(date):
+            _unlink_archive(path)
+
+    def run_maintenance(self, retention_days=RETENTION_DAYS):
+        """Refresh statistics, seal closed partitions and drop expired ones"""
+        self.update_statistics()
+
+        # Keep yesterday writable: a prediction may still land there right after midnight
+        seal_before = (utc_today() - timedelta(days=1)).isoformat()
+        sealed = [day for day in self._days(newest_first=False)
+                  if day < seal_before and self.seal_partition(day)]
+        deleted = self.clear_old_data(retention_days)
+        return {"sealed": sealed, "deleted_readings": deleted}
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _sensor_id(self, conn, day, uid):
+        """Id of a uid in a partition's sensors table"""
+        key = (day, uid)
+        sensor_id = self._sensor_ids.get(key)
+        if sensor_id is None:
+            conn.execute('INSERT OR IGNORE INTO sensors (uid) VALUES (?)', (uid,))
+            sensor_id = conn.execute('SELECT id FROM sensors WHERE uid = ?', (uid,)).fetchone()[0]
+            self._sensor_ids[key] = sensor_id
+        return sensor_id
+
+    @contextmanager
+    def write_batch(self):
+        """
+        Make this thread's inserts one transaction per partition, committed
+        when the block exits (or all rolled back if it raises).
+        """
+        if getattr(_write_scope, "connections", None) is not None:
+            yield
+            return
+        connections = _write_scope.connections = {}
+        journal_seqs = _write_scope.journal_seqs = {}
+        try:
+            yield
+            for path, conn in connections.items():
+                if path in journal_seqs:
+                    self._record_journal_seq(conn, journal_seqs[path])
+                conn.commit()
+        except BaseException:
+            for conn in connections.values():
+                conn.rollback()
+            # Ids cached by _sensor_id() may belong to rolled back rows
+            self._sensor_ids.clear()
+            raise
+        finally:
+            for conn in connections.values():
+                conn.close()
+            _write_scope.connections = _write_scope.journal_seqs = None
+            self._changed()
+
+    @contextmanager
+    def _write_connection(self, path):
+        """The current write_batch()'s connection to a partition, or one committed on exit"""
+        connections = getattr(_write_scope, "connections", None)
+        if connections is None:
+            with self.get_connection(path) as conn:
+                yield conn
+            return
+        if path not in connections:
+            connections[path] = self._connect(path)
+        yield connections[path]
+
+    @staticmethod
+    def _record_journal_seq(conn, journal_seq):
+        # Partitions created before the journal existed lack the table
+        conn.execute(JOURNAL_TABLE)
+        conn.execute('INSERT OR REPLACE INTO ingest_journal (id, acked_seq) VALUES (0, ?)',
+                     (journal_seq,))
+
+    def journal_acked(self):
+        """Last ingest journal record stored with a reading (-1 if none)"""
+        # Readings are written in journal order, so the newest partition that
+        # has a position has the latest one
+        for day in self._days():
+            path = self.partition_path(day)
+            if not path.exists():
+                continue
+            with self.get_connection(path, readonly=True) as conn:
+                if _table_exists(conn, 'ingest_journal'):
+                    row = conn.execute('SELECT acked_seq FROM ingest_journal').fetchone()
+                    if row is not None:
+                        return row[0]
+        return -1
+
+    def insert_reading(self, timestamp_ms, uid, gas, count, headway_ms, flag, received_ms,
+                       journal_seq=None):
+        """Insert a sensor reading (times in epoch milliseconds)"""
+        day = utc_today().isoformat()
+        self._ensure_partition(day)
+        if timestamp_ms == NO_TIMESTAMP:
+            timestamp_ms = None
+        path = self.partition_path(day)
+        with self._write_connection(path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO sensor_readings 
-                (timestamp, uid, gas, count, headway_ms, flag, received_at)
+                INSERT INTO readings
+                (timestamp_ms, sensor_id, gas, count, headway_ms, flag, received_ms)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (timestamp, uid, gas, count, headway_ms, flag, received_at))
-            return cursor.lastrowid
-    
-    def insert_prediction(self, sensor_reading_id, congestion_level, congestion_status, 
-                         confidence, next_minute_prediction, next_minute_status):
-        """Insert a prediction"""
-        with self.get_connection() as conn:
+            ''', (timestamp_ms, self._sensor_id(conn, day, uid), gas, count,
+                  headway_ms, flag, received_ms))
+            reading_id = cursor.lastrowid
+            if journal_seq is not None:
+                if getattr(_write_scope, "journal_seqs", None) is not None:
+                    # Recorded once per batch, at commit
+                    _write_scope.journal_seqs[path] = journal_seq
+                else:
+                    self._record_journal_seq(conn, journal_seq)
+        self._changed()
+        if timestamp_ms is not None:
+            self._note_reading_date(day, utc_date_ms(timestamp_ms))
+        return reading_id
+
+    def insert_prediction(self, sensor_reading_id, congestion_level, congestion_status,
+                         confidence, next_minute_prediction, next_minute_status, created_ms=None):
+        """Insert a prediction (stored in the partition of its reading)"""
+        day = self.day_for_id(sensor_reading_id)
+        if day is None:
+            raise ValueError(f"No partition holds reading {sensor_reading_id}")
+        self._ensure_partition(day)
+        with self._write_connection(self.partition_path(day)) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO predictions 
-                (sensor_reading_id, congestion_level, congestion_status, confidence, 
-                 next_minute_prediction, next_minute_status)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT OR REPLACE INTO predictions
+                (reading_id, congestion_level, congestion_status, confidence,
+                 next_minute_prediction, next_minute_status, created_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (sensor_reading_id, congestion_level, congestion_status, confidence,
-                  next_minute_prediction, next_minute_status))
-            return cursor.lastrowid
-    
+                  next_minute_prediction, next_minute_status, created_ms or now_ms()))
+        self._changed()
+        return sensor_reading_id
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
     def get_readings(self, limit=100, offset=0):
         """Get sensor readings with limit and offset"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM sensor_readings 
-                ORDER BY created_at DESC 
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-    
+        return self._paged(self._days(), "readings", READINGS_SELECT + '''
+            ORDER BY r.id DESC
+            LIMIT ? OFFSET ?
+        ''', limit, offset, _reading_row)
+
     def get_readings_by_date(self, date):
         """Get readings for a specific date"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM sensor_readings 
-                WHERE DATE(timestamp) = ? 
-                ORDER BY timestamp DESC
-            ''', (date,))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-    
+        if not _valid_date(date):
+            return []
+        start_ms, end_ms = utc_day_bounds_ms(date)
+        per_partition = []
+        for day, cursor in self._each_partition(self._days_containing(date)):
+            cursor.execute(READINGS_SELECT + '''
+                WHERE r.timestamp_ms >= ? AND r.timestamp_ms < ?
+                ORDER BY r.timestamp_ms DESC
+            ''', (start_ms, end_ms))
+            per_partition.append(cursor.fetchall())
+        rows = merge(*per_partition, key=lambda r: r['timestamp_ms'], reverse=True)
+        return [_reading_row(row) for row in rows]
+
+    def iter_readings(self, chunk_size=10_000, since=None, until=None):
+        """
+        Stream every reading oldest first, in lists of up to chunk_size
+        (id, timestamp_ms, uid, gas, count, headway_ms, flag, received_ms,
+        prediction_id) tuples. since/until limit the partition (ingest) days, inclusive.
+        """
+        days = [d for d in self._days(since, newest_first=False) if until is None or d <= until]
+        for day, cursor in self._each_partition(days):
+            cursor.row_factory = None  # plain tuples: no per-row dict/Row cost
+            last_id = 0
+            while True:
+                cursor.execute(READINGS_SELECT + '''
+                    WHERE r.id > ?
+                    ORDER BY r.id
+                    LIMIT ?
+                ''', (last_id, chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                yield rows
+                last_id = rows[-1][0]
+
     def get_predictions(self, limit=100, offset=0):
         """Get predictions with sensor data"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.*, r.gas, r.count, r.headway_ms, r.timestamp
-                FROM predictions p
-                JOIN sensor_readings r ON p.sensor_reading_id = r.id
-                ORDER BY p.created_at DESC
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-    
+        return self._paged(self._days(), "predictions", PREDICTIONS_SELECT + '''
+            ORDER BY p.reading_id DESC
+            LIMIT ? OFFSET ?
+        ''', limit, offset, _prediction_row)
+
     def get_congestion_summary(self, hours=24):
         """Get congestion summary for last N hours"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        since_ms = now_ms() - hours * 3_600_000
+        totals = {}
+        for day, cursor in self._each_partition(self._days(utc_date_ms(since_ms))):
             cursor.execute('''
-                SELECT 
+                SELECT
                     congestion_status,
                     COUNT(*) as count,
-                    AVG(congestion_level) as avg_level,
+                    SUM(congestion_level) as sum_level,
                     MAX(congestion_level) as max_level,
                     MIN(congestion_level) as min_level
-                FROM predictions
-                WHERE created_at >= datetime('now', '-' || ? || ' hours')
+                FROM part.predictions
+                WHERE created_ms >= ?
                 GROUP BY congestion_status
-            ''', (hours,))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-    
+            ''', (since_ms,))
+            for row in cursor.fetchall():
+                total = totals.setdefault(row['congestion_status'], {
+                    "congestion_status": row['congestion_status'],
+                    "count": 0, "sum_level": 0,
+                    "max_level": row['max_level'], "min_level": row['min_level'],
+                })
+                total["count"] += row['count']
+                total["sum_level"] += row['sum_level']
+                total["max_level"] = max(total["max_level"], row['max_level'])
+                total["min_level"] = min(total["min_level"], row['min_level'])
+
+        summary = []
+        for status in sorted(totals):
+            total = totals[status]
+            summary.append({
+                "congestion_status": status,
+                "count": total["count"],
+                "avg_level": total.pop("sum_level") / total["count"],
+                "max_level": total["max_level"],
+                "min_level": total["min_level"],
+            })
+        return summary
+
     def get_statistics(self, date=None):
         """Get daily statistics"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
+
             if not date:
-                date = datetime.now().strftime('%Y-%m-%d')
-            
+                date = utc_today().isoformat()
+
             cursor.execute('''
                 SELECT * FROM statistics WHERE date = ?
             ''', (date,))
             row = cursor.fetchone()
             return dict(row) if row else None
-    
+
     def update_statistics(self):
         """Calculate and update daily statistics"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            today = datetime.now().strftime('%Y-%m-%d')
-            
-            # Calculate statistics
+        today = utc_today().isoformat()
+        start_ms, end_ms = utc_day_bounds_ms(today)
+
+        # Calculate statistics
+        count = 0
+        gas_sum = headway_sum = 0
+        max_gas = min_gas = total_vehicles = peak = None
+        for day, cursor in self._each_partition(self._days_containing(today)):
             cursor.execute('''
-                SELECT 
-                    AVG(gas) as avg_gas,
+                SELECT
+                    COUNT(*) as n,
+                    SUM(gas) as sum_gas,
                     MAX(gas) as max_gas,
                     MIN(gas) as min_gas,
-                    AVG(headway_ms) as avg_headway,
+                    SUM(headway_ms) as sum_headway,
                     MAX(count) as total_vehicles
-                FROM sensor_readings
-                WHERE DATE(timestamp) = ?
-            ''', (today,))
+                FROM part.readings
+                WHERE timestamp_ms >= ? AND timestamp_ms < ?
+            ''', (start_ms, end_ms))
             row = cursor.fetchone()
-            
-            if row:
-                cursor.execute('''
-                    SELECT MAX(congestion_level) as peak_congestion
-                    FROM predictions
-                    WHERE DATE(created_at) = ?
-                ''', (today,))
-                pred_row = cursor.fetchone()
-                peak = pred_row['peak_congestion'] if pred_row else 0
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO statistics 
-                    (date, avg_gas, max_gas, min_gas, avg_headway, total_vehicles, peak_congestion)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (today, row['avg_gas'], row['max_gas'], row['min_gas'], 
-                      row['avg_headway'], row['total_vehicles'], peak))
-                conn.commit()
-    
+            if row['n']:
+                count += row['n']
+                gas_sum += row['sum_gas']
+                headway_sum += row['sum_headway']
+                max_gas = row['max_gas'] if max_gas is None else max(max_gas, row['max_gas'])
+                min_gas = row['min_gas'] if min_gas is None else min(min_gas, row['min_gas'])
+                total_vehicles = (row['total_vehicles'] if total_vehicles is None
+                                  else max(total_vehicles, row['total_vehicles']))
+
+            # Today's predictions can sit in any partition holding today's readings
+            cursor.execute('''
+                SELECT MAX(congestion_level) as peak_congestion
+                FROM part.predictions
+                WHERE created_ms >= ? AND created_ms < ?
+            ''', (start_ms, end_ms))
+            day_peak = cursor.fetchone()['peak_congestion']
+            if day_peak is not None:
+                peak = day_peak if peak is None else max(peak, day_peak)
+
+        if not count:
+            return
+
+        with self.get_connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO statistics
+                (date, avg_gas, max_gas, min_gas, avg_headway, total_vehicles, peak_congestion)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (today, gas_sum / count, max_gas, min_gas,
+                  headway_sum / count, total_vehicles, peak or 0))
+
+    # ------------------------------------------------------------------
+    # Time-of-week baselines
+    # ------------------------------------------------------------------
+
+    def load_baselines(self, bucket_minutes):
+        """(uid, bucket, metric, sketch JSON) rows; profiles of another slot size are dropped"""
+        with self.get_connection() as conn:
+            conn.execute('DELETE FROM baselines WHERE bucket_minutes != ?', (bucket_minutes,))
+            conn.execute('DELETE FROM baseline_progress WHERE bucket_minutes != ?', (bucket_minutes,))
+            return [tuple(row) for row in conn.execute(
+                'SELECT uid, bucket, metric, sketch FROM baselines WHERE bucket_minutes = ?',
+                (bucket_minutes,))]
+
+    def iter_baseline_inputs(self, bucket_minutes, chunk_size=50_000):
+        """
+        Readings not folded into the baselines yet, a partition at a time:
+        (day, last reading id, [(uid, received_ms, gas, headway_ms)],
+        [(uid, received_ms, congestion_level)] of the predictions among them)
+        """
+        with self.get_connection() as conn:
+            progress = dict(conn.execute(
+                'SELECT day, last_id FROM baseline_progress WHERE bucket_minutes = ?', (bucket_minutes,)))
+        # Partitions still in an older layout are folded once converted
+        days = [d for d in self._days(newest_first=False)
+                if self._partitions[d]["schema_version"] == SCHEMA_VERSION]
+        with self._attached() as (conn, attach, detach):
+            for day in days:
+                last_id = progress.get(day, 0)
+                end_id = None
+                while True:
+                    # Attached a chunk at a time, under the lock that sealing
+                    # and dropping take, so neither waits for a whole fold
+                    with self._lock:
+                        if day not in self._partitions or not self.partition_path(day).exists():
+                            break
+                        attach(day)
+                        try:
+                            cursor = conn.cursor()
+                            cursor.row_factory = None
+                            if end_id is None:
+                                # Rows written while this runs wait for the next refresh
+                                end_id = cursor.execute('SELECT MAX(id) FROM part.readings').fetchone()[0] or 0
+                            rows, predictions = self._baseline_chunk(cursor, last_id, end_id, chunk_size)
+                        finally:
+                            detach()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    yield day, last_id, [row[1:] for row in rows], predictions
+
+    @staticmethod
+    def _baseline_chunk(cursor, last_id, end_id, chunk_size):
+        """Readings with last_id < id <= end_id (up to chunk_size) of the attached partition, and their predictions"""
+        cursor.execute('''
+            SELECT r.id, s.uid, r.received_ms, r.gas, r.headway_ms
+            FROM part.readings r
+            JOIN part.sensors s ON s.id = r.sensor_id
+            WHERE r.id > ? AND r.id <= ?
+            ORDER BY r.id
+            LIMIT ?
+        ''', (last_id, end_id, chunk_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return rows, []
+        cursor.execute('''
+            SELECT s.uid, r.received_ms, p.congestion_level
+            FROM part.predictions p
+            JOIN part.readings r ON r.id = p.reading_id
+            JOIN part.sensors s ON s.id = r.sensor_id
+            WHERE p.reading_id > ? AND p.reading_id <= ?
+        ''', (last_id, rows[-1][0]))
+        return rows, cursor.fetchall()
+
+    def save_baselines(self, bucket_minutes, rows, progress):
+        """Store changed (uid, bucket, metric, sketch, summary) rows with the progress they reflect"""
+        with self.get_connection() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO baselines (bucket_minutes, uid, bucket, metric, sketch, summary)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(bucket_minutes, *row) for row in rows])
+            conn.executemany('''
+                INSERT OR REPLACE INTO baseline_progress (bucket_minutes, day, last_id) VALUES (?, ?, ?)
+            ''', [(bucket_minutes, day, last_id) for day, last_id in progress.items()])
+            # Dropped partitions' progress is no longer needed (their readings stay folded in)
+            conn.execute(f'''
+                DELETE FROM baseline_progress
+                WHERE day NOT IN ({", ".join("?" * len(self._partitions))})
+            ''', list(self._partitions))
+
+    def get_baseline(self, bucket_minutes, uid=None, bucket=None):
+        """(uid, bucket, metric, summary JSON) rows, optionally of one uid and/or slot"""
+        sql = 'SELECT uid, bucket, metric, summary FROM baselines WHERE bucket_minutes = ?'
+        params = [bucket_minutes]
+        if uid is not None:
+            sql += ' AND uid = ?'
+            params.append(uid)
+        if bucket is not None:
+            sql += ' AND bucket = ?'
+            params.append(bucket)
+        with self.get_connection() as conn:
+            return [tuple(row) for row in conn.execute(sql + ' ORDER BY uid, bucket, metric', params)]
+
     def get_total_count(self):
         """Get total number of readings"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) as count FROM sensor_readings')
-            return cursor.fetchone()['count']
-    
+        total = 0
+        for day, cursor in self._each_partition(self._days()):
+            total += self._partition_count(day, cursor)
+        return total
+
     def clear_old_data(self, days=30):
-        """Delete readings older than N days"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                DELETE FROM sensor_readings 
-                WHERE DATE(timestamp) < DATE('now', '-' || ? || ' days')
-            ''', (days,))
-            cursor.execute('''
-                DELETE FROM predictions 
-                WHERE DATE(created_at) < DATE('now', '-' || ? || ' days')
-            ''', (days,))
-            deleted = cursor.rowcount
-            conn.commit()
-            return deleted
+        """Drop partitions older than N days; returns the number of readings deleted"""
+        cutoff = (utc_today() - timedelta(days=days)).isoformat()
+        deleted = 0
+        for day in self._days(newest_first=False):
+            if day >= cutoff:
+                break
+            deleted += self.drop_partition(day)
+        for path in self._archive_files():
+            if _archive_date(path) < cutoff:
+                self._archives.pop(_archive_date(path), None)
+                _unlink_archive(path)
+        return deleted
 
 
-# Create global database instance
-db = TrafficDatabase()
+# Create global database instance (opened by the API lifespan, off the import path)
+db = TrafficDatabase(lazy=True)
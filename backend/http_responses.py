@@ -0,0 +1,114 @@
+import os
+import gzip
+import json
+import uuid
+import asyncio
+import hashlib
+from urllib.parse import urlencode
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# JSON bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("API_COMPRESS_MIN_SIZE", 1024))
+# Bodies above this are compressed off the event loop
+COMPRESS_OFFLOAD_SIZE = 256 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# In-memory sequences restart with the process; the boot id keeps ETags
+# from one run from matching responses of another
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def version_etag(*parts, query=None):
+    """
+    Weak ETag for a response derived from in-process data versions; `query`
+    (the request's query parameters) is folded in, normalized, for
+    responses that depend on it
+    """
+    if query:
+        normalized = urlencode(sorted(query.multi_items()))
+        parts = (*parts, hashlib.sha256(normalized.encode()).hexdigest()[:12])
+    return 'W/"' + "-".join(str(p) for p in (BOOT_ID, *parts)) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers etag (weak comparison)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified(request: Request, etag: str, headers: dict = None):
+    """304 response if the client already holds etag, else None"""
+    if not etag_matches(request, etag):
+        return None
+    headers = dict(headers or {})
+    headers["ETag"] = etag
+    headers.setdefault("Cache-Control", "no-cache")
+    headers.setdefault("Vary", "Accept-Encoding")
+    return Response(status_code=304, headers=headers)
+
+
+def accepted_encoding(request: Request):
+    """Best supported content coding the client accepts, or None"""
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip().replace(" ", "")
+        try:
+            refused = q.startswith("q=") and float(q[2:]) == 0
+        except ValueError:
+            refused = False
+        if not refused:
+            accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL)
+
+
+async def json_response(request: Request, content, etag: str = None, headers: dict = None):
+    """
+    JSON response with conditional GET and content negotiation.
+
+    Returns 304 when If-None-Match matches etag; otherwise compresses the
+    body with brotli/gzip when it is large enough and the client accepts it.
+    """
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if etag:
+        cached = not_modified(request, etag, headers)
+        if cached is not None:
+            return cached
+        headers["ETag"] = etag
+        # Let browsers keep the body but revalidate before every use
+        headers.setdefault("Cache-Control", "no-cache")
+
+    body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    encoding = accepted_encoding(request) if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding:
+        if len(body) >= COMPRESS_OFFLOAD_SIZE:
+            body = await asyncio.get_running_loop().run_in_executor(None, _compress, body, encoding)
+        else:
+            body = _compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
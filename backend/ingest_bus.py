@@ -0,0 +1,234 @@
+import os
+import json
+import socket
+import logging
+import asyncio
+import tempfile
+import itertools
+from collections import deque
+from pathlib import Path
+
+log = logging.getLogger(f"traffic.{__name__}")
+
+
+# standalone: one process does everything (default)
+# ingest:     owns the serial port, predictor and database writes; publishes on the bus
+# api:        serves HTTP/WebSocket from state mirrored off the bus (run with --workers N)
+BACKEND_ROLE = os.getenv("BACKEND_ROLE", "standalone")
+
+# Unix socket path, or host:port where AF_UNIX is unavailable (Windows)
+INGEST_BUS_ADDRESS = os.getenv(
+    "INGEST_BUS_ADDRESS",
+    str(Path(tempfile.gettempdir()) / "traffic_ingest.sock")
+    if hasattr(socket, "AF_UNIX") else "127.0.0.1:8765")
+
+# Recent readings replayed to a worker when it (re)connects
+INGEST_BUS_REPLAY = int(os.getenv("INGEST_BUS_REPLAY", 10_000))
+
+# A worker this far behind is disconnected; it reconnects and resyncs from the replay
+SUBSCRIBER_BUFFER_LIMIT = 16 * 1024 * 1024
+RECONNECT_DELAY = 1.0
+COMMAND_TIMEOUT = 15
+
+
+class CommandError(Exception):
+    """A command forwarded to the ingest process failed (carries an HTTP status)"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _encode(message):
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _tcp_address(address):
+    host, sep, port = address.rpartition(":")
+    return (host, int(port)) if sep and port.isdigit() else None
+
+
+class IngestPublisher:
+    """
+    Ingest side of the bus: fans messages out to API workers over a local
+    socket (newline-delimited JSON) and runs the commands they forward.
+
+    Every new subscriber first gets a snapshot of the current state values
+    followed by a replay of the most recent readings, so it can rebuild its
+    buffers without touching the ingest process's memory.
+    """
+
+    def __init__(self, address=INGEST_BUS_ADDRESS, replay_size=INGEST_BUS_REPLAY):
+        self.address = address
+        self.state = {}
+        self._replay = deque(maxlen=replay_size)
+        self._subscribers = set()
+        self._commands = {}
+        self._server = None
+        self._loop = None
+        self.stats = {"published": 0, "dropped_subscribers": 0}
+
+    def command(self, name, handler):
+        """Register an async handler(**args) for a command sent by API workers"""
+        self._commands[name] = handler
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        tcp = _tcp_address(self.address)
+        if tcp:
+            self._server = await asyncio.start_server(self._serve, *tcp)
+        else:
+            # A socket file left behind by a crashed run would make bind() fail
+            Path(self.address).unlink(missing_ok=True)
+            self._server = await asyncio.start_unix_server(self._serve, self.address)
+        print(f"✓ Ingest bus listening on {self.address}")
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._subscribers):
+            writer.close()
+        await self._server.wait_closed()
+        if not _tcp_address(self.address):
+            Path(self.address).unlink(missing_ok=True)
+
+    def publish(self, message, replay=False):
+        """Send a message to every subscriber (event loop thread only)"""
+        line = _encode(message)
+        if replay:
+            self._replay.append(line)
+        self.stats["published"] += 1
+        for writer in list(self._subscribers):
+            self._send(writer, line)
+
+    def publish_threadsafe(self, message):
+        """publish() from a worker thread, e.g. after a database commit"""
+        self._loop.call_soon_threadsafe(self.publish, message)
+
+    def set_state(self, key, value):
+        """Publish a state value; new subscribers receive the latest one in their snapshot"""
+        self.state[key] = value
+        self.publish({"type": "state", "key": key, "value": value})
+
+    def set_state_threadsafe(self, key, value):
+        self._loop.call_soon_threadsafe(self.set_state, key, value)
+
+    def _send(self, writer, line):
+        if writer.transport.get_write_buffer_size() > SUBSCRIBER_BUFFER_LIMIT:
+            # Never let one stalled worker grow ingest memory without bound
+            self.stats["dropped_subscribers"] += 1
+            self._subscribers.discard(writer)
+            writer.transport.abort()
+            return
+        writer.write(line)
+
+    async def _serve(self, reader, writer):
+        replay = list(self._replay)
+        writer.write(_encode({"type": "snapshot", "state": self.state, "replay": len(replay)}))
+        writer.writelines(replay)
+        self._subscribers.add(writer)
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message.get("type") == "command":
+                    asyncio.create_task(self._run_command(writer, message))
+        except (ConnectionError, ValueError) as e:
+            log.warning("Ingest bus subscriber error: %s", e)
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    async def _run_command(self, writer, message):
+        reply = {"type": "reply", "id": message["id"]}
+        handler = self._commands.get(message["name"])
+        try:
+            if handler is None:
+                raise CommandError(404, f"Unknown command {message['name']!r}")
+            reply["result"] = await handler(**message.get("args", {}))
+        except Exception as e:
+            # HTTPException and CommandError both carry status_code/detail
+            reply["error"] = {"status_code": getattr(e, "status_code", 500),
+                              "detail": getattr(e, "detail", str(e))}
+        if writer in self._subscribers:
+            self._send(writer, _encode(reply))
+
+
+class IngestSubscriber:
+    """
+    API-worker side of the bus: keeps a connection to the ingest process,
+    hands every message to `on_message` and forwards commands.
+
+    Reconnects forever; each (re)connect starts with a snapshot message, so
+    `on_message` can reset whatever it mirrors.
+    """
+
+    def __init__(self, on_message, address=INGEST_BUS_ADDRESS):
+        self.address = address
+        self.on_message = on_message
+        self.synced = asyncio.Event()
+        self._writer = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+
+    async def _connect(self):
+        tcp = _tcp_address(self.address)
+        if tcp:
+            return await asyncio.open_connection(*tcp, limit=SUBSCRIBER_BUFFER_LIMIT)
+        return await asyncio.open_unix_connection(self.address, limit=SUBSCRIBER_BUFFER_LIMIT)
+
+    async def run(self):
+        """Receive messages until cancelled"""
+        while True:
+            try:
+                reader, self._writer = await self._connect()
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            try:
+                while line := await reader.readline():
+                    message = json.loads(line)
+                    if message["type"] == "reply":
+                        self._resolve(message)
+                        continue
+                    self.on_message(message)
+                    if message["type"] == "snapshot":
+                        self.synced.set()
+                log.warning("Ingest bus closed by the ingest process, reconnecting")
+            except (ConnectionError, ValueError) as e:
+                log.warning("Ingest bus error: %s, reconnecting", e)
+            finally:
+                self._writer.close()
+                self._writer = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(CommandError(503, "Ingest process disconnected"))
+                self._pending.clear()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _resolve(self, message):
+        future = self._pending.pop(message["id"], None)
+        if future is None or future.done():
+            return
+        if "error" in message:
+            error = message["error"]
+            future.set_exception(CommandError(error["status_code"], error["detail"]))
+        else:
+            future.set_result(message.get("result"))
+
+    async def request(self, name, **args):
+        """Run a command in the ingest process and return its result"""
+        if self._writer is None:
+            raise CommandError(503, "Ingest process unavailable")
+        command_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        self._writer.write(_encode({"type": "command", "id": command_id,
+                                    "name": name, "args": args}))
+        try:
+            return await asyncio.wait_for(future, COMMAND_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise CommandError(504, f"Ingest process did not answer {name!r}")
+        finally:
+            self._pending.pop(command_id, None)
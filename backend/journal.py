@@ -0,0 +1,232 @@
+import os
+import mmap
+import zlib
+import logging
+import struct
+import asyncio
+import threading
+from pathlib import Path
+
+from database import DATABASE_PATH
+
+log = logging.getLogger(f"traffic.{__name__}")
+
+
+# Raw serial lines are appended here before they are parsed; the database
+# records (in the same transaction as the readings) how far into the journal
+# it has got, so a restart replays exactly what never reached it.
+JOURNAL_ENABLED = os.getenv("INGEST_JOURNAL", "1") != "0"
+JOURNAL_DIR = Path(os.getenv("INGEST_JOURNAL_DIR", DATABASE_PATH.with_name(DATABASE_PATH.stem + "_journal")))
+# A new segment file is started past this size; whole segments are deleted
+# once everything in them is in the database
+JOURNAL_SEGMENT_BYTES = int(os.getenv("INGEST_JOURNAL_SEGMENT_BYTES", 4 * 1024 * 1024))
+# Seconds between fsyncs. Lines reach the OS as soon as they are read, so a
+# process crash loses nothing; a power cut loses at most this much.
+JOURNAL_SYNC_INTERVAL = float(os.getenv("INGEST_JOURNAL_SYNC_INTERVAL", 0.5))
+
+# Record: payload length, CRC-32 of (received_ms, payload), received_ms, payload.
+# Sequence numbers are implicit: a segment is named after its first one.
+_HEADER = struct.Struct("<IIq")
+_STAMP = struct.Struct("<q")
+_SUFFIX = ".journal"
+
+
+def _records(path, first_seq, stats=None):
+    """
+    (seq, received_ms, line) of each intact record of a segment, read
+    through mmap; unreadable bytes are reported and counted in `stats`
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            offset, seq = 0, first_seq
+            while offset + _HEADER.size <= size:
+                length, crc, received_ms = _HEADER.unpack_from(view, offset)
+                end = offset + _HEADER.size + length
+                # A torn write at the tail (or a damaged record) ends the segment
+                if end > size or zlib.crc32(view[offset + 8:end]) != crc:
+                    break
+                yield seq, received_ms, view[offset + _HEADER.size:end]
+                offset, seq = end, seq + 1
+    if offset < size and stats is not None:
+        log.warning("Journal segment %s: %d byte(s) after record %d are unreadable and were skipped",
+                    path.name, size - offset, seq - 1)
+        stats["corrupt_bytes"] += size - offset
+
+
+class IngestJournal:
+    """
+    Segmented, checksummed append-only log of raw serial lines.
+
+    append() runs on the event loop and hands every chunk to the OS in one
+    write; run() fsyncs in batches off the loop and deletes segments the
+    database has acknowledged (acknowledge() is called by the writer thread
+    after each committed batch).
+    """
+
+    def __init__(self, directory=JOURNAL_DIR, segment_bytes=JOURNAL_SEGMENT_BYTES,
+                 sync_interval=JOURNAL_SYNC_INTERVAL):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.sync_interval = sync_interval
+        self.segments = []      # [first_seq, path], oldest first; the last is appended to
+        self.next_seq = 0
+        self.acked = -1         # everything up to here is in the database
+        self.synced = -1        # everything up to here is on disk
+        self._recovered = []    # segments found by open(), still to be replayed
+        self._file = None
+        self._size = 0
+        self._dirty = False
+        self._rotated = []      # earlier segments' files, closed once fsynced
+        self._new_segment = False
+        self._sync_lock = threading.Lock()
+        self._stats = {"appended": 0, "syncs": 0, "sync_seconds": 0.0, "replayed": 0,
+                       "corrupt_bytes": 0, "deleted_segments": 0}
+
+    def open(self, acked):
+        """Find the segments on disk and start a new one after them"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.acked = acked
+        self.segments = [[int(path.stem), path] for path in sorted(self.directory.glob("*" + _SUFFIX))]
+        if self.segments:
+            first_seq, path = self.segments[-1]
+            intact = sum(1 for _ in _records(path, first_seq))
+            if intact:
+                self.next_seq = first_seq + intact
+            else:
+                # Nothing readable in it; the new segment would take its name
+                size = path.stat().st_size
+                if size:
+                    log.warning("Journal segment %s: %d unreadable byte(s) were skipped", path.name, size)
+                    self._stats["corrupt_bytes"] += size
+                path.unlink()
+                del self.segments[-1]
+                self.next_seq = first_seq
+        # Numbering continues past the database's position even if the
+        # journal directory was emptied
+        self.next_seq = max(self.next_seq, acked + 1)
+        self.synced = self.next_seq - 1
+        self._recovered = list(self.segments)
+        self._start_segment()
+        self._truncate()
+        return self
+
+    def unacknowledged(self):
+        """(seq, received_ms, line) of journaled lines the database never got, oldest first"""
+        segments, self._recovered = self._recovered, []
+        for i, (first_seq, path) in enumerate(segments):
+            # Fully acknowledged (and maybe deleted by open() already)
+            if not path.exists() or (i + 1 < len(segments) and segments[i + 1][0] - 1 <= self.acked):
+                continue
+            for seq, received_ms, line in _records(path, first_seq, self._stats):
+                if seq > self.acked:
+                    self._stats["replayed"] += 1
+                    yield seq, received_ms, line
+
+    def append(self, lines, received_ms):
+        """Journal raw lines received together; returns the sequence number of the first"""
+        first_seq = self.next_seq
+        stamp = _STAMP.pack(received_ms)
+        records = []
+        for line in lines:
+            body = stamp + line
+            records.append(_HEADER.pack(len(line), zlib.crc32(body), received_ms) + line)
+        data = b"".join(records)
+        self._file.write(data)
+        self._size += len(data)
+        self.next_seq += len(lines)
+        self._stats["appended"] += len(lines)
+        self._dirty = True
+        if self._size >= self.segment_bytes:
+            self._start_segment()
+        return first_seq
+
+    def acknowledge(self, seq):
+        """Everything up to seq is committed to the database (writer thread)"""
+        if seq > self.acked:
+            self.acked = seq
+
+    def _start_segment(self):
+        if self._file is not None:
+            self._rotated.append(self._file)
+        path = self.directory / f"{self.next_seq:020d}{_SUFFIX}"
+        # Unbuffered: every append is one write() straight to the OS
+        self._file = open(path, "ab", buffering=0)
+        self._size = 0
+        self.segments.append([self.next_seq, path])
+        self._new_segment = True
+
+    def _sync(self, rotated, active, synced_seq, new_segment):
+        with self._sync_lock:
+            for f in rotated:
+                os.fsync(f.fileno())
+                f.close()
+            if active is not None and not active.closed:
+                os.fsync(active.fileno())
+            if new_segment and os.name != "nt":
+                # Make the new file's directory entry durable too
+                fd = os.open(self.directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            self.synced = max(self.synced, synced_seq)
+
+    def _truncate(self):
+        """Delete segments (except the current one) the database has everything from"""
+        active = self.segments[-1][1] if self.segments else None
+        while (len(self.segments) > 1 and self.segments[1][0] - 1 <= self.acked
+               and self.segments[0][1] != active):
+            try:
+                self.segments[0][1].unlink(missing_ok=True)
+            except OSError:
+                break  # still open (Windows); next time
+            del self.segments[0]
+            self._stats["deleted_segments"] += 1
+
+    async def run(self):
+        """Batch fsyncs every sync_interval and drop acknowledged segments"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            if self._dirty or self._rotated:
+                rotated, self._rotated = self._rotated, []
+                active = self._file if self._dirty else None
+                new_segment, self._new_segment = self._new_segment, False
+                self._dirty = False
+                start = loop.time()
+                try:
+                    await loop.run_in_executor(None, self._sync, rotated, active,
+                                               self.next_seq - 1, new_segment)
+                except OSError as e:
+                    log.error("Error syncing the ingest journal: %s", e)
+                    self._dirty = True
+                self._stats["syncs"] += 1
+                self._stats["sync_seconds"] += loop.time() - start
+            self._truncate()
+
+    def close(self):
+        """Fsync and close everything (on shutdown)"""
+        if self._file is None:
+            return
+        rotated, self._rotated = self._rotated, []
+        self._sync(rotated, self._file, self.next_seq - 1, self._new_segment)
+        self._file.close()
+        self._file = None
+
+    def stats(self):
+        syncs = self._stats["syncs"]
+        return {
+            "segments": len(self.segments),
+            "next_seq": self.next_seq,
+            "synced_seq": self.synced,
+            "acked_seq": self.acked,
+            "appended": self._stats["appended"],
+            "syncs": syncs,
+            "ms_per_sync": self._stats["sync_seconds"] / syncs * 1000 if syncs else None,
+            "replayed": self._stats["replayed"],
+            "corrupt_bytes": self._stats["corrupt_bytes"],
+            "deleted_segments": self._stats["deleted_segments"],
+        }
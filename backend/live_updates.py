@@ -0,0 +1,203 @@
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from backpressure import StageQueue
+
+log = logging.getLogger(f"traffic.{__name__}")
+
+
+# Frames waiting for one WebSocket client. A slow client loses its older
+# frames per uid (downsample) instead of holding up the others.
+CLIENT_QUEUE_SIZE = int(os.getenv("WS_CLIENT_QUEUE_SIZE", 256))
+
+# Reading fields a subscription can select; prediction fields as "prediction.<name>"
+READING_FIELDS = ("timestamp", "uid", "gas", "count", "headway_ms", "flag", "received_at", "prediction")
+PREDICTION_FIELDS = ("congestion_level", "congestion_status", "confidence", "factors",
+                     "next_minute_prediction", "next_minute_status", "recommendations",
+                     "baseline_deviation")
+FIELDS = READING_FIELDS + tuple(f"prediction.{name}" for name in PREDICTION_FIELDS)
+
+
+class SubscriptionError(ValueError):
+    """A subscription the server cannot honour"""
+
+
+def encode(message):
+    # Same encoding as WebSocket.send_json
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """
+    What a client receives: readings from `uids` (None = all) with only
+    `fields` (None = all; "uid" is always included) and at most `max_rate`
+    frames per second (None = every reading). A rate-limited client gets
+    the latest reading of each uid when its turn comes.
+    """
+    uids: Optional[frozenset] = None
+    fields: Optional[tuple] = None
+    max_rate: Optional[float] = None
+
+    @classmethod
+    def parse(cls, uids=None, fields=None, max_rate=None):
+        if uids is not None:
+            if not isinstance(uids, list) or not all(isinstance(uid, str) for uid in uids):
+                raise SubscriptionError("uids must be a list of strings")
+            uids = frozenset(uids)
+        if fields is not None:
+            if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+                raise SubscriptionError("fields must be a list of strings")
+            unknown = sorted(set(fields) - set(FIELDS))
+            if unknown:
+                raise SubscriptionError(f"Unknown fields {', '.join(unknown)} "
+                                        f"(expected any of {', '.join(FIELDS)})")
+            selected = set(fields) | {"uid"}
+            if "prediction" in selected:
+                # The whole prediction is selected already
+                selected = {field for field in selected if not field.startswith("prediction.")}
+            # Canonical order: equal field sets share one projection
+            fields = tuple(sorted(selected))
+        if max_rate is not None:
+            if isinstance(max_rate, bool) or not isinstance(max_rate, (int, float)) or max_rate <= 0:
+                raise SubscriptionError("max_rate must be a positive number of frames per second")
+            max_rate = float(max_rate)
+        return cls(uids, fields, max_rate)
+
+    @classmethod
+    def from_query(cls, params):
+        """Subscription from /ws?uids=a,b&fields=gas,prediction.congestion_level&max_rate=1"""
+        def split(name):
+            value = params.get(name)
+            return [item for item in value.split(",") if item] if value is not None else None
+        max_rate = params.get("max_rate")
+        try:
+            max_rate = float(max_rate) if max_rate is not None else None
+        except ValueError:
+            raise SubscriptionError("max_rate must be a positive number of frames per second")
+        return cls.parse(split("uids"), split("fields"), max_rate)
+
+    def matches(self, uid):
+        return self.uids is None or uid in self.uids
+
+    def describe(self):
+        return {
+            "uids": sorted(self.uids) if self.uids is not None else None,
+            "fields": list(self.fields) if self.fields is not None else None,
+            "max_rate": self.max_rate,
+        }
+
+
+def project(payload, fields):
+    """
+    A reading payload with only `fields` (None = the payload itself);
+    prediction fields the payload does not have are left out
+    """
+    if fields is None:
+        return payload
+    projected = {}
+    for field in fields:
+        name, _, sub = field.partition(".")
+        if sub:
+            group = projected.setdefault(name, {})
+            if sub in payload[name]:
+                group[sub] = payload[name][sub]
+        else:
+            projected[name] = payload[name]
+    return projected
+
+
+class Subscriber:
+    """A /ws connection: its subscription and the frames queued for it"""
+
+    def __init__(self, websocket, subscription):
+        self.websocket = websocket
+        self.outbox = StageQueue("websocket", CLIENT_QUEUE_SIZE, "downsample",
+                                 key=lambda frame: frame[0])
+        self.subscribe(subscription)
+        self.sent = 0
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def subscribe(self, subscription):
+        self.subscription = subscription
+        # Rate-limited clients only want each uid's current reading
+        self.outbox.policy = "latest" if subscription.max_rate else "downsample"
+
+    async def _send_loop(self):
+        while True:
+            _, text = await self.outbox.get()
+            try:
+                await self.websocket.send_text(text)
+            except Exception as e:
+                # Gone; the endpoint notices on its next receive and disconnects us
+                log.debug("WebSocket send failed: %s", e)
+                return
+            self.sent += 1
+            if self.subscription.max_rate:
+                await asyncio.sleep(1 / self.subscription.max_rate)
+
+    def close(self):
+        self._sender.cancel()
+
+
+class ConnectionManager:
+    """
+    Live WebSocket clients. Each message is filtered per subscription, and
+    projected and encoded once per distinct field set, however many clients
+    share it; every client has its own bounded outbox and sender.
+    """
+
+    def __init__(self):
+        self.active_connections: list[Subscriber] = []
+        self.encoded = 0
+
+    async def connect(self, websocket, subscription=Subscription()):
+        await websocket.accept()
+        subscriber = Subscriber(websocket, subscription)
+        self.active_connections.append(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber):
+        subscriber.close()
+        if subscriber in self.active_connections:
+            self.active_connections.remove(subscriber)
+
+    def _frame(self, message, fields, frames):
+        text = frames.get(fields)
+        if text is None:
+            if message["type"] == "data":
+                message = {"type": "data", "payload": project(message["payload"], fields)}
+            text = frames[fields] = encode(message)
+            self.encoded += 1
+        return text
+
+    def send(self, subscriber, message):
+        """Queue a message for one client (readings are filtered and projected)"""
+        self.broadcast(message, [subscriber])
+
+    def broadcast(self, message, subscribers=None):
+        """Queue a message for every client whose subscription it matches"""
+        uid = message["payload"]["uid"] if message["type"] == "data" else None
+        frames = {}
+        for subscriber in self.active_connections if subscribers is None else subscribers:
+            subscription = subscriber.subscription
+            if uid is not None and not subscription.matches(uid):
+                continue
+            # Other messages (status, ...) are the same for everyone
+            fields = subscription.fields if uid is not None else None
+            subscriber.outbox.put_nowait((uid, self._frame(message, fields, frames)))
+
+    def stats(self):
+        subscriptions = {subscriber.subscription for subscriber in self.active_connections}
+        return {
+            "clients": len(self.active_connections),
+            "subscriptions": len(subscriptions),
+            "encoded": self.encoded,
+            "sent": sum(subscriber.sent for subscriber in self.active_connections),
+            "queued": sum(len(subscriber.outbox) for subscriber in self.active_connections),
+            "shed": sum(subscriber.outbox.stats()["shed"] for subscriber in self.active_connections),
+        }
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from pythonjsonlogger import jsonlogger
+
+
+# Records from the "traffic" loggers go through a bounded queue to a writer
+# thread, so a slow console or disk never stalls the event loop; when the
+# queue is full, records are dropped (and counted) rather than waited for.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10_000))
+# At most LOG_REPEAT_LIMIT records per message template (e.g. one per
+# malformed line) every LOG_REPEAT_WINDOW seconds; the rest are counted and
+# reported as one "suppressed" record
+LOG_REPEAT_LIMIT = int(os.getenv("LOG_REPEAT_LIMIT", 10))
+LOG_REPEAT_WINDOW = float(os.getenv("LOG_REPEAT_WINDOW", 10))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+JSON_FORMAT = "%(levelname)s %(name)s %(message)s"
+
+logger = logging.getLogger("traffic")
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Rate-limit records per (logger, level, message template). Runs in the
+    thread that logs, before anything is formatted or queued.
+    """
+
+    def __init__(self, limit=LOG_REPEAT_LIMIT, window=LOG_REPEAT_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._windows = {}  # key -> [window start, records seen, example record]
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state is not None and state[1] > self.limit:
+                    # Travels with the first record of the next window
+                    record.suppressed = state[1] - self.limit
+                self._windows[key] = [now, 1, record]
+                return True
+            state[1] += 1
+            return state[1] <= self.limit
+
+    def sweep(self, force=False):
+        """Summary records for windows that ended (all windows if force) with records suppressed"""
+        now = time.monotonic()
+        if now - self._swept < self.window and not force:
+            return []
+        self._swept = now
+        summaries = []
+        with self._lock:
+            for key, (start, seen, example) in list(self._windows.items()):
+                if now - start < self.window and not force:
+                    continue
+                del self._windows[key]
+                if seen > self.limit:
+                    summaries.append(logging.makeLogRecord({
+                        "name": example.name,
+                        "levelno": example.levelno,
+                        "levelname": example.levelname,
+                        "msg": "Suppressed %d repeat(s) of: %s" % (seen - self.limit, example.msg),
+                        "suppressed": seen - self.limit,
+                    }))
+        return summaries
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking on a full queue"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter(QueueListener):
+    """Background writer thread; also emits the repeat filter's summaries"""
+
+    def __init__(self, log_queue, handler, repeats):
+        super().__init__(log_queue, handler, respect_handler_level=True)
+        self.repeats = repeats
+
+    def stop(self):
+        # Report what is still being suppressed before the last records are written
+        for summary in self.repeats.sweep(force=True):
+            try:
+                self.queue.put_nowait(summary)
+            except queue.Full:
+                break
+        super().stop()
+
+    def dequeue(self, block):
+        while True:
+            for summary in self.repeats.sweep():
+                self.handle(summary)
+            try:
+                return self.queue.get(block, timeout=self.repeats.window)
+            except queue.Empty:
+                if not block:
+                    raise
+
+
+_queue_handler = None
+_writer = None
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Send the "traffic" loggers to stderr through the writer thread (once per process)"""
+    global _queue_handler, _writer
+    if _writer is not None:
+        return
+    output = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        output.setFormatter(jsonlogger.JsonFormatter(
+            JSON_FORMAT, timestamp=True, json_ensure_ascii=False,
+            rename_fields={"levelname": "level", "name": "logger"}))
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+    repeats = RepeatFilter()
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(repeats)
+    logger.addHandler(_queue_handler)
+    logger.setLevel(level)
+    # uvicorn configures the root logger; "traffic" records only go through the queue
+    logger.propagate = False
+    _writer = LogWriter(_queue_handler.queue, output, repeats)
+    _writer.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread"""
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+def logging_stats():
+    return {
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
@@ -1,19 +1,199 @@
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 import asyncio
 import json
+import os
 import csv
+import gzip
 import io
-from collections import deque
+import logging
+import sqlite3
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from datetime import datetime
-from serial_handler import SerialHandler, SerialData
-from prediction_model import TrafficCongestionPredictor
+from functools import partial
+from serial_handler import SerialHandler, SerialSupervisor, SerialData, PortWatcher, parse_reading
 from database import db
+from async_database import adb, QueryTimeout
+from response_cache import cache
+import http_responses
+from http_responses import json_response, not_modified, version_etag
+from ingest_bus import BACKEND_ROLE, CommandError, IngestPublisher, IngestSubscriber
+from journal import IngestJournal, JOURNAL_ENABLED
+from log_config import configure_logging, logging_stats
+from live_updates import ConnectionManager, Subscription, SubscriptionError
+from backpressure import (StageQueue, INGEST_QUEUE_SIZE, INGEST_QUEUE_POLICY, PERSIST_QUEUE_SIZE,
+                          PERSIST_QUEUE_POLICY, PERSIST_BATCH_SIZE, BROADCAST_QUEUE_SIZE,
+                          BROADCAST_QUEUE_POLICY)
 from typing import Set
 
-app = FastAPI(title="Traffic Dashboard API")
+configure_logging()
+log = logging.getLogger(f"traffic.{__name__}")
+
+# Upper bound for CSV export queries, which scan far more rows than the API
+EXPORT_TIMEOUT = float(os.getenv("DB_EXPORT_TIMEOUT", 60))
+
+# How often partitions are sealed/expired and daily statistics refreshed
+MAINTENANCE_INTERVAL = int(os.getenv("TRAFFIC_MAINTENANCE_INTERVAL", 3600))
+
+# Seconds before a batch the database refused (locked, disk full) is retried
+PERSIST_RETRY_DELAY = float(os.getenv("PERSIST_RETRY_DELAY", 1))
+
+# Seconds between folds of newly stored readings into the time-of-week baselines
+BASELINE_INTERVAL = float(os.getenv("BASELINE_INTERVAL", 300))
+
+
+async def maintenance_loop():
+    """Periodically run database maintenance off the event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            result = await loop.run_in_executor(None, db.run_maintenance)
+            cache.bump("statistics")
+            if BACKEND_ROLE == "ingest":
+                bus.publish({"type": "invalidate", "tags": ["statistics"]})
+                publish_db_state()
+            if result["sealed"] or result["deleted_readings"]:
+                print(f"✓ Maintenance: sealed {result['sealed']}, "
+                      f"deleted {result['deleted_readings']} readings")
+        except Exception as e:
+            log.error("Error during database maintenance: %s", e)
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+
+async def baseline_loop():
+    """Periodically fold newly stored readings into the baselines off the event loop"""
+    loop = asyncio.get_running_loop()
+    first = True
+    while True:
+        try:
+            start = loop.time()
+            folded = await loop.run_in_executor(None, baselines.refresh, db)
+            if folded:
+                cache.bump("baseline")
+                if BACKEND_ROLE == "ingest":
+                    bus.publish({"type": "invalidate", "tags": ["baseline"]})
+                if first:
+                    print(f"✓ Baselines: folded {folded} reading(s) in {loop.time() - start:.1f}s")
+            first = False
+        except Exception as e:
+            log.error("Error updating baselines: %s", e)
+        await asyncio.sleep(BASELINE_INTERVAL)
+
+
+def warm_up():
+    """Load the NumPy-backed modules and open the database (off the event loop)"""
+    global data_buffer, model_runner, baselines
+    from prediction_model import PREDICTION_MODEL, PREDICTION_MODELS
+    from ring_buffer import ReadingBuffer
+    from model_runner import ModelRunner
+    from baseline import BaselineProfiles
+    if PREDICTION_MODEL not in PREDICTION_MODELS:
+        raise ValueError(f"Unknown PREDICTION_MODEL {PREDICTION_MODEL!r} "
+                         f"(expected one of {', '.join(PREDICTION_MODELS)})")
+    model_class, window_size = PREDICTION_MODELS[PREDICTION_MODEL]
+    data_buffer = ReadingBuffer()  # Columnar ring buffer of recent readings
+    model_runner = ModelRunner(model_class, on_prediction, window_size=window_size)
+    baselines = BaselineProfiles()
+    if BACKEND_ROLE != "api":
+        # API workers get the partition catalog and predictions from the ingest process
+        db.open()
+        model_runner.start()
+        if journal is not None:
+            journal.open(db.journal_acked())
+
+
+async def start_services():
+    """Warm up, release held requests, then run background jobs"""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, warm_up)
+        if BACKEND_ROLE == "ingest":
+            await bus.start()
+            bus.set_state("boot_id", http_responses.BOOT_ID)
+            publish_db_state()
+            bus.set_state("serial", serial_supervisor.get_status())
+        elif BACKEND_ROLE == "api":
+            # Mirror the ingest process; ready once its snapshot has been applied
+            bus_task = asyncio.create_task(bus.run())
+            await bus.synced.wait()
+        pipeline_tasks.append(asyncio.create_task(broadcast_loop()))
+        if BACKEND_ROLE != "api":
+            # API workers get the port list from the ingest process
+            pipeline_tasks.append(asyncio.create_task(port_watcher.run()))
+            pipeline_tasks.append(asyncio.create_task(prediction_loop()))
+            pipeline_tasks.append(asyncio.create_task(persist_loop()))
+            if journal is not None:
+                pipeline_tasks.append(asyncio.create_task(journal.run()))
+                # Before any request (e.g. /api/connect) can add new readings
+                await replay_journal()
+        print(f"✓ Services ready ({BACKEND_ROLE})")
+    except Exception as e:
+        log.exception("Error during startup: %s", e)
+        raise
+    finally:
+        # Held requests proceed either way; after a failure they get a 500
+        services_ready.set()
+    if BACKEND_ROLE == "api":
+        # Writes, migrations and maintenance belong to the ingest process
+        await bus_task
+        return
+    # Partitions in an older on-disk layout are converted in the background
+    db.start_migration()
+    pipeline_tasks.append(asyncio.create_task(baseline_loop()))
+    await maintenance_loop()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup returns at once so /health answers while the rest loads
+    services_task = asyncio.create_task(start_services())
+    yield
+    services_task.cancel()
+    # Stop the serial reader before the stages it feeds
+    await serial_supervisor.close()
+    for task in pipeline_tasks:
+        task.cancel()
+    if model_runner is not None:
+        model_runner.close()
+    if BACKEND_ROLE == "ingest":
+        await bus.stop()
+    # Flush readings still queued for the database
+    remaining = persist_queue.drain()
+    if remaining:
+        adb.submit_write(save_readings, remaining)
+    adb.close()
+    if journal is not None:
+        journal.close()
+
+
+class ServicesReadyMiddleware:
+    """Hold HTTP and WebSocket requests (except /health) until warm-up is done"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] in ("http", "websocket") and not services_ready.is_set()
+                and scope["path"] != "/health"):
+            await services_ready.wait()
+        await self.app(scope, receive, send)
+
+
+app = FastAPI(title="Traffic Dashboard API", lifespan=lifespan)
+app.add_middleware(ServicesReadyMiddleware)
+
+
+@app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request, exc: QueryTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.exception_handler(CommandError)
+async def command_error_handler(request, exc: CommandError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 # CORS configuration
 app.add_middleware(
@@ -28,49 +208,124 @@ app.add_middleware(
 # Global state
 serial_handler = SerialHandler()
 active_connections: Set[WebSocket] = set()
-data_buffer = deque(maxlen=1000)  # Store last 1000 readings
-read_task = None
-predictor = TrafficCongestionPredictor(window_size=30)
+services_ready = asyncio.Event()
+# Created by warm_up() during startup
+data_buffer = None
+model_runner = None
+baselines = None
+# Latest state published by the ingest process (API workers only)
+ingest_state = {"serial": {}, "data_points": 0, "ports": []}
+replaying = 0  # replayed readings still to apply after a bus snapshot
+published_catalog_seq = None
+prediction_day = None  # partition that last got a prediction row (ingest writer thread)
+# Raw serial lines are journaled before they are parsed (not in API workers)
+journal = IngestJournal() if JOURNAL_ENABLED and BACKEND_ROLE != "api" else None
+serial_handler.journal = journal
+# Bounded stages between the serial reader, the model, the database writer and
+# WebSocket clients; see backpressure.py for the overload policies
+ingest_queue = StageQueue("ingest", INGEST_QUEUE_SIZE, INGEST_QUEUE_POLICY,
+                          key=lambda serial_data: serial_data.uid)
+persist_queue = StageQueue("persist", PERSIST_QUEUE_SIZE, PERSIST_QUEUE_POLICY,
+                           key=lambda item: item[0].uid)
+broadcast_queue = StageQueue("broadcast", BROADCAST_QUEUE_SIZE, BROADCAST_QUEUE_POLICY,
+                             key=lambda message: message["payload"]["uid"])
+pipeline_tasks = []
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+manager = ConnectionManager()
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+def on_ports_changed(ports: list):
+    """Tell API workers and WebSocket clients about plugged in or removed ports"""
+    if BACKEND_ROLE == "ingest":
+        bus.set_state("ports", ports)
+    manager.broadcast({"type": "ports_changed", "payload": {"ports": ports}})
+    # A dropped device may be back
+    serial_supervisor.wake()
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting: {e}")
 
+port_watcher = PortWatcher(on_ports_changed)
 
-manager = ConnectionManager()
 
+def connection_status():
+    """Serial connection status and number of buffered readings"""
+    if BACKEND_ROLE == "api":
+        return {**ingest_state["serial"], "data_points": ingest_state["data_points"]}
+    return {**serial_supervisor.get_status(), "data_points": len(data_buffer)}
 
-def data_callback(serial_data: SerialData):
-    """Callback when data is received from serial"""
-    # Add to predictor
-    predictor.add_reading(
+
+def publish_db_state():
+    """Send catalog changes and the write sequence to API workers (any thread)"""
+    global published_catalog_seq
+    if db.catalog_seq != published_catalog_seq:
+        published_catalog_seq = db.catalog_seq
+        bus.set_state_threadsafe("catalog", db.catalog())
+    bus.set_state_threadsafe("write_seq", db.write_seq)
+
+
+def save_reading(serial_data: SerialData, congestion_pred: dict, next_pred: dict, evaluated=True):
+    """Persist a reading, and its prediction if one was computed for it (ingest writer thread)"""
+    global prediction_day
+    reading_id = db.insert_reading(
+        timestamp_ms=serial_data.timestamp_ms,
+        uid=serial_data.uid,
         gas=serial_data.gas,
         count=serial_data.count,
         headway_ms=serial_data.headway_ms,
-        timestamp=serial_data.timestamp
+        flag=serial_data.flag,
+        received_ms=serial_data.received_ms,
+        journal_seq=serial_data.journal_seq
     )
     
-    # Get predictions
-    congestion_pred = predictor.predict_congestion()
-    next_pred = predictor.predict_next_minute()
-    recommendations = predictor.get_recommendations()
-    
-    data_dict = {
+    # Other readings refer to the latest prediction row before them in their
+    # partition, so each partition's first reading always gets one
+    day = db.day_for_id(reading_id)
+    if evaluated or day != prediction_day:
+        db.insert_prediction(
+            sensor_reading_id=reading_id,
+            congestion_level=congestion_pred["level"],
+            congestion_status=congestion_pred["status"],
+            confidence=congestion_pred["confidence"],
+            next_minute_prediction=next_pred["prediction"],
+            next_minute_status=next_pred["status"],
+            created_ms=serial_data.received_ms
+        )
+        prediction_day = day
+
+
+def save_readings(batch):
+    """
+    Persist a batch of (serial_data, congestion_pred, next_pred, evaluated)
+    items in one transaction per partition. If the database refuses it
+    (locked, disk full), nothing is written and the error is raised so the
+    batch can be retried; it is still in the journal either way.
+    """
+    global prediction_day
+    first_prediction_day = prediction_day
+    try:
+        with db.write_batch():
+            for item in batch:
+                try:
+                    save_reading(*item)
+                except sqlite3.OperationalError:
+                    raise
+                except Exception as e:
+                    log.error("Error saving to database: %s", e)
+    except sqlite3.OperationalError:
+        prediction_day = first_prediction_day
+        raise
+    cache.bump("ingest")
+    if BACKEND_ROLE == "ingest":
+        publish_db_state()
+    if journal is not None:
+        seqs = [item[0].journal_seq for item in batch if item[0].journal_seq is not None]
+        if seqs:
+            journal.acknowledge(max(seqs))
+
+
+def reading_payload(serial_data: SerialData, prediction: dict):
+    """WebSocket/API representation of a reading"""
+    return {
         "timestamp": serial_data.timestamp,
         "uid": serial_data.uid,
         "gas": serial_data.gas,
@@ -78,72 +333,178 @@ def data_callback(serial_data: SerialData):
         "headway_ms": serial_data.headway_ms,
         "flag": serial_data.flag,
         "received_at": serial_data.received_at.isoformat(),
-        "prediction": {
-            "congestion_level": congestion_pred["level"],
-            "congestion_status": congestion_pred["status"],
-            "confidence": congestion_pred["confidence"],
-            "factors": congestion_pred["factors"],
-            "next_minute_prediction": next_pred["prediction"],
-            "next_minute_status": next_pred["status"],
-            "recommendations": recommendations
-        }
+        "prediction": prediction
+    }
+
+
+def buffer_reading(serial_data: SerialData, prediction: dict):
+    """Add a reading to the live buffer"""
+    data_buffer.append(
+        timestamp_ms=serial_data.timestamp_ms,
+        uid=serial_data.uid,
+        gas=serial_data.gas,
+        count=serial_data.count,
+        headway_ms=serial_data.headway_ms,
+        flag=serial_data.flag,
+        received_ms=serial_data.received_ms,
+        prediction=prediction
+    )
+
+
+async def data_callback(serial_data: SerialData):
+    """Callback when data is received from serial"""
+    # With the block policy this pauses the serial reader while the queue is full
+    await ingest_queue.put(serial_data)
+
+
+def on_serial_status(state: str):
+    """Tell API workers and WebSocket clients when the device drops or comes back"""
+    if BACKEND_ROLE == "ingest":
+        bus.set_state("serial", serial_supervisor.get_status())
+    manager.broadcast({"type": "status", "payload": connection_status()})
+
+
+serial_supervisor = SerialSupervisor(serial_handler, data_callback, on_serial_status)
+
+
+async def replay_journal():
+    """Feed journaled readings that never reached the database back through the pipeline"""
+    replayed = 0
+    for seq, received_ms, line in journal.unacknowledged():
+        try:
+            serial_data = parse_reading(line.decode('utf-8', errors='ignore'), received_ms, seq)
+        except ValueError:
+            continue
+        await ingest_queue.put(serial_data)
+        replayed += 1
+    if replayed:
+        print(f"✓ Replayed {replayed} journaled reading(s) into the pipeline")
+
+
+async def prediction_loop():
+    """Feed queued readings to the model; on_prediction gets the results in order"""
+    while True:
+        serial_data = await ingest_queue.get()
+        # Every reading in the model ends up in the persist queue: leave room for it
+        await persist_queue.wait_for_room(lambda: model_runner.outstanding)
+        model_runner.submit(serial_data)
+
+
+async def persist_loop():
+    """Hand queued readings to the ingest writer thread, a batch at a time"""
+    while True:
+        batch = await persist_queue.get_batch(PERSIST_BATCH_SIZE)
+        while True:
+            try:
+                # Shielded: a batch handed over at shutdown is still written
+                await asyncio.shield(asyncio.wrap_future(adb.submit_write(save_readings, batch)))
+                break
+            except sqlite3.OperationalError:
+                # Reported by the writer; the pipeline backs up meanwhile
+                await asyncio.sleep(PERSIST_RETRY_DELAY)
+
+
+async def broadcast_loop():
+    """Fan queued live messages out to the WebSocket clients' outboxes"""
+    while True:
+        for message in await broadcast_queue.get_batch(BROADCAST_QUEUE_SIZE):
+            manager.broadcast(message)
+
+
+def on_prediction(serial_data: SerialData, result: dict, evaluated: bool):
+    """Buffer, store, publish and broadcast a reading once its prediction is ready"""
+    congestion_pred = result["congestion"]
+    next_pred = result["next_minute"]
+    recommendations = result["recommendations"]
+    
+    prediction = {
+        "congestion_level": congestion_pred["level"],
+        "congestion_status": congestion_pred["status"],
+        "confidence": congestion_pred["confidence"],
+        "factors": congestion_pred["factors"],
+        "next_minute_prediction": next_pred["prediction"],
+        "next_minute_status": next_pred["status"],
+        "recommendations": recommendations,
+        # Against the typical level for this uid and time of week (None until there is one)
+        "baseline_deviation": baselines.deviation(serial_data.uid, serial_data.received_ms,
+                                                  congestion_pred["level"])
     }
-    data_buffer.append(data_dict)
+    data_dict = reading_payload(serial_data, prediction)
+    buffer_reading(serial_data, prediction)
     
-    # Save to database
-    try:
-        reading_id = db.insert_reading(
-            timestamp=serial_data.timestamp,
-            uid=serial_data.uid,
-            gas=serial_data.gas,
-            count=serial_data.count,
-            headway_ms=serial_data.headway_ms,
-            flag=serial_data.flag,
-            received_at=serial_data.received_at.isoformat()
-        )
-        
-        db.insert_prediction(
-            sensor_reading_id=reading_id,
-            congestion_level=congestion_pred["level"],
-            congestion_status=congestion_pred["status"],
-            confidence=congestion_pred["confidence"],
-            next_minute_prediction=next_pred["prediction"],
-            next_minute_status=next_pred["status"]
-        )
-    except Exception as e:
-        print(f"Error saving to database: {e}")
+    # Saved on the ingest writer thread by persist_loop
+    persist_queue.put_nowait((serial_data, congestion_pred, next_pred, evaluated))
+
+    if BACKEND_ROLE == "ingest":
+        if evaluated:
+            bus.set_state("prediction", result)
+        bus.publish({
+            "type": "data",
+            "reading": asdict(serial_data),
+            "prediction": prediction,
+            "sequence": data_buffer.sequence,
+            "data_points": len(data_buffer)
+        }, replay=True)
     
     # Broadcast to all connected WebSocket clients
-    asyncio.create_task(manager.broadcast({
+    broadcast_queue.put_nowait({
         "type": "data",
         "payload": data_dict
-    }))
+    })
 
 
-@app.get("/api/ports")
-async def get_available_ports():
-    """Get list of available serial ports"""
-    ports = SerialHandler.list_available_ports()
-    return {"ports": ports}
+def apply_ingest_state(key, value):
+    if key == "boot_id":
+        # Versions below are the ingest process's, so its boot id goes in the ETags
+        http_responses.BOOT_ID = value
+    elif key == "catalog":
+        db.load_catalog(value)
+    elif key == "write_seq":
+        db.write_seq = value
+        cache.bump("ingest")
+    elif key == "prediction":
+        model_runner.latest = value
+    elif key == "serial":
+        ingest_state["serial"] = value
+        manager.broadcast({"type": "status", "payload": connection_status()})
+    elif key == "ports":
+        ingest_state["ports"] = value
+        manager.broadcast({"type": "ports_changed", "payload": {"ports": value}})
+    else:
+        ingest_state[key] = value
+
+
+def on_bus_message(message: dict):
+    """Mirror the ingest process in an API worker"""
+    global replaying
+    kind = message["type"]
+    if kind == "snapshot":
+        data_buffer.clear()
+        replaying = message["replay"]
+        for key, value in message["state"].items():
+            apply_ingest_state(key, value)
+    elif kind == "data":
+        serial_data = SerialData(**message["reading"])
+        buffer_reading(serial_data, message["prediction"])
+        data_buffer.sequence = message["sequence"]
+        ingest_state["data_points"] = message["data_points"]
+        if replaying:
+            replaying -= 1
+            return
+        broadcast_queue.put_nowait({
+            "type": "data",
+            "payload": reading_payload(serial_data, message["prediction"])
+        })
+    elif kind == "state":
+        apply_ingest_state(message["key"], message["value"])
+    elif kind == "invalidate":
+        for tag in message["tags"]:
+            cache.bump(tag)
 
 
-@app.post("/api/connect")
-async def connect_to_device(port: str, baud_rate: int = 115200):
-    """Connect to a serial device"""
-    global read_task
-    
-    if serial_handler.is_connected:
-        serial_handler.disconnect()
-    
-    success = serial_handler.connect(port, baud_rate)
-    
-    if success:
-        # Start reading task
-        if read_task:
-            read_task.cancel()
-        read_task = asyncio.create_task(
-            serial_handler.read_data(data_callback)
-        )
+async def connect_serial(port: str, baud_rate: int = 115200):
+    """Open a serial port and start reading from it"""
+    if await serial_supervisor.connect(port, baud_rate):
         return {
             "status": "connected",
             "port": port,
@@ -153,150 +514,318 @@ async def connect_to_device(port: str, baud_rate: int = 115200):
         raise HTTPException(status_code=400, detail="Failed to connect")
 
 
+async def disconnect_serial():
+    """Stop reading and close the serial port"""
+    await serial_supervisor.disconnect()
+    return {"status": "disconnected"}
+
+
+async def set_baud_rate(new_baud_rate: int):
+    """Change baud rate (in place if connected)"""
+    if await serial_supervisor.set_baud_rate(new_baud_rate):
+        return {
+            "status": "success",
+            "baud_rate": new_baud_rate
+        }
+    else:
+        raise HTTPException(status_code=400, detail="Failed to change baud rate")
+
+
+SERIAL_COMMANDS = {
+    "connect": connect_serial,
+    "disconnect": disconnect_serial,
+    "baud-rate": set_baud_rate,
+}
+
+
+async def serial_command(name: str, **args):
+    """Run a serial-port command here, or in the ingest process from an API worker"""
+    if BACKEND_ROLE == "api":
+        return await bus.request(name, **args)
+    result = await SERIAL_COMMANDS[name](**args)
+    if BACKEND_ROLE == "ingest":
+        bus.set_state("serial", serial_supervisor.get_status())
+    return result
+
+
+async def pipeline_stats():
+    """Depth and shed counters of each pipeline stage, serial port scan cost and reconnects"""
+    if BACKEND_ROLE == "api":
+        stats = await bus.request("pipeline-stats")
+        # WebSocket clients are served by this worker, not the ingest process
+        stats["broadcast"] = broadcast_queue.stats()
+        stats["websocket"] = manager.stats()
+        return stats
+    return {
+        "ingest": ingest_queue.stats(),
+        # Readings answered with the previous prediction count as shed by the model
+        "prediction": model_runner.stats(),
+        "persist": persist_queue.stats(),
+        "broadcast": broadcast_queue.stats(),
+        "websocket": manager.stats(),
+        "ports": port_watcher.stats(),
+        "serial": serial_supervisor.stats(),
+        "journal": journal.stats() if journal is not None else None,
+        "logging": logging_stats(),
+        "baseline": baselines.stats(),
+    }
+
+
+# Ingest bus between the ingest process and API workers (multi-worker mode only)
+if BACKEND_ROLE == "ingest":
+    bus = IngestPublisher()
+    for name in SERIAL_COMMANDS:
+        bus.command(name, partial(serial_command, name))
+    bus.command("pipeline-stats", pipeline_stats)
+elif BACKEND_ROLE == "api":
+    bus = IngestSubscriber(on_bus_message)
+else:
+    bus = None
+
+
+@app.get("/api/ports")
+async def get_available_ports():
+    """Get list of available serial ports (as of the latest background scan)"""
+    if BACKEND_ROLE == "api":
+        return {"ports": ingest_state["ports"]}
+    return {"ports": await port_watcher.current()}
+
+
+@app.post("/api/connect")
+async def connect_to_device(port: str, baud_rate: int = 115200):
+    """Connect to a serial device"""
+    return await serial_command("connect", port=port, baud_rate=baud_rate)
+
+
 @app.post("/api/disconnect")
 async def disconnect_device():
     """Disconnect from serial device"""
-    global read_task
-    
-    if read_task:
-        read_task.cancel()
-    
-    serial_handler.disconnect()
-    return {"status": "disconnected"}
+    return await serial_command("disconnect")
 
 
 @app.post("/api/baud-rate")
 async def change_baud_rate(new_baud_rate: int):
     """Change baud rate (reconnects if connected)"""
-    global read_task
-    
-    if serial_handler.is_connected:
-        if read_task:
-            read_task.cancel()
-        
-        success = serial_handler.change_baud_rate(new_baud_rate)
-        
-        if success:
-            read_task = asyncio.create_task(
-                serial_handler.read_data(data_callback)
-            )
-            return {
-                "status": "success",
-                "baud_rate": new_baud_rate
-            }
-        else:
-            raise HTTPException(status_code=400, detail="Failed to change baud rate")
-    else:
-        serial_handler.baud_rate = new_baud_rate
-        return {
-            "status": "success",
-            "baud_rate": new_baud_rate
-        }
+    return await serial_command("baud-rate", new_baud_rate=new_baud_rate)
 
 
 @app.get("/api/status")
 async def get_status():
     """Get current connection status"""
-    return {
-        **serial_handler.get_status(),
-        "data_points": len(data_buffer)
-    }
+    return connection_status()
 
 
 @app.get("/api/data")
-async def get_historical_data(limit: int = 100):
-    """Get historical data points"""
-    data = list(data_buffer)[-limit:]
-    return {"data": data}
+async def get_historical_data(request: Request, limit: int = 100, since: int = None, until: int = None):
+    """Get historical data points (optionally received between since/until, epoch ms)"""
+    etag = version_etag("data", data_buffer.sequence, query=request.query_params)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    if since is None and until is None:
+        data = data_buffer.tail(limit)
+    else:
+        data = data_buffer.between(since, until, limit)
+    return await json_response(request, {"data": data}, etag)
 
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time data streaming"""
-    await manager.connect(websocket)
-    
-    # Send current status
-    await websocket.send_json({
-        "type": "status",
-        "payload": {
-            **serial_handler.get_status(),
-            "data_points": len(data_buffer)
-        }
-    })
-    
-    # Send recent data
-    recent_data = list(data_buffer)[-50:]
-    for data_point in recent_data:
-        await websocket.send_json({
+def send_recent(subscriber):
+    """Queue the most recent readings the client is subscribed to"""
+    for data_point in data_buffer.tail(50):
+        manager.send(subscriber, {
             "type": "data",
             "payload": data_point
         })
-    
+
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    WebSocket endpoint for real-time data streaming.
+
+    Clients get every field of every reading unless they subscribe, either
+    with query parameters (/ws?uids=A1&fields=prediction.congestion_level&max_rate=1)
+    or at any time with {"type": "subscribe", "uids": [...], "fields": [...],
+    "max_rate": 1}; omitted keys mean all uids, all fields, every reading.
+    """
+    try:
+        subscription = Subscription.from_query(websocket.query_params)
+    except SubscriptionError as e:
+        await websocket.accept()
+        await websocket.close(code=1008, reason=str(e))
+        return
+    subscriber = await manager.connect(websocket, subscription)
     try:
+        # Send current status
+        manager.send(subscriber, {
+            "type": "status",
+            "payload": connection_status()
+        })
+
+        # Send recent data
+        send_recent(subscriber)
+
         while True:
-            # Keep connection alive
-            data = await websocket.receive_text()
-    except Exception as e:
-        manager.disconnect(websocket)
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(message, dict) or message.get("type") != "subscribe":
+                continue
+            try:
+                subscriber.subscribe(Subscription.parse(message.get("uids"), message.get("fields"),
+                                                        message.get("max_rate")))
+            except SubscriptionError as e:
+                manager.send(subscriber, {"type": "error", "detail": str(e)})
+                continue
+            manager.send(subscriber, {"type": "subscribed", "subscription": subscriber.subscription.describe()})
+            send_recent(subscriber)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(subscriber)
 
 
 @app.get("/api/prediction")
 async def get_prediction():
     """Get current congestion prediction"""
-    return predictor.predict_congestion()
+    return model_runner.latest["congestion"]
 
 
 @app.get("/api/prediction/next-minute")
 async def get_next_minute_prediction():
     """Get next minute prediction"""
-    return predictor.predict_next_minute()
+    return model_runner.latest["next_minute"]
+
+
+@app.get("/api/prediction/forecast")
+async def get_forecast():
+    """Get multi-horizon forecasts with uncertainty bands (PREDICTION_MODEL=kalman)"""
+    forecast = model_runner.latest.get("forecast")
+    if forecast is None:
+        raise HTTPException(status_code=404, detail="The configured prediction model has no forecasts")
+    return forecast
 
 
 @app.get("/api/recommendations")
 async def get_recommendations():
     """Get traffic recommendations"""
-    return {"recommendations": predictor.get_recommendations()}
+    return {"recommendations": model_runner.latest["recommendations"]}
+
+
+@app.get("/api/model/stats")
+async def get_model_stats():
+    """Get prediction model execution counters"""
+    return model_runner.stats()
+
+
+@app.get("/api/pipeline/stats")
+async def get_pipeline_stats():
+    """Get queue depths and shed counters of the ingest pipeline"""
+    return await pipeline_stats()
 
 
 @app.get("/api/db/readings")
-async def get_db_readings(limit: int = 100, offset: int = 0):
+async def get_db_readings(request: Request, limit: int = 100, offset: int = 0):
     """Get sensor readings from database"""
-    readings = db.get_readings(limit, offset)
-    return {"readings": readings, "total": db.get_total_count()}
+    # Read the version first: a write racing the query only costs a refetch
+    etag = version_etag("db", db.write_seq, query=request.query_params)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    readings = await adb.get_readings(limit, offset)
+    return await json_response(
+        request, {"readings": readings, "total": await adb.get_total_count()}, etag)
 
 
 @app.get("/api/db/readings/{date}")
-async def get_readings_by_date(date: str):
+async def get_readings_by_date(date: str, request: Request):
     """Get readings for specific date (YYYY-MM-DD)"""
-    readings = db.get_readings_by_date(date)
-    return {"date": date, "readings": readings, "count": len(readings)}
+    # Closed days never change: serve the precompressed archive
+    archive = await adb.get_day_archive(date)
+    if archive:
+        path, digest = archive
+        etag = f'"{digest}"'
+        headers = {
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "Vary": "Accept-Encoding",
+        }
+        cached = not_modified(request, etag, headers)
+        if cached:
+            return cached
+        headers["ETag"] = etag
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            return FileResponse(path, media_type="application/json",
+                                headers={**headers, "Content-Encoding": "gzip"})
+        body = await adb.run(lambda: gzip.decompress(path.read_bytes()))
+        return Response(body, media_type="application/json", headers=headers)
+
+    etag = version_etag("db", db.write_seq, query=request.query_params)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    readings = await adb.get_readings_by_date(date)
+    return await json_response(
+        request, {"date": date, "readings": readings, "count": len(readings)}, etag)
 
 
 @app.get("/api/db/predictions")
-async def get_db_predictions(limit: int = 100, offset: int = 0):
+async def get_db_predictions(request: Request, limit: int = 100, offset: int = 0):
     """Get predictions from database"""
-    predictions = db.get_predictions(limit, offset)
-    return {"predictions": predictions}
+    etag = version_etag("db", db.write_seq, query=request.query_params)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    predictions = await adb.get_predictions(limit, offset)
+    return await json_response(request, {"predictions": predictions}, etag)
 
 
 @app.get("/api/db/statistics")
 async def get_db_statistics(date: str = None):
     """Get daily statistics"""
-    stats = db.get_statistics(date)
+    stats = await cache.get_or_set(
+        ("statistics", date), lambda: adb.get_statistics(date), tags=("statistics",)
+    )
     return {"statistics": stats}
 
 
 @app.get("/api/db/congestion-summary")
 async def get_congestion_summary(hours: int = 24):
     """Get congestion summary for last N hours"""
-    summary = db.get_congestion_summary(hours)
+    summary = await cache.get_or_set(
+        ("congestion-summary", hours), lambda: adb.get_congestion_summary(hours), tags=("ingest",)
+    )
     return {"hours": hours, "summary": summary}
 
 
+@app.get("/api/baseline")
+async def get_baseline(uid: str = None, weekday: str = None, time: str = None):
+    """
+    Typical traffic by time of week: count, mean and percentiles of
+    headway_ms, gas and congestion_level per uid and slot. weekday
+    (monday..sunday or 0-6) and time (HH:MM) select the slot containing
+    that time; without them the whole week is returned.
+    """
+    from baseline import parse_bucket, profiles_from_rows
+    bucket = None
+    if weekday is not None or time is not None:
+        try:
+            bucket = parse_bucket(weekday or "", time or "", baselines.bucket_minutes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def profiles():
+        rows = await adb.get_baseline(baselines.bucket_minutes, uid, bucket)
+        return profiles_from_rows(rows, baselines.bucket_minutes)
+
+    result = await cache.get_or_set(("baseline", uid, bucket), profiles, tags=("baseline",))
+    return {"bucket_minutes": baselines.bucket_minutes, "profiles": result}
+
+
 @app.get("/api/export/readings-csv")
 async def export_readings_csv():
     """Export sensor readings as CSV"""
-    readings = db.get_readings(limit=10000)
+    readings = await adb.run(db.get_readings, limit=10000, timeout=EXPORT_TIMEOUT)
     
     output = io.StringIO()
     if readings:
@@ -314,7 +843,7 @@ async def export_readings_csv():
 @app.get("/api/export/predictions-csv")
 async def export_predictions_csv():
     """Export predictions as CSV"""
-    predictions = db.get_predictions(limit=10000)
+    predictions = await adb.run(db.get_predictions, limit=10000, timeout=EXPORT_TIMEOUT)
     
     output = io.StringIO()
     if predictions:
@@ -332,8 +861,8 @@ async def export_predictions_csv():
 @app.get("/api/export/all-csv")
 async def export_all_csv():
     """Export all data as CSV"""
-    readings = db.get_readings(limit=10000)
-    predictions = db.get_predictions(limit=10000)
+    readings = await adb.run(db.get_readings, limit=10000, timeout=EXPORT_TIMEOUT)
+    predictions = await adb.run(db.get_predictions, limit=10000, timeout=EXPORT_TIMEOUT)
     
     output = io.StringIO()
     
@@ -357,7 +886,13 @@ async def export_all_csv():
     )
 
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get response cache hit/miss counters"""
+    return cache.stats()
+
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "ok"}
+    """Health check endpoint (answers before warm-up has finished)"""
+    return {"status": "ok", "ready": services_ready.is_set()}
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Convert the traffic database to the current on-disk layout.
+
+The API converts old partitions in the background on startup; this tool
+does the same work in the foreground (e.g. before deploying), including
+moving a pre-partitioning traffic_data.db into day partitions, and reports
+the size on disk and a few query timings before and after.
+
+Usage: python migrate_db.py [--db traffic_data.db] [--batch-size 5000]
+"""
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+from database import DATABASE_PATH, MIGRATION_BATCH_SIZE, TrafficDatabase
+
+# Runs per query; the median is reported
+QUERY_REPEATS = 5
+
+
+def storage_size(database):
+    """Bytes used by the main database and its partition files, WAL included"""
+    files = [*database.db_path.parent.glob(database.db_path.name + "*"),
+             *database.partition_dir.glob("*.db*")]
+    # The -shm index is rebuilt from the WAL and holds no data
+    return sum(path.stat().st_size for path in files if not path.name.endswith("-shm"))
+
+
+def newest_date(database, unpartitioned):
+    """Latest reading date, the one the by-date query is timed on"""
+    if unpartitioned:
+        with database.get_connection() as conn:
+            return conn.execute('SELECT MAX(DATE(timestamp)) FROM sensor_readings').fetchone()[0]
+    dates = [info["max_date"] for info in database.catalog().values() if info["max_date"]]
+    return max(dates, default=None)
+
+
+def time_queries(database, unpartitioned, date):
+    """Median milliseconds of a few typical API reads"""
+    if unpartitioned:
+        # The queries the API ran against the single sensor_readings table
+        def legacy(sql, *params):
+            def run():
+                with database.get_connection() as conn:
+                    return conn.execute(sql, params).fetchall()
+            return run
+        queries = {
+            "latest 100 readings": legacy('SELECT * FROM sensor_readings ORDER BY created_at DESC LIMIT 100'),
+            f"readings of {date}": legacy('SELECT * FROM sensor_readings WHERE DATE(timestamp) = ? '
+                                          'ORDER BY timestamp DESC', date),
+            "total count": legacy('SELECT COUNT(*) FROM sensor_readings'),
+        }
+    else:
+        queries = {
+            "latest 100 readings": lambda: database.get_readings(100),
+            f"readings of {date}": lambda: database.get_readings_by_date(date),
+            "total count": database.get_total_count,
+        }
+    timings = {}
+    for name, run in queries.items():
+        samples = []
+        for _ in range(QUERY_REPEATS):
+            start = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", type=Path, default=DATABASE_PATH,
+                        help="main database file (partitions live next to it)")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE,
+                        help="rows converted per transaction")
+    args = parser.parse_args()
+
+    database = TrafficDatabase(args.db, lazy=True)
+    # Measured before opening: opening adds the catalog tables to the main file
+    before = storage_size(database)
+    # Opened without moving unpartitioned rows, so their queries can be timed first
+    database.open(migrate_unpartitioned=False)
+    unpartitioned = database.has_unpartitioned()
+    pending = database.pending_migrations()
+    date = newest_date(database, unpartitioned)
+    before_ms = time_queries(database, unpartitioned, date)
+    print(f"{'Unpartitioned database; ' if unpartitioned else ''}"
+          f"{len(pending)} partition(s) to convert, {before / 1024:.1f} KiB on disk")
+
+    progress = lambda day, moved: print(f"  {day}: {moved} reading(s)")
+    start = time.perf_counter()
+    total = database.migrate_unpartitioned(args.batch_size, progress) if unpartitioned else 0
+    total += database.migrate_pending(args.batch_size, progress)
+    elapsed = time.perf_counter() - start
+
+    # Reopened the way the API opens it, so the catalog covers the new partitions
+    database = TrafficDatabase(args.db)
+    after = storage_size(database)
+    after_ms = time_queries(database, False, date)
+    change = (after / before - 1) * 100 if before else 0.0
+    print(f"✓ Converted {total} reading(s) in {elapsed:.2f}s; "
+          f"{before / 1024:.1f} KiB -> {after / 1024:.1f} KiB "
+          f"({abs(change):.0f}% {'larger' if change > 0 else 'smaller'})")
+    for name in before_ms:
+        print(f"  {name}: {before_ms[name]:.2f} ms -> {after_ms[name]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
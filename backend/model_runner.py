@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import pickle
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+log = logging.getLogger(f"traffic.{__name__}")
+
+
+# "process" evaluates the model in a worker pool, "inline" on the event loop.
+# Frozen (PyInstaller) builds cannot re-launch themselves as pool workers.
+MODEL_EXECUTOR = os.getenv("MODEL_EXECUTOR", "inline" if getattr(sys, "frozen", False) else "process")
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", 1))
+# Batches being evaluated at once; readings beyond that wait for the next batch
+MODEL_MAX_IN_FLIGHT = int(os.getenv("MODEL_MAX_IN_FLIGHT", 2))
+# Readings waiting for a batch; past this they get the last known prediction
+MODEL_MAX_BATCH = int(os.getenv("MODEL_MAX_BATCH", 64))
+# Evaluate the model on every Nth reading (0 = only on PREDICTION_INTERVAL) ...
+PREDICTION_EVERY = int(os.getenv("PREDICTION_EVERY", 1))
+# ... or on the first reading this many seconds after the last evaluation (0 = off).
+# Readings in between extend the model's history and share the previous prediction.
+PREDICTION_INTERVAL = float(os.getenv("PREDICTION_INTERVAL", 0))
+
+# Result placeholder: take the result of the reading delivered before this one
+FOLLOW = object()
+
+
+def predict(model):
+    """Everything the API reports for the model's current window"""
+    result = {
+        "congestion": model.predict_congestion(),
+        "next_minute": model.predict_next_minute(),
+        "recommendations": model.get_recommendations(),
+    }
+    if hasattr(model, "forecast"):
+        result["forecast"] = model.forecast()
+    return result
+
+
+def evaluate(state, readings, evaluate_at=None):
+    """
+    Predictions after each of `readings` (or those flagged in evaluate_at),
+    starting from a pickled model that has seen the readings before them;
+    with no readings, the prediction of that model as it is.
+
+    Readings are (gas, count, headway_ms, timestamp_ms) tuples. Runs in a
+    pool worker, which gets the model state with each batch.
+    """
+    model = pickle.loads(state)
+    if not readings:
+        return [predict(model)]
+    results = []
+    for i, reading in enumerate(readings):
+        model.add_reading(*reading)
+        if evaluate_at is None or evaluate_at[i]:
+            results.append(predict(model))
+    return results
+
+
+class ModelRunner:
+    """
+    Runs the prediction model off the event loop.
+
+    The runner keeps a model that is fed every reading in arrival order;
+    each batch carries a snapshot of it (a window of readings, or a
+    filter's state) plus the batch's readings, so workers stay stateless
+    and the cost of a batch does not grow with the model's history. At most `max_in_flight`
+    batches run at once and at most `max_batch` readings wait for the next
+    one; readings beyond that are answered with the last known prediction
+    instead of queueing work the pool cannot catch up on.
+
+    With `every`/`interval` the model is only evaluated every Nth reading or
+    once per interval; the readings in between get the prediction of the
+    last evaluated reading before them. Results are delivered to
+    `on_result(reading, result, evaluated)` in arrival order, where
+    `evaluated` says whether the result was computed for that reading.
+    """
+
+    def __init__(self, model_factory, on_result, window_size=30, executor=MODEL_EXECUTOR,
+                 workers=MODEL_WORKERS, max_in_flight=MODEL_MAX_IN_FLIGHT,
+                 max_batch=MODEL_MAX_BATCH, every=PREDICTION_EVERY, interval=PREDICTION_INTERVAL):
+        if every <= 0 and interval <= 0:
+            raise ValueError("PREDICTION_EVERY or PREDICTION_INTERVAL must be positive")
+        self.model_factory = model_factory
+        self.on_result = on_result
+        self.window_size = window_size
+        self.executor = executor
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.max_batch = max_batch
+        self.every = every
+        self.interval = interval
+        self.latest = predict(model_factory(window_size=window_size))
+        self._pool = None
+        self._history = model_factory(window_size=window_size)  # has seen the readings before the next batch
+        self._pending = []    # entries for the next batch, including history-only ones
+        self._waiting = 0     # entries in _pending that need evaluating
+        self._shed = False    # _pending ends in readings answered by fallback
+        self._order = deque() # [reading, result, evaluated] entries in arrival order
+        self._delivered = self.latest  # result of the last delivered entry
+        self._in_flight = 0
+        self._stale = False   # `latest` predates readings that were answered by fallback
+        self._batches = 0
+        self._latest_batch = 0
+        self._since_evaluation = 0
+        self._evaluated_at = None
+        self._stats = {"submitted": 0, "evaluated": 0, "followed": 0, "fallbacks": 0,
+                       "errors": 0, "batches": 0, "batch_seconds": 0.0}
+
+    def start(self):
+        """Start the worker pool and load the model in it ahead of the first reading"""
+        if self.executor != "process" or self._pool is not None:
+            return
+        # spawn: the API process runs threads, which fork() does not carry safely
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        for _ in range(self.workers):
+            self._pool.submit(evaluate, pickle.dumps(self.model_factory(window_size=self.window_size)), [])
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, reading):
+        """Queue a reading (an object with gas/count/headway_ms/timestamp_ms) for prediction"""
+        entry = [reading, None, False]
+        self._order.append(entry)
+        self._stats["submitted"] += 1
+        if not self._due():
+            entry[1] = FOLLOW
+            self._add_history(entry)
+            self._stats["followed"] += 1
+            self._deliver()
+        elif self._in_flight < self.max_in_flight:
+            self._pending.append(entry)
+            self._waiting += 1
+            self._dispatch()
+        elif self._waiting < self.max_batch:
+            self._pending.append(entry)
+            self._waiting += 1
+        else:
+            # The model is falling behind: answer now, but keep the reading as history
+            entry[1] = self.latest
+            self._add_history(entry)
+            self._shed = self._stale = True
+            self._stats["fallbacks"] += 1
+            self._deliver()
+
+    def _due(self):
+        """Whether the model should be evaluated for the reading being submitted"""
+        self._since_evaluation += 1
+        now = time.monotonic()
+        due = ((self.every > 0 and self._since_evaluation >= self.every) or
+               (self.interval > 0 and (self._evaluated_at is None or
+                                       now - self._evaluated_at >= self.interval)))
+        if due:
+            self._since_evaluation = 0
+            self._evaluated_at = now
+        return due
+
+    def _add_history(self, entry):
+        """Record an already answered reading as model history, in arrival order"""
+        if self._pending:
+            self._pending.append(entry)
+        else:
+            self._history.add_reading(*self._inputs(entry[0]))
+
+    @property
+    def outstanding(self):
+        """Submitted readings not yet handed to on_result"""
+        return len(self._order)
+
+    @staticmethod
+    def _inputs(reading):
+        return (reading.gas, reading.count, reading.headway_ms, reading.timestamp_ms)
+
+    def _dispatch(self):
+        entries, self._pending = self._pending, []
+        self._waiting = 0
+        # Pickled now: the pool sends its arguments later, from another thread
+        state = pickle.dumps(self._history)
+        readings = [self._inputs(entry[0]) for entry in entries]
+        for reading in readings:
+            self._history.add_reading(*reading)
+        # Entries that already have a result only extend the model's history
+        evaluate_at = [entry[1] is None for entry in entries]
+        batch = [entry for entry in entries if entry[1] is None]
+        catch_up = self._stale
+        self._stale, self._shed = self._shed, False
+        if not batch:
+            if not catch_up:
+                return
+            # Catch-up after shedding: evaluate the model as it is now so `latest`
+            # reflects the newest reading. The placeholder entry is not in _order;
+            # nothing is delivered.
+            state, readings, evaluate_at = pickle.dumps(self._history), [], None
+            batch = [[None, None, False]]
+        self._in_flight += 1
+        self._batches += 1
+        batch_id = self._batches
+        started = time.perf_counter()
+
+        if self._pool is None:
+            try:
+                results = evaluate(state, readings, evaluate_at)
+            except Exception as e:
+                results = e
+            self._complete(batch, batch_id, started, results)
+            return
+
+        pool = self._pool
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                pool, evaluate, state, readings, evaluate_at)
+        except BrokenProcessPool as e:
+            self._complete(batch, batch_id, started, e, pool)
+            return
+
+        def done(future):
+            if future.cancelled():
+                self._complete(batch, batch_id, started, asyncio.CancelledError(), pool)
+            else:
+                self._complete(batch, batch_id, started, future.exception() or future.result(), pool)
+
+        future.add_done_callback(done)
+
+    def _complete(self, batch, batch_id, started, results, pool=None):
+        self._in_flight -= 1
+        self._stats["batches"] += 1
+        self._stats["batch_seconds"] += time.perf_counter() - started
+        if isinstance(results, BaseException):
+            log.error("Error evaluating prediction model: %r", results)
+            self._stats["errors"] += 1
+            if isinstance(results, BrokenProcessPool) and pool is self._pool:
+                # A worker died (e.g. OOM-killed): replace the pool for later batches
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.start()
+            results = [self.latest] * len(batch)
+            evaluated = False
+        else:
+            self._stats["evaluated"] += len(results)
+            evaluated = True
+        for entry, result in zip(batch, results):
+            entry[1] = result
+            entry[2] = evaluated
+        if results and batch_id > self._latest_batch:
+            # Batches can finish out of order; never move `latest` backwards
+            self.latest = results[-1]
+            self._latest_batch = batch_id
+        self._deliver()
+        if (self._pending or self._stale) and self._in_flight < self.max_in_flight:
+            self._dispatch()
+
+    def _deliver(self):
+        """Hand finished entries to on_result, stopping at the first unfinished one"""
+        while self._order and self._order[0][1] is not None:
+            reading, result, evaluated = self._order.popleft()
+            if result is FOLLOW:
+                result = self._delivered
+            self._delivered = result
+            try:
+                self.on_result(reading, result, evaluated)
+            except Exception as e:
+                log.exception("Error handling prediction: %s", e)
+
+    def stats(self):
+        batches = self._stats["batches"]  # finished ones
+        return {
+            "executor": "process" if self._pool is not None else "inline",
+            "workers": self.workers if self._pool is not None else 0,
+            "in_flight": self._in_flight,
+            "pending": self._waiting,
+            "every": self.every,
+            "interval": self.interval,
+            "submitted": self._stats["submitted"],
+            "evaluated": self._stats["evaluated"],
+            "followed": self._stats["followed"],
+            "fallbacks": self._stats["fallbacks"],
+            "errors": self._stats["errors"],
+            "batches": batches,
+            "avg_batch_ms": round(self._stats["batch_seconds"] / batches * 1000, 2) if batches else 0.0,
+        }
@@ -1,6 +1,35 @@
+import os
+import math
 import numpy as np
 from collections import deque
-from datetime import datetime, timedelta
+
+
+# Forecast horizons (minutes) reported by models that produce forecasts
+FORECAST_HORIZONS_MIN = [int(m) for m in os.getenv("FORECAST_HORIZONS_MIN", "1,5,15").split(",")]
+
+# Two-sided band reported around forecasts (1.96 = 95%)
+FORECAST_BAND_Z = 1.96
+
+
+def observed_level(gas, count, headway_ms):
+    """Congestion level (0-100) of a single reading, without any trend term"""
+    gas_factor = max(0, min(1, gas / 2000))
+    count_factor = max(0, min(1, count / 10))
+    headway_factor = max(0, min(1, 1 - headway_ms / 5000))
+    return int((headway_factor * 0.60 + gas_factor * 0.20 + count_factor * 0.15) * 100)
+
+
+def congestion_status(level):
+    """Status label for a 0-100 congestion level"""
+    if level < 20:
+        return "FREE_FLOW"
+    elif level < 40:
+        return "LIGHT"
+    elif level < 60:
+        return "MODERATE"
+    elif level < 80:
+        return "HEAVY"
+    return "SEVERE"
 
 
 class TrafficCongestionPredictor:
@@ -19,12 +48,12 @@ class TrafficCongestionPredictor:
         self.headway_history = deque(maxlen=window_size)
         self.timestamps = deque(maxlen=window_size)
     
-    def add_reading(self, gas: int, count: int, headway_ms: int, timestamp: str):
-        """Add a new reading to the model"""
+    def add_reading(self, gas: int, count: int, headway_ms: int, timestamp_ms: int):
+        """Add a new reading to the model (timestamp in epoch milliseconds)"""
         self.gas_history.append(gas)
         self.count_history.append(count)
         self.headway_history.append(headway_ms)
-        self.timestamps.append(datetime.fromisoformat(timestamp.replace('Z', '+00:00')))
+        self.timestamps.append(timestamp_ms)
     
     def _normalize(self, value, min_val, max_val):
         """Normalize value to 0-1 range"""
@@ -50,7 +79,7 @@ class TrafficCongestionPredictor:
         0 = Free flow, 50 = Moderate, 100 = Severe congestion
         """
         if len(self.gas_history) < 3:
-            return {"level": 0, "status": "INSUFFICIENT_DATA", "confidence": 0}
+            return {"level": 0, "status": "INSUFFICIENT_DATA", "confidence": 0, "factors": {}}
         
         # Get current metrics
         current_gas = self.gas_history[-1]
@@ -101,16 +130,7 @@ class TrafficCongestionPredictor:
         congestion_level = int(congestion_score * 100)
         
         # Determine status
-        if congestion_level < 20:
-            status = "FREE_FLOW"
-        elif congestion_level < 40:
-            status = "LIGHT"
-        elif congestion_level < 60:
-            status = "MODERATE"
-        elif congestion_level < 80:
-            status = "HEAVY"
-        else:
-            status = "SEVERE"
+        status = congestion_status(congestion_level)
         
         # Calculate confidence (based on data points)
         confidence = min(100, len(self.gas_history) / self.window_size * 100)
@@ -138,7 +158,7 @@ class TrafficCongestionPredictor:
     def predict_next_minute(self):
         """Predict congestion for the next minute"""
         if len(self.gas_history) < 5:
-            return {"prediction": 0, "status": "INSUFFICIENT_DATA"}
+            return {"prediction": 0, "status": "INSUFFICIENT_DATA", "change": 0}
         
         # Simple linear extrapolation
         gas_trend = self._calculate_trend(self.gas_history)
@@ -163,16 +183,7 @@ class TrafficCongestionPredictor:
         
         predicted_level = int((headway_factor * 0.60 + gas_factor * 0.20 + count_factor * 0.15) * 100)
         
-        if predicted_level < 20:
-            status = "FREE_FLOW"
-        elif predicted_level < 40:
-            status = "LIGHT"
-        elif predicted_level < 60:
-            status = "MODERATE"
-        elif predicted_level < 80:
-            status = "HEAVY"
-        else:
-            status = "SEVERE"
+        status = congestion_status(predicted_level)
         
         return {
             "prediction": predicted_level,
@@ -211,3 +222,198 @@ class TrafficCongestionPredictor:
             recommendations.append("✓ Traffic improving - condition should ease in next minute")
         
         return recommendations
+
+
+class _LocalTrend:
+    """
+    Kalman filter for one metric under a local linear trend model.
+
+    State is (level, slope per second). Readings may arrive at irregular
+    intervals: process noise is that of a continuous white-noise slope,
+    scaled by the elapsed time. Measurement noise is estimated online from
+    the innovations, so no per-sensor tuning is needed.
+    """
+
+    __slots__ = ("process_noise", "level", "slope", "p00", "p01", "p11", "r")
+
+    # Weight of each new innovation in the measurement-noise estimate
+    NOISE_ADAPT = 0.05
+    NOISE_FLOOR = 1e-3
+
+    def __init__(self, process_noise):
+        self.process_noise = process_noise
+        self.level = None
+        self.slope = 0.0
+        self.p00 = self.p01 = self.p11 = 0.0
+        self.r = 1.0
+
+    def update(self, z, dt):
+        if self.level is None:
+            self.level = float(z)
+            # Unknown scale: start from a 10% relative error and let it adapt
+            self.r = max((0.1 * z) ** 2, 1.0)
+            self.p00 = self.r
+            self.p11 = self.r
+            return
+        # Predict
+        q = self.r * self.process_noise
+        self.level += self.slope * dt
+        self.p00 += dt * (2 * self.p01 + dt * self.p11) + q * dt ** 3 / 3
+        self.p01 += dt * self.p11 + q * dt ** 2 / 2
+        self.p11 += q * dt
+        # Correct
+        innovation = z - self.level
+        prior = self.p00
+        s = prior + self.r
+        k0 = prior / s
+        k1 = self.p01 / s
+        self.level += k0 * innovation
+        self.slope += k1 * innovation
+        self.p11 -= k1 * self.p01
+        self.p00 *= 1 - k0
+        self.p01 *= 1 - k0
+        self.r = max(self.NOISE_FLOOR, (1 - self.NOISE_ADAPT) * self.r +
+                     self.NOISE_ADAPT * max(innovation * innovation - prior, 0.0))
+
+    def forecast(self, horizon_s):
+        """(mean, standard deviation) of a reading horizon_s seconds ahead"""
+        h = horizon_s
+        q = self.r * self.process_noise
+        variance = (self.p00 + 2 * h * self.p01 + h * h * self.p11 +
+                    q * h ** 3 / 3 + self.r)
+        return self.level + self.slope * h, math.sqrt(max(variance, 0.0))
+
+
+class KalmanTrendPredictor(TrafficCongestionPredictor):
+    """
+    Congestion model driven by per-metric Kalman trend filters.
+
+    Each reading updates gas, count and headway filters in constant time
+    and memory. Congestion uses the filtered levels instead of raw
+    samples, and forecasts at FORECAST_HORIZONS_MIN come with uncertainty
+    bands. Recommendations are shared with the window model.
+    """
+
+    # Slope random-walk intensity relative to the measurement noise (per s^3)
+    PROCESS_NOISE = {"gas": 1e-6, "count": 1e-6, "headway": 1e-6}
+    # Step assumed until timestamps say otherwise, and for readings without one
+    DEFAULT_INTERVAL_S = 0.5
+
+    def __init__(self, window_size=30, horizons_min=None):
+        # window_size only sets how many readings count as a full warm-up
+        self.window_size = window_size
+        self.horizons_min = horizons_min or FORECAST_HORIZONS_MIN
+        self.filters = {name: _LocalTrend(noise) for name, noise in self.PROCESS_NOISE.items()}
+        self.readings = 0
+        self.last_timestamp_ms = None
+        self.interval_s = self.DEFAULT_INTERVAL_S  # smoothed time between readings
+        self.current = None  # last raw (gas, count, headway)
+
+    def add_reading(self, gas: int, count: int, headway_ms: int, timestamp_ms: int):
+        """Update the filters with a reading (timestamp in epoch milliseconds)"""
+        if timestamp_ms <= 0 or self.last_timestamp_ms is None:
+            dt = self.interval_s
+        else:
+            # Sensor clocks have 1 s resolution: equal (or out-of-order)
+            # timestamps are readings taken at the same time
+            dt = max(0, timestamp_ms - self.last_timestamp_ms) / 1000
+            self.interval_s += 0.1 * (dt - self.interval_s)
+        if timestamp_ms > 0:
+            self.last_timestamp_ms = max(timestamp_ms, self.last_timestamp_ms or 0)
+        self.filters["gas"].update(gas, dt)
+        self.filters["count"].update(count, dt)
+        self.filters["headway"].update(headway_ms, dt)
+        self.readings += 1
+        self.current = (gas, count, headway_ms)
+
+    def _level(self, gas, count, headway, trend_factor=0.0):
+        gas_factor = max(0, min(1, self._normalize(gas, 0, 2000)))
+        count_factor = max(0, min(1, self._normalize(count, 0, 10)))
+        headway_factor = max(0, min(1, 1 - self._normalize(headway, 0, 5000)))
+        score = headway_factor * 0.60 + gas_factor * 0.20 + count_factor * 0.15 + trend_factor * 0.05
+        return int(score * 100), gas_factor, count_factor, headway_factor
+
+    def _trend_factor(self):
+        # Same scale as the window model: slopes per sample, worsening positive
+        f = self.filters
+        per_sample = self.interval_s
+        trend = (f["gas"].slope + f["count"].slope - f["headway"].slope) * per_sample
+        return max(0, min(1, trend / 10))
+
+    def predict_congestion(self):
+        """Congestion level (0-100) from the filtered current values"""
+        if self.readings < 3:
+            return {"level": 0, "status": "INSUFFICIENT_DATA", "confidence": 0, "factors": {}}
+        f = self.filters
+        trend_factor = self._trend_factor()
+        level, gas_factor, count_factor, headway_factor = self._level(
+            f["gas"].level, f["count"].level, f["headway"].level, trend_factor)
+        current_gas, current_count, current_headway = self.current
+        return {
+            "level": level,
+            "status": congestion_status(level),
+            "confidence": int(min(100, self.readings / self.window_size * 100)),
+            "factors": {
+                "gas": int(gas_factor * 100),
+                "vehicle_count": int(count_factor * 100),
+                "headway_time": int(headway_factor * 100),
+                "trend": int(trend_factor * 100)
+            },
+            "metrics": {
+                "current_gas": current_gas,
+                "avg_gas": round(f["gas"].level, 2),
+                "current_count": current_count,
+                "avg_count": round(f["count"].level, 2),
+                "current_headway": current_headway,
+                "avg_headway": round(f["headway"].level, 2)
+            }
+        }
+
+    def _forecast_at(self, minutes):
+        """Forecast of every metric and the congestion level `minutes` ahead"""
+        out = {"minutes": minutes}
+        bands = {}
+        for name, bounds in (("gas", (0, 2000)), ("count", (0, 15)), ("headway", (0, None))):
+            mean, sd = self.filters[name].forecast(minutes * 60)
+            lo, hi = bounds
+            clip = lambda v: max(lo, v if hi is None else min(hi, v))
+            bands[name] = (clip(mean), clip(mean - FORECAST_BAND_Z * sd), clip(mean + FORECAST_BAND_Z * sd))
+            out[name] = {"mean": round(bands[name][0], 2), "lower": round(bands[name][1], 2),
+                         "upper": round(bands[name][2], 2)}
+        gas, count, headway = bands["gas"], bands["count"], bands["headway"]
+        # Congestion rises with gas and count and falls with headway
+        level = self._level(gas[0], count[0], headway[0])[0]
+        lower = self._level(gas[1], count[1], headway[2])[0]
+        upper = self._level(gas[2], count[2], headway[1])[0]
+        out["congestion"] = {"level": level, "lower": lower, "upper": upper,
+                             "status": congestion_status(level)}
+        return out
+
+    def forecast(self):
+        """Forecasts at each configured horizon"""
+        if self.readings < 5:
+            return {"horizons": [], "status": "INSUFFICIENT_DATA"}
+        return {"horizons": [self._forecast_at(m) for m in self.horizons_min]}
+
+    def predict_next_minute(self):
+        """Predict congestion one minute ahead (with its 95% band)"""
+        if self.readings < 5:
+            return {"prediction": 0, "status": "INSUFFICIENT_DATA", "change": 0}
+        congestion = self._forecast_at(1)["congestion"]
+        return {
+            "prediction": congestion["level"],
+            "status": congestion["status"],
+            "change": congestion["level"] - self.predict_congestion()["level"],
+            "lower": congestion["lower"],
+            "upper": congestion["upper"]
+        }
+
+
+# PREDICTION_MODEL name -> (model class, window_size)
+PREDICTION_MODELS = {
+    "window": (TrafficCongestionPredictor, 30),
+    # Readings until full confidence: by then a fresh filter's forecasts are
+    # within 0.05 sd of one that has seen the whole history
+    "kalman": (KalmanTrendPredictor, 240),
+}
+PREDICTION_MODEL = os.getenv("PREDICTION_MODEL", "window")
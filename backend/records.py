@@ -0,0 +1,81 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+from datetime import datetime, date, timedelta, timezone
+
+
+# Sentinel for readings whose timestamp could not be parsed
+NO_TIMESTAMP = -2 ** 63
+
+# Naive UTC epoch; adding a timedelta is much cheaper than strftime
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_timestamp_ms(text: str) -> int:
+    """ISO 8601 timestamp -> epoch milliseconds (naive values are UTC)"""
+    try:
+        dt = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return NO_TIMESTAMP
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return round(dt.timestamp() * 1000)
+
+
+def format_timestamp_ms(ms: int) -> str:
+    """Epoch milliseconds -> ISO 8601 UTC timestamp as sent by the sensors"""
+    if ms is None or ms == NO_TIMESTAMP:
+        return ""
+    text = (_EPOCH + timedelta(seconds=ms // 1000)).isoformat()
+    if ms % 1000:
+        text += f".{ms % 1000:03d}"
+    return text + "Z"
+
+
+def format_local_ms(ms: int) -> str:
+    """Epoch milliseconds -> naive local ISO 8601 (the received_at format)"""
+    return datetime.fromtimestamp(ms / 1000).isoformat()
+
+
+def format_sql_utc_ms(ms: int) -> str:
+    """Epoch milliseconds -> 'YYYY-MM-DD HH:MM:SS' UTC (SQLite CURRENT_TIMESTAMP format)"""
+    return (_EPOCH + timedelta(seconds=ms // 1000)).isoformat(' ')
+
+
+def utc_date_ms(ms: int) -> str:
+    """UTC calendar date (YYYY-MM-DD) of an epoch-millisecond time"""
+    return (_EPOCH + timedelta(seconds=ms // 1000)).date().isoformat()
+
+
+def utc_day_bounds_ms(day: str):
+    """[start, end) epoch milliseconds of a UTC calendar date"""
+    start = datetime.combine(date.fromisoformat(day), datetime.min.time(), tzinfo=timezone.utc)
+    start_ms = round(start.timestamp() * 1000)
+    return start_ms, start_ms + 86_400_000
+
+
+def now_ms() -> int:
+    """Current wall-clock time in epoch milliseconds"""
+    return time.time_ns() // 1_000_000
+
+
+@dataclass(slots=True)
+class SerialData:
+    """One sensor reading; times are epoch milliseconds parsed once at the framer"""
+    timestamp_ms: int
+    uid: str
+    gas: int
+    count: int
+    headway_ms: int
+    flag: str
+    received_ms: int
+    # Ingest journal record the reading was parsed from (None if not journaled)
+    journal_seq: Optional[int] = None
+
+    @property
+    def timestamp(self) -> str:
+        return format_timestamp_ms(self.timestamp_ms)
+
+    @property
+    def received_at(self) -> datetime:
+        return datetime.fromtimestamp(self.received_ms / 1000)
@@ -0,0 +1,103 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+
+CACHE_TTL = float(os.getenv("API_CACHE_TTL", 5))
+CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", 256))
+
+
+class ResponseCache:
+    """
+    Read-through TTL + LRU cache for computed API responses.
+
+    Entries remember the version of every source tag they were computed
+    from ("ingest", "predictor", ...). Bumping a tag invalidates all
+    entries that depend on it, so writers never have to know cache keys.
+    Concurrent misses on the same key share a single computation.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, versions, value)
+        self._pending = {}             # (key, versions) -> asyncio.Future
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def bump(self, tag):
+        """Invalidate every entry computed from `tag` (safe from any thread)"""
+        with self._lock:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+            self.invalidations += 1
+
+    def _current_versions(self, tags):
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    async def get_or_set(self, key, compute, tags=(), ttl=None):
+        """Return the cached value for key, awaiting compute() on a miss"""
+        versions = self._current_versions(tags)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, entry_versions, value = entry
+            if expires_at > time.monotonic() and entry_versions == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        pending = self._pending.get((key, versions))
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(key, versions)] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            del self._pending[(key, versions)]
+
+        # Only store if no source changed while we were computing
+        if versions == self._current_versions(tags):
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), versions, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        """Hit/miss counters"""
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Create global response cache instance
+cache = ResponseCache()
@@ -0,0 +1,188 @@
+import os
+import numpy as np
+from records import NO_TIMESTAMP, format_local_ms
+
+
+# Preallocated capacity of the live data buffer (~62 bytes per reading)
+DATA_BUFFER_CAPACITY = int(os.getenv("DATA_BUFFER_CAPACITY", 1_048_576))
+
+FACTOR_KEYS = ("gas", "vehicle_count", "headway_time", "trend")
+
+
+def _format_timestamps(ms):
+    """Vectorized format_timestamp_ms over an int64 array"""
+    text = np.datetime_as_string(ms.astype('datetime64[ms]'), unit='ms').tolist()
+    whole = (ms % 1000 == 0).tolist()
+    missing = (ms == NO_TIMESTAMP).tolist()
+    return ["" if missing[i] else (t[:19] if whole[i] else t) + "Z"
+            for i, t in enumerate(text)]
+
+
+class Interner:
+    """Maps repeated values (uids, statuses, recommendation sets) to small integer codes"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ReadingBuffer:
+    """
+    Fixed-size columnar ring buffer of recent readings and their predictions.
+
+    Numeric fields live in preallocated NumPy arrays; strings are stored as
+    interned codes. Appends are O(1), tail and time-range slices are O(k)
+    in the number of rows returned and never copy the whole buffer.
+    """
+
+    COLUMNS = {
+        "timestamp_ms": np.int64,
+        "received_ms": np.int64,
+        "uid": np.int32,
+        "gas": np.int32,
+        "count": np.int32,
+        "headway_ms": np.int32,
+        "flag": np.int32,
+        "congestion_level": np.int16,
+        "congestion_status": np.int16,
+        "confidence": np.int16,
+        "next_minute_prediction": np.int16,
+        "next_minute_status": np.int16,
+        "recommendations": np.int32,
+        "baseline_deviation": np.float32,  # NaN = no baseline yet
+    }
+
+    def __init__(self, capacity=DATA_BUFFER_CAPACITY):
+        self.capacity = capacity
+        # np.zeros maps untouched pages lazily, so unused capacity costs no RSS
+        self._columns = {name: np.zeros(capacity, dtype=dtype)
+                         for name, dtype in self.COLUMNS.items()}
+        self._factors = np.zeros((capacity, len(FACTOR_KEYS)), dtype=np.int16)
+        self._strings = Interner()        # uid, flag, statuses
+        self._recommendations = Interner()  # tuples of recommendation strings
+        self._head = 0   # next physical slot to write
+        self._size = 0
+        self.sequence = 0  # appends (and clears) so far; versions API responses
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Memory reserved by the buffer arrays"""
+        return sum(a.nbytes for a in self._columns.values()) + self._factors.nbytes
+
+    def append(self, timestamp_ms, uid, gas, count, headway_ms, flag, received_ms, prediction):
+        """Store one reading with its prediction payload"""
+        i = self._head
+        c = self._columns
+        c["timestamp_ms"][i] = timestamp_ms
+        c["received_ms"][i] = received_ms
+        c["uid"][i] = self._strings.code(uid)
+        c["gas"][i] = gas
+        c["count"][i] = count
+        c["headway_ms"][i] = headway_ms
+        c["flag"][i] = self._strings.code(flag)
+        c["congestion_level"][i] = prediction["congestion_level"]
+        c["congestion_status"][i] = self._strings.code(prediction["congestion_status"])
+        c["confidence"][i] = prediction["confidence"]
+        c["next_minute_prediction"][i] = prediction["next_minute_prediction"]
+        c["next_minute_status"][i] = self._strings.code(prediction["next_minute_status"])
+        c["recommendations"][i] = self._recommendations.code(tuple(prediction["recommendations"]))
+        deviation = prediction.get("baseline_deviation")
+        c["baseline_deviation"][i] = np.nan if deviation is None else deviation
+        factors = prediction.get("factors")
+        self._factors[i] = [factors[k] for k in FACTOR_KEYS] if factors else -1
+
+        self._head = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.sequence += 1
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+        self.sequence += 1
+
+    def tail(self, k):
+        """Most recent k readings, oldest first"""
+        k = max(0, min(k, self._size))
+        start = (self._head - k) % self.capacity
+        if start + k <= self.capacity:
+            return self._materialize(slice(start, start + k))
+        return (self._materialize(slice(start, self.capacity)) +
+                self._materialize(slice(0, (start + k) % self.capacity)))
+
+    def between(self, start_ms=None, end_ms=None, limit=None):
+        """Readings received in [start_ms, end_ms), oldest first (only the newest `limit`)"""
+        received = self._columns["received_ms"]
+        if self._size < self.capacity:
+            segments = [(0, self._size)]
+        else:
+            segments = [(self._head, self.capacity), (0, self._head)]
+
+        ranges = []
+        for lo, hi in segments:
+            # Each segment is in arrival order, so received_ms is sorted
+            view = received[lo:hi]
+            a = lo + (np.searchsorted(view, start_ms, 'left') if start_ms is not None else 0)
+            b = lo + (np.searchsorted(view, end_ms, 'left') if end_ms is not None else hi - lo)
+            if a < b:
+                ranges.append((a, b))
+
+        if limit is not None:
+            # Trim the index ranges from the newest end before building any rows
+            remaining = max(0, limit)
+            trimmed = []
+            for a, b in reversed(ranges):
+                if remaining <= 0:
+                    break
+                a = max(a, b - remaining)
+                trimmed.append((a, b))
+                remaining -= b - a
+            ranges = trimmed[::-1]
+
+        rows = []
+        for a, b in ranges:
+            rows.extend(self._materialize(slice(a, b)))
+        return rows
+
+    def _materialize(self, rows: slice):
+        """Build API payload dicts for a contiguous physical slice"""
+        cols = {name: arr[rows].tolist() for name, arr in self._columns.items()}
+        timestamps = _format_timestamps(self._columns["timestamp_ms"][rows])
+        factors = self._factors[rows].tolist()
+        strings = self._strings.values
+        recommendations = self._recommendations.values
+        out = []
+        for i in range(len(cols["gas"])):
+            factor_row = factors[i]
+            deviation = cols["baseline_deviation"][i]
+            out.append({
+                "timestamp": timestamps[i],
+                "uid": strings[cols["uid"][i]],
+                "gas": cols["gas"][i],
+                "count": cols["count"][i],
+                "headway_ms": cols["headway_ms"][i],
+                "flag": strings[cols["flag"][i]],
+                "received_at": format_local_ms(cols["received_ms"][i]),
+                "prediction": {
+                    "congestion_level": cols["congestion_level"][i],
+                    "congestion_status": strings[cols["congestion_status"][i]],
+                    "confidence": cols["confidence"][i],
+                    "factors": (dict(zip(FACTOR_KEYS, factor_row))
+                                if factor_row[0] >= 0 else {}),
+                    "next_minute_prediction": cols["next_minute_prediction"][i],
+                    "next_minute_status": strings[cols["next_minute_status"][i]],
+                    "recommendations": list(recommendations[cols["recommendations"][i]]),
+                    # Stored as float32; back to the one decimal it was computed with
+                    "baseline_deviation": None if deviation != deviation else round(deviation, 1),
+                },
+            })
+        return out
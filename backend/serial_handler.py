@@ -1,34 +1,70 @@
+import os
+import re
 import json
+import time
+import logging
 import asyncio
-import serial
-import serial.tools.list_ports
-from typing import Callable, Optional
-from dataclasses import dataclass
-from datetime import datetime
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+from records import SerialData, parse_timestamp_ms, now_ms
 
+# pyserial (and its platform port enumeration) is imported on first use
+if TYPE_CHECKING:
+    import serial
 
-@dataclass
-class SerialData:
-    timestamp: str
-    uid: str
-    gas: int
-    count: int
-    headway_ms: int
-    flag: str
-    received_at: datetime
+# Seconds between serial port scans. /api/ports and WebSocket clients share
+# the result, so enumeration cost does not grow with the number of viewers.
+PORT_SCAN_INTERVAL = float(os.getenv("PORT_SCAN_INTERVAL", 2))
+# After the device drops, reconnect attempts start SERIAL_RECONNECT_MIN_DELAY
+# seconds apart and back off (doubling) to SERIAL_RECONNECT_MAX_DELAY, which
+# bounds how long a returning device waits to be picked up
+SERIAL_RECONNECT_MIN_DELAY = float(os.getenv("SERIAL_RECONNECT_MIN_DELAY", 0.05))
+SERIAL_RECONNECT_MAX_DELAY = float(os.getenv("SERIAL_RECONNECT_MAX_DELAY", 0.5))
+
+log = logging.getLogger(f"traffic.{__name__}")
+
+
+def parse_reading(line: str, received_ms: int, journal_seq: Optional[int] = None) -> SerialData:
+    """SerialData from one JSON line (raises ValueError if it is not a reading)"""
+    parsed = json.loads(line)
+    if not isinstance(parsed, dict):
+        raise ValueError("not a JSON object")
+    # Handle typos in field names
+    count = parsed.get('count', parsed.get('counay_ms', 0))
+    if count == 0 and 'counay_ms' in parsed:
+        count = 0  # If only typo field exists, default to 0
+
+    return SerialData(
+        timestamp_ms=parse_timestamp_ms(parsed.get('timestamp', '')),
+        uid=parsed.get('uid', ''),
+        gas=parsed.get('gas', 0),
+        count=count,
+        headway_ms=parsed.get('headway_ms', 0),
+        flag=parsed.get('flag', ''),
+        received_ms=received_ms,
+        journal_seq=journal_seq
+    )
 
 
 class SerialHandler:
     def __init__(self, baud_rate: int = 115200):
-        self.serial_port: Optional[serial.Serial] = None
+        self.serial_port: Optional["serial.Serial"] = None
         self.baud_rate = baud_rate
         self.port_name: Optional[str] = None
         self.is_connected = False
         self.callback: Optional[Callable] = None
+        # IngestJournal that raw lines are appended to before they are parsed
+        self.journal = None
+        # Bytes of the line still being received; kept across reader restarts
+        self.buffer = b""
+        # After opening a port, skip the tail of a line that started before it
+        self.resync = False
+        self.reading = False
+        self.lost_lines = 0  # partial lines discarded at disconnects
 
     @staticmethod
     def list_available_ports():
         """List all available serial ports"""
+        import serial.tools.list_ports
         ports = []
         for port, desc, hwid in serial.tools.list_ports.comports():
             ports.append({
@@ -36,88 +72,122 @@ class SerialHandler:
                 "description": desc,
                 "hwid": hwid
             })
-        return ports
+        # Stable order, so two scans of the same ports compare equal
+        return sorted(ports, key=lambda port: port["port"])
+
+    def open(self, port: str):
+        """Open a serial port at the current baud rate (raises if it cannot)"""
+        import serial
+        self.serial_port = serial.Serial(
+            port=port,
+            baudrate=self.baud_rate,
+            timeout=1,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE
+        )
+        self.port_name = port
+        self.is_connected = True
+        self.reading = True
+        self.resync = True
 
     def connect(self, port: str, baud_rate: int = None) -> bool:
         """Connect to a serial port"""
         try:
             if baud_rate:
                 self.baud_rate = baud_rate
-            
-            self.serial_port = serial.Serial(
-                port=port,
-                baudrate=self.baud_rate,
-                timeout=1,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE
-            )
-            self.port_name = port
-            self.is_connected = True
+            self.open(port)
             return True
         except Exception as e:
-            print(f"Failed to connect: {e}")
+            log.error("Failed to connect to %s: %s", port, e)
             self.is_connected = False
             return False
 
     def disconnect(self):
         """Disconnect from serial port"""
         if self.serial_port and self.serial_port.is_open:
-            self.serial_port.close()
-            self.is_connected = False
+            try:
+                self.serial_port.close()
+            except OSError:
+                pass  # The device is gone already
+        self.is_connected = False
 
-    async def read_data(self, callback: Callable[[SerialData], None]):
-        """Read data from serial port asynchronously"""
-        self.callback = callback
-        buffer = ""
-        
-        while self.is_connected:
+    def discard_partial(self):
+        """Drop the unfinished line (the rest of it went with the connection)"""
+        if self.buffer.strip():
+            self.lost_lines += 1
+        self.buffer = b""
+
+    def _skip_fragment(self, chunk: bytes) -> bytes:
+        """The chunk without the end of a line whose start was never read"""
+        stripped = chunk.lstrip()
+        if not stripped:
+            return b""
+        if stripped.startswith(b"{"):
+            self.resync = False
+            return chunk
+        end = chunk.find(b"\n")
+        if end < 0:
+            return b""
+        self.resync = False
+        self.lost_lines += 1
+        return chunk[end + 1:]
+
+    async def _read_available(self, callback):
+        """Hand on every complete line the OS has buffered; the rest stays in self.buffer"""
+        waiting = self.serial_port.in_waiting
+        if not waiting:
+            return
+        chunk = self.serial_port.read(waiting)
+        if self.resync:
+            chunk = self._skip_fragment(chunk)
+        self.buffer += chunk
+
+        # Complete JSON lines; the rest waits for the next read
+        *lines, self.buffer = self.buffer.split(b'\n')
+        lines = [line.strip() for line in lines if line.strip()]
+        received_ms = now_ms()
+        first_seq = None
+        if lines and self.journal is not None:
+            first_seq = self.journal.append(lines, received_ms)
+
+        for i, line in enumerate(lines):
+            line = line.decode('utf-8', errors='ignore')
             try:
-                if self.serial_port and self.serial_port.in_waiting:
-                    data = self.serial_port.read(self.serial_port.in_waiting).decode('utf-8', errors='ignore')
-                    buffer += data
-                    
-                    # Look for complete JSON lines
-                    while '\n' in buffer:
-                        line, buffer = buffer.split('\n', 1)
-                        line = line.strip()
-                        
-                        if line:
-                            try:
-                                parsed = json.loads(line)
-                                # Handle typos in field names
-                                count = parsed.get('count', parsed.get('counay_ms', 0))
-                                if count == 0 and 'counay_ms' in parsed:
-                                    count = 0  # If only typo field exists, default to 0
-                                
-                                serial_data = SerialData(
-                                    timestamp=parsed.get('timestamp', ''),
-                                    uid=parsed.get('uid', ''),
-                                    gas=parsed.get('gas', 0),
-                                    count=count,
-                                    headway_ms=parsed.get('headway_ms', 0),
-                                    flag=parsed.get('flag', ''),
-                                    received_at=datetime.now()
-                                )
-                                if callback:
-                                    callback(serial_data)
-                            except json.JSONDecodeError:
-                                print(f"Failed to parse JSON: {line}")
-                
-                await asyncio.sleep(0.01)  # Prevent busy waiting
-            except Exception as e:
-                print(f"Error reading from serial: {e}")
-                await asyncio.sleep(0.1)
+                serial_data = parse_reading(
+                    line, received_ms, first_seq + i if first_seq is not None else None)
+            except ValueError:
+                log.warning("Failed to parse JSON: %s", line, extra={"port": self.port_name})
+                continue
+            if callback:
+                await callback(serial_data)
+
+    async def read_data(self, callback: Callable[[SerialData], Awaitable[None]]):
+        """
+        Read lines until stop_reading() (awaits callback, so it can apply
+        backpressure). Raises OSError if the device goes away.
+        """
+        self.callback = callback
+        while self.is_connected and self.reading:
+            await self._read_available(callback)
+            await asyncio.sleep(0.01)  # Prevent busy waiting
+        if self.is_connected:
+            # Stopped on purpose: take what the OS had buffered too
+            await self._read_available(callback)
+
+    def stop_reading(self):
+        """Make read_data return after the chunk it is handling"""
+        self.reading = False
 
     def change_baud_rate(self, new_baud_rate: int) -> bool:
-        """Change baud rate (requires reconnection)"""
+        """Change baud rate (in place, so nothing the port has buffered is lost)"""
         if self.is_connected:
-            self.disconnect()
-        
+            try:
+                self.serial_port.baudrate = new_baud_rate
+            except (OSError, ValueError) as e:
+                log.error("Failed to set %s to %d baud: %s", self.port_name, new_baud_rate, e)
+                return False
         self.baud_rate = new_baud_rate
-        
-        if self.port_name:
-            return self.connect(self.port_name, new_baud_rate)
         return True
 
     def get_status(self):
@@ -127,3 +197,247 @@ class SerialHandler:
             "port": self.port_name,
             "baud_rate": self.baud_rate
         }
+
+
+def device_id(hwid: Optional[str]) -> Optional[str]:
+    """hwid without the USB location, so a device moved to another socket still matches"""
+    if not hwid or hwid == "n/a":
+        return None
+    return re.sub(r"\s*LOCATION=\S+", "", hwid)
+
+
+class SerialSupervisor:
+    """
+    Runs a SerialHandler's reader task. connect(), disconnect() and
+    set_baud_rate() are serialized, and a reader is always stopped (and
+    awaited) before the port is touched, so two readers never overlap.
+
+    When the device drops, it is reopened with exponential backoff, at its
+    old port or wherever the same hwid shows up again (wake() retries at
+    once, e.g. when the port list changes). The unfinished line at the drop
+    and the tail of one cut at the reopen are counted in lost_lines.
+    on_status(state) is called whenever the state changes.
+    """
+
+    def __init__(self, handler: SerialHandler, callback: Callable[[SerialData], Awaitable[None]],
+                 on_status: Callable[[str], None] = None, min_delay: float = SERIAL_RECONNECT_MIN_DELAY,
+                 max_delay: float = SERIAL_RECONNECT_MAX_DELAY):
+        self.handler = handler
+        self.callback = callback
+        self.on_status = on_status
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.state = "disconnected"  # connected | reconnecting | disconnected
+        self.hwid: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._stats = {"faults": 0, "reconnects": 0, "attempts": 0,
+                       "reconnect_seconds": 0.0, "last_reconnect_seconds": None, "max_reconnect_seconds": 0.0}
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_status:
+                self.on_status(state)
+
+    async def connect(self, port: str, baud_rate: int = None) -> bool:
+        """Open a port (closing the current one) and start reading from it"""
+        async with self._lock:
+            await self._stop()
+            self.handler.disconnect()
+            self.handler.discard_partial()
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, self.handler.connect, port, baud_rate):
+                self._set_state("disconnected")
+                return False
+            self.hwid = await self._hwid(port)
+            self._task = asyncio.create_task(self._run())
+            self._set_state("connected")
+            return True
+
+    async def disconnect(self):
+        """Stop reading (after the lines the port has already buffered) and close the port"""
+        async with self._lock:
+            await self._stop()
+            self.handler.disconnect()
+            self._set_state("disconnected")
+
+    async def set_baud_rate(self, baud_rate: int) -> bool:
+        """Change baud rate; the reader carries on (a reconnect uses the new rate)"""
+        async with self._lock:
+            return self.handler.change_baud_rate(baud_rate)
+
+    def wake(self):
+        """Retry a pending reconnect now"""
+        self._wake.set()
+
+    async def close(self):
+        """Cancel the reader and close the port (on shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.handler.disconnect()
+
+    async def _stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopping = True
+        self.handler.stop_reading()
+        self._wake.set()
+        try:
+            await task
+        finally:
+            self._stopping = False
+
+    async def _run(self):
+        """Read until stopped; after each fault, reconnect and read on"""
+        while True:
+            try:
+                await self.handler.read_data(self.callback)
+                return
+            except Exception as e:
+                log.warning("Lost serial device on %s: %s", self.handler.port_name, e)
+            self._stats["faults"] += 1
+            self.handler.disconnect()
+            self.handler.discard_partial()
+            if not await self._reconnect():
+                return
+
+    async def _reconnect(self) -> bool:
+        """Reopen the device with exponential backoff (False if stopped meanwhile)"""
+        loop = asyncio.get_running_loop()
+        self._set_state("reconnecting")
+        started = loop.time()
+        delay = self.min_delay
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                break
+            self._stats["attempts"] += 1
+            port = await self._find_port()
+            if port is not None:
+                try:
+                    await loop.run_in_executor(None, self.handler.open, port)
+                except Exception as e:
+                    log.debug("Reconnect to %s failed: %s", port, e)
+                else:
+                    if self._stopping:
+                        self.handler.disconnect()
+                        break
+                    seconds = loop.time() - started
+                    self._stats["reconnects"] += 1
+                    self._stats["reconnect_seconds"] += seconds
+                    self._stats["last_reconnect_seconds"] = seconds
+                    self._stats["max_reconnect_seconds"] = max(self._stats["max_reconnect_seconds"], seconds)
+                    log.info("Reconnected to %s after %.2fs", port, seconds)
+                    self._set_state("connected")
+                    return True
+            delay = min(delay * 2, self.max_delay)
+        self._set_state("disconnected")
+        return False
+
+    async def _ports(self) -> Optional[list]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, SerialHandler.list_available_ports)
+        except Exception as e:
+            log.error("Error listing serial ports: %s", e)
+            return None
+
+    async def _hwid(self, port: str) -> Optional[str]:
+        for info in await self._ports() or []:
+            if info["port"] == port and device_id(info["hwid"]):
+                return info["hwid"]
+        return None
+
+    async def _find_port(self) -> Optional[str]:
+        """Where the device is now: the port with its hwid (None while absent), else the old port"""
+        if self.hwid is None:
+            return self.handler.port_name
+        ports = await self._ports()
+        if ports is None:
+            return self.handler.port_name
+        matches = [info for info in ports if device_id(info["hwid"]) == device_id(self.hwid)]
+        if not matches:
+            return None
+        match = next((info for info in matches if info["port"] == self.handler.port_name), matches[0])
+        self.hwid = match["hwid"]
+        return match["port"]
+
+    def get_status(self):
+        return {**self.handler.get_status(), "state": self.state}
+
+    def stats(self):
+        reconnects = self._stats["reconnects"]
+        return {
+            "state": self.state,
+            "port": self.handler.port_name,
+            "hwid": self.hwid,
+            "faults": self._stats["faults"],
+            "reconnects": reconnects,
+            "attempts": self._stats["attempts"],
+            "ms_per_reconnect": self._stats["reconnect_seconds"] / reconnects * 1000 if reconnects else None,
+            "last_reconnect_ms": (self._stats["last_reconnect_seconds"] * 1000
+                                  if self._stats["last_reconnect_seconds"] is not None else None),
+            "max_reconnect_ms": self._stats["max_reconnect_seconds"] * 1000,
+            "lost_lines": self.handler.lost_lines,
+        }
+
+
+class PortWatcher:
+    """
+    Enumerates serial ports in the background (off the event loop) and keeps
+    the latest list. on_change(ports) is called on the event loop after the
+    first scan and whenever a scan differs from the previous one, i.e. when
+    a device is plugged in or removed.
+    """
+
+    def __init__(self, on_change: Callable[[list], None], interval: float = PORT_SCAN_INTERVAL):
+        self.on_change = on_change
+        self.interval = interval
+        self.ports: Optional[list] = None  # None until the first scan
+        self.scans = 0
+        self.scan_seconds = 0.0
+        self._scanned = asyncio.Event()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = time.perf_counter()
+            try:
+                ports = await loop.run_in_executor(None, SerialHandler.list_available_ports)
+            except Exception as e:
+                log.error("Error listing serial ports: %s", e)
+                # Don't hold /api/ports forever if the very first scan fails
+                ports = self.ports if self.ports is not None else []
+            self.scans += 1
+            self.scan_seconds += time.perf_counter() - start
+            if ports != self.ports:
+                self.ports = ports
+                self._scanned.set()
+                self.on_change(ports)
+            await asyncio.sleep(self.interval)
+
+    async def current(self) -> list:
+        """The latest port list (waits for the first scan)"""
+        await self._scanned.wait()
+        return self.ports
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "scans": self.scans,
+            "ms_per_scan": self.scan_seconds / self.scans * 1000 if self.scans else None,
+            "ports": len(self.ports) if self.ports is not None else None,
+        }
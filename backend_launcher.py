@@ -1,62 +1,164 @@
 #!/usr/bin/env python3
 """
 Abeka Junction Traffic Dashboard - Linux App Launcher
-Starts backend, frontend server, and opens dashboard in browser
+Starts backend and frontend server in parallel, opens the dashboard once
+both answer, and stops exactly the processes it started
 """
+import os
+import json
 import subprocess
 import time
 import webbrowser
-import os
 import signal
+import socket
 import sys
+import urllib.request
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent
 BACKEND_DIR = PROJECT_ROOT / "backend"
 FRONTEND_BUILD = PROJECT_ROOT / "frontend" / "build"
 PORT = 3000
+BACKEND_PORT = 8001
+HEALTH_URL = f"http://127.0.0.1:{BACKEND_PORT}/health"
+# With more than one API worker, a separate ingest process owns the serial
+# port and database writes, and the workers mirror it over the ingest bus
+BACKEND_WORKERS = int(os.getenv("BACKEND_WORKERS", 1))
+INGEST_PORT = 8002
+
+# Give up if the services are not ready within this many seconds
+STARTUP_TIMEOUT = 30
+# The backend flushes queued DB writes on shutdown; wait this long before killing
+SHUTDOWN_GRACE = 10
+
+
+def backend_ready():
+    # /health answers during warm-up; "ready" says the API can serve data
+    try:
+        with urllib.request.urlopen(HEALTH_URL, timeout=1) as response:
+            return response.status == 200 and json.loads(response.read()).get("ready", True)
+    except (OSError, ValueError):
+        return False
+
+
+def frontend_ready():
+    try:
+        with socket.create_connection(("127.0.0.1", PORT), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def wait_until_ready(checks, procs, timeout=STARTUP_TIMEOUT):
+    """Poll readiness checks with exponential backoff; returns name -> seconds to ready"""
+    start = time.perf_counter()
+    ready = {}
+    delay = 0.05
+    while len(ready) < len(checks):
+        for name, check in checks.items():
+            if name not in ready and check():
+                ready[name] = time.perf_counter() - start
+        for name, proc in procs.items():
+            if proc.poll() is not None:
+                raise RuntimeError(f"{name} exited with code {proc.returncode}")
+        if len(ready) == len(checks):
+            break
+        if time.perf_counter() - start > timeout:
+            pending = ", ".join(name for name in checks if name not in ready)
+            raise TimeoutError(f"{pending} not ready after {timeout}s")
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return ready
+
+
+def stop(procs):
+    """Terminate our own children: frontend first, then the backend and ingest so they can flush writes"""
+    for name in ("frontend", "backend", "ingest"):
+        proc = procs.get(name)
+        if proc is None or proc.poll() is not None:
+            continue
+        # uvicorn treats SIGTERM as a graceful shutdown and runs the lifespan exit
+        proc.terminate()
+        try:
+            proc.wait(timeout=SHUTDOWN_GRACE)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️  {name} did not stop in {SHUTDOWN_GRACE}s, killing it")
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    procs = {}
+
+    def signal_handler(sig, frame):
+        print("\n✓ Shutting down dashboard...")
+        stop(procs)
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    print("🚀 Starting Abeka Junction Traffic Dashboard...")
+    start = time.perf_counter()
+
+    # Both servers start at once; neither needs the other to boot
+    backend_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", str(BACKEND_PORT)]
+    backend_env = None
+    if BACKEND_WORKERS > 1:
+        # API workers become ready once they have synced with the ingest process
+        print("📥 Starting ingest process...")
+        procs["ingest"] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(INGEST_PORT)],
+            cwd=BACKEND_DIR,
+            env=dict(os.environ, BACKEND_ROLE="ingest"),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        backend_cmd += ["--workers", str(BACKEND_WORKERS)]
+        backend_env = dict(os.environ, BACKEND_ROLE="api")
+    print("📡 Starting backend server...")
+    procs["backend"] = subprocess.Popen(
+        backend_cmd,
+        cwd=BACKEND_DIR,
+        env=backend_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    print("🎨 Starting frontend server...")
+    procs["frontend"] = subprocess.Popen(
+        [sys.executable, "server.py"],
+        cwd=PROJECT_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    try:
+        ready = wait_until_ready({"backend": backend_ready, "frontend": frontend_ready}, procs)
+    except (RuntimeError, TimeoutError) as e:
+        print(f"❌ Startup failed: {e}")
+        stop(procs)
+        sys.exit(1)
+
+    print(f"✓ Ready in {time.perf_counter() - start:.2f}s "
+          f"(backend {ready['backend']:.2f}s, frontend {ready['frontend']:.2f}s)")
+
+    # Open browser
+    print(f"🌐 Opening dashboard at http://localhost:{PORT}")
+    webbrowser.open(f"http://localhost:{PORT}")
+
+    print("\n✅ Dashboard is running!")
+    print(f"📍 Access at: http://localhost:{PORT}")
+    print("🛑 Press Ctrl+C to stop\n")
+
+    # Supervise: if either child dies, take the other one down too
+    while all(proc.poll() is None for proc in procs.values()):
+        time.sleep(0.5)
+    for name, proc in procs.items():
+        if proc.poll() is not None:
+            print(f"❌ {name} exited with code {proc.returncode}, shutting down")
+    stop(procs)
+    sys.exit(1)
+
 
-def signal_handler(sig, frame):
-    print("\n✓ Shutting down dashboard...")
-    os.system("pkill -f 'uvicorn main:app'")
-    os.system("pkill -f 'python server.py'")
-    sys.exit(0)
-
-signal.signal(signal.SIGINT, signal_handler)
-
-print("🚀 Starting Abeka Junction Traffic Dashboard...")
-
-# Start backend
-print("📡 Starting backend server...")
-backend_proc = subprocess.Popen(
-    ["python", "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", "8001"],
-    cwd=BACKEND_DIR,
-    stdout=subprocess.DEVNULL,
-    stderr=subprocess.DEVNULL
-)
-
-time.sleep(2)
-
-# Start frontend server
-print("🎨 Starting frontend server...")
-server_proc = subprocess.Popen(
-    ["python", "server.py"],
-    cwd=PROJECT_ROOT,
-    stdout=subprocess.DEVNULL,
-    stderr=subprocess.DEVNULL
-)
-
-time.sleep(2)
-
-# Open browser
-print(f"🌐 Opening dashboard at http://localhost:{PORT}")
-webbrowser.open(f"http://localhost:{PORT}")
-
-print("\n✅ Dashboard is running!")
-print(f"📍 Access at: http://localhost:{PORT}")
-print("🛑 Press Ctrl+C to stop\n")
-
-try:
-    backend_proc.wait()
-except KeyboardInterrupt:
-    signal_handler(None, None)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop latency while the prediction model runs.
+
+Feeds readings at a fixed rate through ModelRunner with a model whose
+per-prediction cost is set by --model-ms, once inline and once in the
+process pool, while a ticker task measures how late the loop wakes up.
+
+Usage: python benchmarks/bench_model_runner.py [--rate 50] [--seconds 5] [--model-ms 0 5 20]
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from model_runner import ModelRunner  # noqa: E402
+from prediction_model import TrafficCongestionPredictor  # noqa: E402
+from records import SerialData, now_ms  # noqa: E402
+
+
+class SlowPredictor(TrafficCongestionPredictor):
+    """The stock model plus a fixed amount of CPU work per prediction"""
+
+    def __init__(self, window_size=30, cost_ms=0):
+        super().__init__(window_size)
+        # predict_congestion runs three times per reading (directly and via the others)
+        self.cost_s = cost_ms / 1000 / 3
+
+    def predict_congestion(self):
+        end = time.perf_counter() + self.cost_s
+        while time.perf_counter() < end:
+            pass
+        return super().predict_congestion()
+
+
+async def run(executor, cost_ms, rate, seconds):
+    delays = []
+    delivered = []
+
+    def on_result(reading, result, evaluated):
+        delivered.append(now_ms() - reading.received_ms)
+
+    runner = ModelRunner(partial(SlowPredictor, cost_ms=cost_ms), on_result, executor=executor)
+    runner.start()
+    await asyncio.sleep(1.5)  # let pool workers import the model
+
+    async def ticker():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            delays.append((time.perf_counter() - start - 0.001) * 1000)
+
+    tick = asyncio.create_task(ticker())
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        ms = now_ms()
+        runner.submit(SerialData(ms, "639CA18", 900 + i % 100, i % 10, 1500 + i % 700, "", ms))
+        next_at += interval
+        await asyncio.sleep(max(0, next_at - time.perf_counter()))
+    await asyncio.sleep(0.5)
+    tick.cancel()
+    stats = runner.stats()
+    runner.close()
+
+    delays.sort()
+    print(f"  {executor:<8}{cost_ms:>8} ms"
+          f"{statistics.median(delays):>10.2f}{delays[int(len(delays) * 0.99)]:>10.2f}{delays[-1]:>10.1f}"
+          f"{statistics.median(delivered):>12.0f}{stats['fallbacks']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event-loop lag with inline vs pooled model execution')
+    parser.add_argument('--rate', type=float, default=50, help='Readings per second')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration per run')
+    parser.add_argument('--model-ms', type=int, nargs='+', default=[0, 5, 20],
+                        help='Extra model cost per reading in milliseconds')
+    args = parser.parse_args()
+
+    print(f"{args.rate:.0f} readings/s for {args.seconds:.0f}s; loop lag in ms")
+    print(f"  {'executor':<8}{'model':>11}{'p50':>10}{'p99':>10}{'max':>10}{'result ms':>12}{'fallbacks':>11}")
+    for cost_ms in args.model_ms:
+        for executor in ("inline", "process"):
+            asyncio.run(run(executor, cost_ms, args.rate, args.seconds))
+
+
+if __name__ == '__main__':
+    main()
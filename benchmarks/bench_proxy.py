@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Load test: frontend proxy throughput and tail latency.
+
+Runs a stand-in backend (a small JSON endpoint plus a slow "export"),
+then drives the previous single-threaded urllib proxy and the threaded
+keep-alive proxy from server.py with concurrent keep-alive clients while
+one client keeps hitting the slow endpoint.
+
+Usage: python benchmarks/bench_proxy.py [--clients 16] [--seconds 5]
+"""
+import os
+import sys
+import json
+import socket
+import time
+import argparse
+import tempfile
+import threading
+import http.client
+import urllib.request
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler, SimpleHTTPRequestHandler
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proxy_common import StreamingProxyHandler, UpstreamPool, make_server  # noqa: E402
+
+PAYLOAD = json.dumps({"data": [{"gas": 900 + i, "count": i, "headway_ms": 1500}
+                               for i in range(40)]}).encode()
+
+
+class Backend(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # uvicorn sets TCP_NODELAY too
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        if self.path.startswith("/api/slow"):
+            time.sleep(self.server.slow_seconds)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+class LegacyProxyHandler(SimpleHTTPRequestHandler):
+    """The previous proxy: new urllib connection per call, whole body buffered"""
+    backend_url = None
+
+    def do_GET(self):
+        try:
+            response = urllib.request.urlopen(self.backend_url + self.path, timeout=5)
+            self.send_response(response.status)
+            for header, value in response.headers.items():
+                self.send_header(header, value)
+            self.end_headers()
+            self.wfile.write(response.read())
+        except Exception as e:
+            self.send_response(502)
+            self.end_headers()
+            self.wfile.write(str(e).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietProxyHandler(StreamingProxyHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def client(port, path, deadline, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            if response.will_close:
+                conn.close()
+        except OSError as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run_load(port, clients, seconds):
+    deadline = time.perf_counter() + seconds
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(port, "/api/slow", deadline, [], []))]
+    threads += [threading.Thread(target=client, args=(port, "/api/fast", deadline, latencies, errors))
+                for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    return len(latencies) / seconds, pct(0.5), pct(0.99), pct(1.0), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frontend proxy load test')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent keep-alive clients')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration per proxy')
+    parser.add_argument('--slow', type=float, default=1.0, help='Seconds the slow endpoint takes')
+    args = parser.parse_args()
+
+    backend = serve(ThreadingHTTPServer(("127.0.0.1", 0), Backend))
+    backend.daemon_threads = True
+    backend.slow_seconds = args.slow
+    backend_url = f"http://127.0.0.1:{backend.server_address[1]}"
+    static_dir = tempfile.mkdtemp(prefix="bench_proxy_")
+
+    LegacyProxyHandler.backend_url = backend_url
+    legacy = HTTPServer(("127.0.0.1", 0), LegacyProxyHandler)
+    QuietProxyHandler.upstream = UpstreamPool(backend_url, timeout=30)
+    threaded = make_server(QuietProxyHandler, 0, static_dir, host="127.0.0.1")
+
+    print(f"{args.clients} clients + 1 slow ({args.slow}s) client, {args.seconds}s per proxy")
+    print(f"{'proxy':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for name, server in (("legacy", legacy), ("threaded", threaded)):
+        serve(server)
+        rps, p50, p99, worst, errors = run_load(server.server_address[1], args.clients, args.seconds)
+        print(f"{name:<10}{rps:>10.0f}{p50:>10.2f}{p99:>10.2f}{worst:>10.2f}{errors:>8}")
+        server.shutdown()
+        server.server_close()
+    os.rmdir(static_dir)
+
+
+if __name__ == '__main__':
+    main()
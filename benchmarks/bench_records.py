@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-reading cost of the ingest representation.
+
+Compares the old path (dataclass with ISO strings, re-parsed by the
+predictor and re-formatted for the buffer/DB) with the slotted
+SerialData record carrying epoch-millisecond integers.
+
+Usage: python benchmarks/bench_records.py [--readings 200000]
+"""
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from records import SerialData, parse_timestamp_ms, now_ms  # noqa: E402
+
+
+@dataclass
+class LegacySerialData:
+    timestamp: str
+    uid: str
+    gas: int
+    count: int
+    headway_ms: int
+    flag: str
+    received_at: datetime
+
+
+def make_lines(n):
+    return [json.dumps({
+        "timestamp": f"2025-08-08T16:{(i // 60) % 60:02d}:{i % 60:02d}Z",
+        "uid": "639CA18", "gas": 900 + i % 100, "count": i % 10,
+        "headway_ms": 1500 + i % 500, "flag": "",
+    }) for i in range(n)]
+
+
+def legacy_path(lines):
+    timestamps = deque(maxlen=30)
+    kept = []
+    for line in lines:
+        parsed = json.loads(line)
+        record = LegacySerialData(
+            timestamp=parsed.get('timestamp', ''), uid=parsed.get('uid', ''),
+            gas=parsed.get('gas', 0), count=parsed.get('count', 0),
+            headway_ms=parsed.get('headway_ms', 0), flag=parsed.get('flag', ''),
+            received_at=datetime.now(),
+        )
+        # predictor re-parses the ISO string
+        timestamps.append(datetime.fromisoformat(record.timestamp.replace('Z', '+00:00')))
+        # buffer dict and DB writer each re-format received_at
+        received = record.received_at.isoformat()
+        db_args = (record.timestamp, record.uid, record.gas, record.count,
+                   record.headway_ms, record.flag, record.received_at.isoformat())
+        kept.append((record, received, db_args))
+    return kept
+
+
+def record_path(lines):
+    timestamps = deque(maxlen=30)
+    kept = []
+    for line in lines:
+        parsed = json.loads(line)
+        record = SerialData(
+            timestamp_ms=parse_timestamp_ms(parsed.get('timestamp', '')),
+            uid=parsed.get('uid', ''), gas=parsed.get('gas', 0),
+            count=parsed.get('count', 0), headway_ms=parsed.get('headway_ms', 0),
+            flag=parsed.get('flag', ''), received_ms=now_ms(),
+        )
+        # predictor, buffer and DB writer reuse the integers
+        timestamps.append(record.timestamp_ms)
+        db_args = (record.timestamp_ms, record.uid, record.gas, record.count,
+                   record.headway_ms, record.flag, record.received_ms)
+        kept.append((record, record.received_ms, db_args))
+    return kept
+
+
+def measure(fn, lines):
+    start = time.perf_counter()
+    fn(lines)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    kept = fn(lines)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return elapsed / len(lines) * 1e6, retained / len(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-reading representation benchmark')
+    parser.add_argument('--readings', type=int, default=200_000, help='Readings per run')
+    args = parser.parse_args()
+
+    lines = make_lines(args.readings)
+    print(f"{'path':<10}{'us/reading':>12}{'bytes/reading':>16}")
+    for name, fn in (("legacy", legacy_path), ("record", record_path)):
+        us, nbytes = measure(fn, lines)
+        print(f"{name:<10}{us:>12.2f}{nbytes:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark: on-disk size and query cost of the v1 (text timestamps) and
+v2 (epoch-ms integers, sensor dimension table) partition layouts.
+
+Builds a synthetic pre-partitioning database, times the v1 queries on it,
+converts it with TrafficDatabase and times the same API calls on v2.
+
+Usage: python benchmarks/bench_schema.py [--readings 200000] [--sensors 8]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+WORKDIR = Path(tempfile.mkdtemp(prefix="bench_schema_"))
+# Keep the module-level database away from the real one
+os.environ["TRAFFIC_DB_PATH"] = str(WORKDIR / "default.db")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from database import TrafficDatabase  # noqa: E402
+
+V1_SCHEMA = '''
+    CREATE TABLE sensor_readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        uid TEXT NOT NULL,
+        gas INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        headway_ms INTEGER NOT NULL,
+        flag TEXT,
+        received_at TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sensor_reading_id INTEGER NOT NULL,
+        congestion_level INTEGER NOT NULL,
+        congestion_status TEXT NOT NULL,
+        confidence INTEGER NOT NULL,
+        next_minute_prediction INTEGER,
+        next_minute_status TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (sensor_reading_id) REFERENCES sensor_readings(id)
+    );
+    CREATE INDEX idx_timestamp ON sensor_readings(timestamp);
+    CREATE INDEX idx_uid ON sensor_readings(uid);
+    CREATE INDEX idx_congestion_status ON predictions(congestion_status);
+'''
+
+V1_QUERIES = {
+    "latest 100": ('''
+        SELECT * FROM sensor_readings ORDER BY id DESC LIMIT 100
+    ''', ()),
+    "by date": ('''
+        SELECT * FROM sensor_readings WHERE DATE(timestamp) = ? ORDER BY timestamp DESC
+    ''', None),
+    "predictions 100": ('''
+        SELECT p.*, s.gas, s.count, s.headway_ms, s.timestamp
+        FROM predictions p JOIN sensor_readings s ON p.sensor_reading_id = s.id
+        ORDER BY p.created_at DESC LIMIT 100
+    ''', ()),
+    "summary 24h": ('''
+        SELECT congestion_status, COUNT(*), AVG(congestion_level),
+               MAX(congestion_level), MIN(congestion_level)
+        FROM predictions WHERE created_at >= datetime('now', '-24 hours')
+        GROUP BY congestion_status
+    ''', ()),
+}
+
+STATUSES = ["FREE_FLOW", "LIGHT", "MODERATE", "HEAVY", "SEVERE"]
+
+
+def build_v1(path, readings, sensors):
+    """Pre-partitioning database with one reading every 0.4s ending now"""
+    conn = sqlite3.connect(path)
+    conn.executescript(V1_SCHEMA)
+    rng = random.Random(42)
+    uids = [f"{rng.randrange(16 ** 7):07X}" for _ in range(sensors)]
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = now - timedelta(seconds=readings * 0.4)
+    rows, preds = [], []
+    for i in range(1, readings + 1):
+        at = start + timedelta(seconds=i * 0.4)
+        rows.append((i, at.strftime('%Y-%m-%dT%H:%M:%SZ'), uids[i % sensors],
+                     rng.randrange(200, 1000), rng.randrange(20), rng.randrange(500, 10000),
+                     "", at.isoformat(), at.strftime('%Y-%m-%d %H:%M:%S')))
+        preds.append((i, rng.randrange(100), STATUSES[i % 5], rng.randrange(100),
+                      rng.randrange(100), STATUSES[(i + 1) % 5], at.strftime('%Y-%m-%d %H:%M:%S')))
+    conn.executemany('INSERT INTO sensor_readings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.executemany('''
+        INSERT INTO predictions (sensor_reading_id, congestion_level, congestion_status,
+        confidence, next_minute_prediction, next_minute_status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', preds)
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+    return now.date().isoformat()
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def size(paths):
+    return sum(p.stat().st_size for p in paths if p.exists())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partition layout benchmark')
+    parser.add_argument('--readings', type=int, default=200_000, help='Synthetic readings')
+    parser.add_argument('--sensors', type=int, default=8, help='Distinct sensor uids')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query (best is kept)')
+    args = parser.parse_args()
+
+    v1_path = WORKDIR / "v1.db"
+    today = build_v1(v1_path, args.readings, args.sensors)
+    v1_size = size([v1_path])
+
+    # Both sides include building the API dicts, as the endpoints do
+    conn = sqlite3.connect(v1_path)
+    conn.row_factory = sqlite3.Row
+    v1_times = {}
+    for name, (sql, params) in V1_QUERIES.items():
+        params = (today,) if params is None else params
+        v1_times[name] = timed(lambda: [dict(r) for r in conn.execute(sql, params)], args.repeat)
+    conn.close()
+
+    v2_path = WORKDIR / "v2.db"
+    v2_path.write_bytes(v1_path.read_bytes())
+    start = time.perf_counter()
+    database = TrafficDatabase(v2_path)
+    migrate_s = time.perf_counter() - start
+    v2_size = size([v2_path, *database.partition_dir.glob("*.db")]) - size([v2_path])
+
+    calls = {
+        "latest 100": lambda: database.get_readings(100),
+        "by date": lambda: database.get_readings_by_date(today),
+        "predictions 100": lambda: database.get_predictions(100),
+        "summary 24h": lambda: database.get_congestion_summary(24),
+    }
+    v2_times = {name: timed(fn, args.repeat) for name, fn in calls.items()}
+
+    print(f"{args.readings} readings, {args.sensors} sensors; conversion took {migrate_s:.2f}s")
+    print(f"{'storage':<18}{'v1':>12}{'v2':>12}")
+    print(f"{'bytes/reading':<18}{v1_size / args.readings:>12.1f}{v2_size / args.readings:>12.1f}")
+    print(f"{'query (ms)':<18}{'v1':>12}{'v2':>12}")
+    for name in calls:
+        print(f"{name:<18}{v1_times[name]:>12.2f}{v2_times[name]:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: backend cold start.
+
+1. Import profile of `main` from `python -X importtime` (slowest modules
+   by cumulative time, plus the backend's own modules).
+2. Time from spawning uvicorn to the first 200 from /health, and to
+   /health reporting ready, against a throwaway database.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--db path/to/copy.db]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Time-to-first-/health we aim for on a developer machine
+HEALTH_TARGET_S = 1.0
+
+
+def scratch_env(db_source=None):
+    """Environment pointing the backend at a fresh database directory"""
+    workdir = Path(tempfile.mkdtemp(prefix="bench_startup_"))
+    db_path = workdir / "traffic_data.db"
+    if db_source:
+        shutil.copy(db_source, db_path)
+    env = dict(os.environ, TRAFFIC_DB_PATH=str(db_path))
+    return env, workdir
+
+
+def import_profile(env, top):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        rows.append((int(cumulative_us), int(head.split(":")[1]), name.rstrip()))
+    total = next(c for c, _, name in rows if name.strip() == "main")
+    own = {p.stem for p in BACKEND_DIR.glob("*.py")}
+
+    print(f"import main: {total / 1000:.1f} ms")
+    print(f"  {'module':<40}{'cumulative ms':>15}")
+    for cumulative, _, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {name[:40]:<40}{cumulative / 1000:>15.1f}")
+    print("  backend modules:")
+    for cumulative, _, name in rows:
+        if name.strip() in own and name.strip() != "main":
+            print(f"  {name[:40]:<40}{cumulative / 1000:>15.1f}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_health(env, timeout=60):
+    """(seconds to first /health 200, seconds to ready)"""
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                            cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    body = json.loads(r.read())
+                if first is None:
+                    first = time.perf_counter() - start
+                if body.get("ready", True):
+                    return first, time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.01)
+        raise TimeoutError("backend did not become ready")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backend cold-start benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='uvicorn launches to time')
+    parser.add_argument('--top', type=int, default=12, help='Slowest imports to list')
+    parser.add_argument('--db', type=Path, help='Database to copy for each run (default: empty)')
+    args = parser.parse_args()
+
+    env, workdir = scratch_env(args.db)
+    import_profile(env, args.top)
+    shutil.rmtree(workdir)
+
+    firsts, readies = [], []
+    for _ in range(args.runs):
+        env, workdir = scratch_env(args.db)
+        first, ready = time_to_health(env)
+        firsts.append(first)
+        readies.append(ready)
+        shutil.rmtree(workdir)
+
+    first, ready = statistics.median(firsts), statistics.median(readies)
+    verdict = "met" if first <= HEALTH_TARGET_S else "MISSED"
+    print(f"first /health: {first:.2f}s median of {args.runs} (target {HEALTH_TARGET_S:.1f}s: {verdict})")
+    print(f"ready:         {ready:.2f}s median")
+
+
+if __name__ == '__main__':
+    main()
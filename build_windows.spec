@@ -17,6 +17,18 @@ a = Analysis(
         ('backend/serial_handler.py', '.'),
         ('backend/prediction_model.py', '.'),
         ('backend/database.py', '.'),
+        ('backend/async_database.py', '.'),
+        ('backend/response_cache.py', '.'),
+        ('backend/ring_buffer.py', '.'),
+        ('backend/records.py', '.'),
+        ('backend/http_responses.py', '.'),
+        ('backend/ingest_bus.py', '.'),
+        ('backend/model_runner.py', '.'),
+        ('backend/backpressure.py', '.'),
+        ('backend/live_updates.py', '.'),
+        ('backend/journal.py', '.'),
+        ('backend/log_config.py', '.'),
+        ('backend/baseline.py', '.'),
     ],
     hiddenimports=[
         'serial',
@@ -25,6 +37,7 @@ a = Analysis(
         'starlette',
         'pydantic',
         'numpy',
+        'pythonjsonlogger',
     ],
     hookspath=[],
     hooksconfig={},
@@ -23,28 +23,48 @@ const Dashboard = () => {
   const [error, setError] = useState('');
   const [prediction, setPrediction] = useState(null);
   const wsRef = useRef(null);
+  const connectedRef = useRef(false);
 
   const commonBaudRates = [9600, 19200, 38400, 57600, 115200, 230400, 460800];
 
-  // Fetch available ports on mount
+  // WebSocket connection (also brings port changes, so ports aren't polled)
   useEffect(() => {
-    fetchPorts();
-    const interval = setInterval(fetchPorts, 3000);
-    return () => clearInterval(interval);
-  }, []);
+    let reconnectTimer = null;
+    let closed = false;
+
+    const open = () => {
+      connectWebSocket(() => {
+        if (!closed) {
+          reconnectTimer = setTimeout(open, 3000);
+        }
+      });
+    };
+    open();
 
-  // WebSocket connection
-  useEffect(() => {
-    if (isConnected) {
-      connectWebSocket();
-    }
     return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
       if (wsRef.current) {
         wsRef.current.close();
       }
     };
+  }, []);
+
+  // Readings are only streamed while connected; until then just port/status events
+  useEffect(() => {
+    connectedRef.current = isConnected;
+    subscribe();
   }, [isConnected]);
 
+  const subscribe = () => {
+    const ws = wsRef.current;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify(
+        connectedRef.current ? { type: 'subscribe' } : { type: 'subscribe', uids: [] }
+      ));
+    }
+  };
+
   const fetchPorts = async () => {
     try {
       const response = await axios.get(`${API_BASE_URL}/ports`);
@@ -54,17 +74,26 @@ const Dashboard = () => {
     }
   };
 
-  const connectWebSocket = () => {
-    wsRef.current = new WebSocket(WS_URL);
+  const connectWebSocket = (onClose) => {
+    // No readings until subscribe() asks for them
+    wsRef.current = new WebSocket(`${WS_URL}?uids=`);
     
     wsRef.current.onopen = () => {
       console.log('WebSocket connected');
+      // Ports may have changed while the socket was down
+      fetchPorts();
+      if (connectedRef.current) {
+        subscribe();
+      }
     };
 
     wsRef.current.onmessage = (event) => {
       const message = JSON.parse(event.data);
       
       if (message.type === 'data') {
+        if (!connectedRef.current) {
+          return;
+        }
         setData((prevData) => {
           const newData = [...prevData, message.payload];
           // Keep last 100 data points
@@ -75,7 +104,11 @@ const Dashboard = () => {
           setPrediction(message.payload.prediction);
         }
       } else if (message.type === 'status') {
-        setStatus(message.payload);
+        if (connectedRef.current) {
+          setStatus(message.payload);
+        }
+      } else if (message.type === 'ports_changed') {
+        setPorts(message.payload.ports);
       }
     };
 
@@ -85,6 +118,7 @@ const Dashboard = () => {
 
     wsRef.current.onclose = () => {
       console.log('WebSocket disconnected');
+      onClose();
     };
   };
 
@@ -261,7 +295,7 @@ const Dashboard = () => {
               <h3>Status</h3>
               <p><strong>Port:</strong> {status.port || 'N/A'}</p>
               <p><strong>Baud Rate:</strong> {status.baud_rate || 'N/A'}</p>
-              <p><strong>Connected:</strong> {status.is_connected ? '✓ Yes' : '✗ No'}</p>
+              <p><strong>Connected:</strong> {status.is_connected ? '✓ Yes' : status.state === 'reconnecting' ? '⟳ Reconnecting…' : '✗ No'}</p>
               <p><strong>Data Points:</strong> {status.data_points || 0}</p>
             </div>
           )}
@@ -311,6 +345,9 @@ const Dashboard = () => {
                 
                 <div className="next-prediction">
                   <p><strong>Next Minute:</strong> {prediction.next_minute_prediction}% ({prediction.next_minute_status})</p>
+                  {prediction.baseline_deviation != null && (
+                    <p><strong>vs. Typical for Now:</strong> {prediction.baseline_deviation > 0 ? '+' : ''}{prediction.baseline_deviation}%</p>
+                  )}
                 </div>
                 
                 {prediction.recommendations && prediction.recommendations.length > 0 && (
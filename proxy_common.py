@@ -0,0 +1,424 @@
+"""
+Shared reverse proxy used by server.py and render_server.py
+
+Requests run on a ThreadingHTTPServer, so a slow export never blocks
+other clients. API calls reuse pooled keep-alive upstream connections,
+and request and response bodies are streamed in chunks instead of
+being buffered whole. WebSocket upgrades are tunnelled to the backend.
+Static files are held in memory with precompressed variants.
+"""
+import ssl
+import gzip
+import socket
+import hashlib
+import mimetypes
+import selectors
+import threading
+import http.client
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+
+# Files smaller than this aren't worth compressing
+COMPRESS_MIN_SIZE = 512
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json",
+                      "application/manifest+json", "image/svg+xml")
+
+# The React build fingerprints everything under /static/ (main.3f2a1b.js)
+IMMUTABLE_PREFIX = "/static/"
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+
+
+class UpstreamPool:
+    """Pool of idle keep-alive HTTP(S) connections to one backend"""
+
+    def __init__(self, base_url, timeout=10, maxsize=32):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """An idle connection, or a new one; second value is True if reused"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn):
+        """Return a connection whose response was fully read"""
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def open_socket(self):
+        """Raw (TLS-wrapped for https) socket to the backend, for tunnels"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.scheme == "https":
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        return sock
+
+
+def splice(a, b):
+    """Copy bytes between two sockets in both directions until either closes"""
+    selector = selectors.DefaultSelector()
+    selector.register(a, selectors.EVENT_READ, b)
+    selector.register(b, selectors.EVENT_READ, a)
+    try:
+        while True:
+            for key, _ in selector.select():
+                src, dst = key.fileobj, key.data
+                data = src.recv(CHUNK_SIZE)
+                if not data:
+                    return
+                dst.sendall(data)
+                # TLS may hold decrypted bytes that select() cannot see
+                while isinstance(src, ssl.SSLSocket) and src.pending():
+                    dst.sendall(src.recv(src.pending()))
+    except OSError:
+        return
+    finally:
+        selector.close()
+
+
+class StaticAsset:
+    """One file of the build with its precompressed variants"""
+
+    __slots__ = ("content_type", "cache_control", "variants")
+
+    def __init__(self, url_path, data):
+        self.content_type = mimetypes.guess_type(url_path)[0] or "application/octet-stream"
+        if url_path.startswith(IMMUTABLE_PREFIX):
+            self.cache_control = "public, max-age=31536000, immutable"
+        else:
+            # index.html etc. keep their URL across builds: revalidate via ETag
+            self.cache_control = "no-cache"
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        self.variants = {"identity": (data, f'"{digest}"')}
+        if len(data) >= COMPRESS_MIN_SIZE and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            encoded = {"gzip": gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                encoded["br"] = brotli.compress(data, quality=11)
+            for encoding, body in encoded.items():
+                if len(body) < len(data):
+                    self.variants[encoding] = (body, f'"{digest}-{encoding}"')
+
+    def negotiate(self, accept_encoding):
+        """(encoding, body, etag) of the best variant the client accepts"""
+        accepted = set()
+        for item in accept_encoding.split(","):
+            name, _, params = item.strip().partition(";")
+            if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(name.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return (encoding, *self.variants[encoding])
+        return ("identity", *self.variants["identity"])
+
+
+class StaticCache:
+    """The frontend build directory, loaded into memory once at startup"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.assets = {}
+        if self.directory.is_dir():
+            for path in self.directory.rglob("*"):
+                if path.is_file():
+                    url_path = "/" + path.relative_to(self.directory).as_posix()
+                    self.assets[url_path] = StaticAsset(url_path, path.read_bytes())
+
+    def lookup(self, request_path):
+        """Asset for a request path; extension-less unknown routes get index.html"""
+        path = unquote(urlsplit(request_path).path)
+        if path.endswith("/"):
+            path += "index.html"
+        asset = self.assets.get(path)
+        if asset is None and "." not in path.rsplit("/", 1)[-1]:
+            # Client-side route of the single page app
+            asset = self.assets.get("/index.html")
+        return asset
+
+    @property
+    def nbytes(self):
+        return sum(len(body) for asset in self.assets.values()
+                   for body, _ in asset.variants.values())
+
+
+class StreamingProxyHandler(BaseHTTPRequestHandler):
+    """Serves the React build and streams API calls to an upstream pool"""
+
+    protocol_version = "HTTP/1.1"
+    upstream = None            # UpstreamPool, set by subclasses
+    proxy_prefixes = ("/api/",)
+
+    def setup(self):
+        super().setup()
+        # Headers and body chunks are separate writes; don't let Nagle hold them back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def is_proxied(self):
+        return self.path.startswith(self.proxy_prefixes)
+
+    def is_websocket(self):
+        return (self.headers.get("Upgrade", "").lower() == "websocket"
+                and "upgrade" in self.headers.get("Connection", "").lower())
+
+    def do_GET(self):
+        if self.is_proxied() and self.is_websocket():
+            self.tunnel_websocket()
+        elif self.is_proxied():
+            self.proxy_request("GET")
+        else:
+            self.serve_static()
+
+    def do_HEAD(self):
+        if self.is_proxied():
+            self.proxy_request("HEAD")
+        else:
+            self.serve_static()
+
+    def do_POST(self):
+        if self.is_proxied():
+            self.proxy_request("POST")
+        else:
+            self.send_plain(405, "Method not allowed")
+
+    def serve_static(self):
+        """Answer from the in-memory build, honouring Accept-Encoding and If-None-Match"""
+        asset = self.server.static.lookup(self.path)
+        if asset is None:
+            self.send_plain(404, "Not found")
+            return
+
+        encoding, body, etag = asset.negotiate(self.headers.get("Accept-Encoding", ""))
+        if_none_match = self.headers.get("If-None-Match")
+        not_modified = if_none_match is not None and (
+            if_none_match.strip() == "*" or
+            etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")))
+
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", asset.cache_control)
+        if len(asset.variants) > 1:
+            self.send_header("Vary", "Accept-Encoding")
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", asset.content_type)
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    # ------------------------------------------------------------------
+    # Proxying
+    # ------------------------------------------------------------------
+
+    def forwarded_headers(self):
+        """End-to-end request headers for the upstream request"""
+        headers = {}
+        for header, value in self.headers.items():
+            if header.lower() not in HOP_BY_HOP and header.lower() != "host":
+                headers[header] = value
+        headers["Host"] = self.upstream.netloc
+        headers["X-Forwarded-For"] = self.client_address[0]
+        return headers
+
+    def request_body(self):
+        """Iterator over the client request body, or None if there is none"""
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            # Without a Content-Length http.client re-encodes it as chunked
+            return self._read_chunked()
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        if not length:
+            return None
+        return self._read_exactly(length)
+
+    def _read_exactly(self, length):
+        while length > 0:
+            data = self.rfile.read(min(CHUNK_SIZE, length))
+            if not data:
+                raise ConnectionError("client closed during request body")
+            length -= len(data)
+            yield data
+
+    def _read_chunked(self):
+        while True:
+            size = int(self.rfile.readline().split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Skip trailers up to the blank line
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            yield from self._read_exactly(size)
+            self.rfile.readline()
+
+    def proxy_request(self, method):
+        """Forward the request upstream and stream the response back"""
+        headers = self.forwarded_headers()
+        body = self.request_body()
+        try:
+            conn, response = self._send_upstream(method, headers, body)
+        except Exception as e:
+            # The client body may be half read, so don't reuse the connection
+            self.close_connection = body is not None
+            self.send_plain(502, f"Proxy error: {e}")
+            return
+
+        try:
+            self.relay_response(method, response)
+        except (OSError, http.client.HTTPException):
+            # Client went away (or upstream stalled): neither side is reusable
+            conn.close()
+            self.close_connection = True
+            return
+        if response.will_close:
+            conn.close()
+        else:
+            self.upstream.release(conn)
+
+    def _send_upstream(self, method, headers, body):
+        """(connection, response); retries once if a pooled connection went stale"""
+        while True:
+            conn, reused = self.upstream.acquire()
+            try:
+                conn.request(method, self.path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                # A streamed body cannot be replayed
+                if not reused or body is not None:
+                    raise
+
+    def relay_response(self, method, response):
+        """Copy status, headers and body from an upstream response"""
+        self.log_request(response.status)
+        self.send_response_only(response.status, response.reason)
+        length = response.getheader("Content-Length")
+        for header, value in response.getheaders():
+            if header.lower() not in HOP_BY_HOP:
+                self.send_header(header, value)
+        has_body = method != "HEAD" and response.status not in (204, 304)
+        chunked = has_body and length is None
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        if not has_body:
+            response.read()
+            return
+        while True:
+            data = response.read1(CHUNK_SIZE)
+            if not data:
+                break
+            if chunked:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            else:
+                self.wfile.write(data)
+        # read1 leaves a response with a drained Content-Length open;
+        # read() marks it complete so the connection can be reused
+        response.read()
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def tunnel_websocket(self):
+        """Relay the Upgrade handshake, then splice the two sockets together"""
+        self.close_connection = True
+        try:
+            upstream = self.upstream.open_socket()
+        except OSError as e:
+            self.send_plain(502, f"Proxy error: {e}")
+            return
+
+        with upstream:
+            lines = [f"GET {self.path} HTTP/1.1"]
+            lines += [f"{header}: {value}" for header, value in self.forwarded_headers().items()]
+            lines += ["Connection: Upgrade", "Upgrade: websocket", "", ""]
+            try:
+                upstream.sendall("\r\n".join(lines).encode("latin-1"))
+                handshake = b""
+                while b"\r\n\r\n" not in handshake:
+                    data = upstream.recv(CHUNK_SIZE)
+                    if not data or len(handshake) > CHUNK_SIZE:
+                        raise ConnectionError("bad WebSocket handshake from backend")
+                    handshake += data
+            except OSError as e:
+                self.send_plain(502, f"Proxy error: {e}")
+                return
+
+            # Forward the backend's answer verbatim (plus any frames behind it)
+            status = int(handshake.split(b" ", 2)[1])
+            self.log_request(status)
+            self.connection.sendall(handshake)
+            if status != 101:
+                return
+
+            # Frames the client sent right after its handshake may already
+            # sit in rfile's buffer; read them without blocking
+            self.connection.setblocking(False)
+            try:
+                early = self.rfile.read1(CHUNK_SIZE) or b""
+            except BlockingIOError:
+                early = b""
+            self.connection.setblocking(True)
+            if early:
+                upstream.sendall(early)
+
+            # WebSockets idle for long stretches; only the pool timeout applied so far
+            upstream.settimeout(None)
+            self.connection.settimeout(None)
+            splice(self.connection, upstream)
+
+    def send_plain(self, status, text):
+        """Small text/plain response with a Content-Length (keeps keep-alive valid)"""
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+
+class ProxyServer(ThreadingHTTPServer):
+    """One daemon thread per client connection"""
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs when many dashboards connect at once
+    request_queue_size = 128
+
+    def __init__(self, address, handler_class, static):
+        super().__init__(address, handler_class)
+        self.static = static
+
+
+def make_server(handler_class, port, directory, host="0.0.0.0"):
+    """Threaded proxy server serving the build in `directory` from memory"""
+    static = StaticCache(directory)
+    print(f"✓ Loaded {len(static.assets)} static file(s) ({static.nbytes / 1024:.0f} KiB "
+          f"with {'gzip/brotli' if brotli else 'gzip'} variants)")
+    return ProxyServer((host, port), handler_class, static)
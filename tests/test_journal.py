@@ -0,0 +1,65 @@
+from journal import IngestJournal
+
+
+def replay(directory, acked):
+    """Reopen the journal as a restarted process would and return what it replays"""
+    journal = IngestJournal(directory).open(acked)
+    lines = [(seq, line) for seq, _, line in journal.unacknowledged()]
+    journal.close()
+    return lines
+
+
+def segment_files(directory):
+    return sorted(directory.glob("*.journal"))
+
+
+def test_restart_with_empty_segment_keeps_appends(tmp_path):
+    # A run that journaled nothing leaves an empty segment behind
+    IngestJournal(tmp_path).open(acked=-1).close()
+
+    journal = IngestJournal(tmp_path).open(acked=-1)
+    journal.append([b"a", b"b"], 1000)
+    journal.close()
+
+    assert replay(tmp_path, acked=-1) == [(0, b"a"), (1, b"b")]
+
+
+def test_acknowledged_lines_are_not_replayed(tmp_path):
+    journal = IngestJournal(tmp_path).open(acked=-1)
+    journal.append([b"a", b"b"], 1000)
+    journal.acknowledge(1)
+    journal.append([b"c"], 2000)
+    journal.close()
+
+    assert replay(tmp_path, acked=1) == [(2, b"c")]
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    journal = IngestJournal(tmp_path).open(acked=-1)
+    journal.append([b"first", b"second", b"third"], 1000)
+    journal.close()
+
+    # A crash in the middle of the last write
+    path = segment_files(tmp_path)[-1]
+    path.write_bytes(path.read_bytes()[:-3])
+
+    assert replay(tmp_path, acked=-1) == [(0, b"first"), (1, b"second")]
+
+
+def test_damaged_record_ends_its_segment(tmp_path):
+    journal = IngestJournal(tmp_path).open(acked=-1)
+    journal.append([b"first", b"second", b"third"], 1000)
+    journal.close()
+
+    path = segment_files(tmp_path)[-1]
+    data = bytearray(path.read_bytes())
+    data[data.index(b"second")] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    journal = IngestJournal(tmp_path).open(acked=-1)
+    assert [(seq, line) for seq, _, line in journal.unacknowledged()] == [(0, b"first")]
+    assert journal.stats()["corrupt_bytes"] > 0
+    # New lines are numbered after the last intact record of the old segment
+    journal.append([b"fourth"], 2000)
+    journal.close()
+    assert replay(tmp_path, acked=0)[-1] == (1, b"fourth")